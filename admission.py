@@ -0,0 +1,161 @@
+import asyncio
+import collections
+import logging
+import time
+
+
+# Limits on the work the Secretary takes on at once, and on how fast any one peer can hand it more.
+# What happens to work over a limit is set by a shedding policy:
+# REJECT turns new work away, QUEUE has it wait for room (up to a bound, then rejects), DROP_OLDEST makes room by dropping the longest waiting.
+MAX_SESSIONS = 64  # concurrent incoming TCP sessions
+MAX_WAITING_SESSIONS = 64  # incoming TCP sessions waiting for room, under the QUEUE policy
+SESSION_WAIT_TIMEOUT = 3  # seconds a queued TCP session waits for room before being rejected
+MAX_DATAGRAM_HANDLERS = 32  # datagram messages being handled at once
+MAX_WAITING_DATAGRAMS = 256  # datagram messages waiting for a handler
+PEER_RATE = 100  # messages per second any one peer may send, on average
+PEER_BURST = 200  # messages a peer may send at once after being quiet
+MAX_TRACKED_PEERS = 1024
+
+REJECT = "reject"
+QUEUE = "queue"
+DROP_OLDEST = "drop oldest"
+
+
+class RateLimiter:
+    '''A token bucket per peer, refilled at rate tokens a second up to burst.
+    '''
+    def __init__(self, rate:float=PEER_RATE, burst:float=PEER_BURST, max_peers:int=MAX_TRACKED_PEERS):
+        self.rate = rate
+        self.burst = burst
+        self.max_peers = max_peers
+        self.limited = 0
+        self._buckets = collections.OrderedDict()  # peer: [tokens, last refill]
+
+    def allow(self, peer, now=None):
+        '''Takes a token from the peer's bucket.
+        Returns False if the bucket is empty, and the peer is over its rate.
+        '''
+        if now is None:
+            now = time.monotonic()
+        bucket = self._buckets.pop(peer, None)
+        if bucket is None:
+            bucket = [self.burst, now]
+            while len(self._buckets) >= self.max_peers:
+                self._buckets.popitem(last=False)
+        self._buckets[peer] = bucket
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            self.limited += 1
+            return False
+        bucket[0] -= 1
+        return True
+
+
+class SessionLimiter:
+    '''Limits the number of sessions active at once.
+    Under the QUEUE policy sessions over the limit wait for room, up to max_waiting of them for at most wait_timeout seconds,
+    under REJECT they are turned away straight away.
+    '''
+    def __init__(self, limit:int=MAX_SESSIONS, policy:str=QUEUE, max_waiting:int=MAX_WAITING_SESSIONS, wait_timeout:float=SESSION_WAIT_TIMEOUT):
+        self.limit = limit
+        self.policy = policy
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.active = 0
+        self.waiting = 0
+        self.shed = 0
+        self.evicted = 0
+        self._room = None
+
+    def _get_room(self):
+        if self._room is None:
+            self._room = asyncio.Condition()
+        return self._room
+
+    async def acquire(self, make_room=None):
+        '''Returns True once the session may go ahead, or False if it is shed.
+        When there is no room make_room, if given, is called to end an idle session.
+        If it returns True the session waits for that slot to be released, whatever the policy.
+        '''
+        if self.active < self.limit:
+            self.active += 1
+            return True
+        made_room = make_room is not None and make_room()
+        if made_room:
+            self.evicted += 1
+        elif self.policy != QUEUE or self.waiting >= self.max_waiting:
+            self.shed += 1
+            return False
+        room = self._get_room()
+        self.waiting += 1
+        try:
+            async with room:
+                await asyncio.wait_for(room.wait_for(lambda: self.active < self.limit), timeout=self.wait_timeout)
+                self.active += 1
+                return True
+        except asyncio.TimeoutError:
+            self.shed += 1
+            return False
+        finally:
+            self.waiting -= 1
+
+    async def release(self):
+        self.active -= 1
+        if self.waiting:
+            room = self._get_room()
+            async with room:
+                room.notify()
+
+
+class HandlerQueue:
+    '''Runs at most limit handlers at once, holding up to max_waiting more until there is room.
+    Once that many are waiting, the DROP_OLDEST policy drops the longest waiting and REJECT drops the newest.
+    '''
+    def __init__(self, limit:int=MAX_DATAGRAM_HANDLERS, policy:str=DROP_OLDEST, max_waiting:int=MAX_WAITING_DATAGRAMS):
+        self.limit = limit
+        self.policy = policy
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.handled = 0
+        self.shed = 0
+        self._waiting = collections.deque()
+
+    @property
+    def queue_depth(self):
+        return len(self._waiting)
+
+    def submit(self, handler, *args, on_start=None):
+        '''Schedules handler(*args), a coroutine function, to run when there is room.
+        on_start, if given, is called just before the handler starts, so never for a handler that is shed while waiting.
+        Returns False if it was shed straight away.
+        '''
+        if self.in_flight < self.limit:
+            self._start(handler, args, on_start)
+            return True
+        if len(self._waiting) >= self.max_waiting:
+            self.shed += 1
+            if self.policy != DROP_OLDEST or not self._waiting:
+                return False
+            self._waiting.popleft()
+        self._waiting.append((handler, args, on_start))
+        return True
+
+    def _start(self, handler, args, on_start=None):
+        if on_start is not None:
+            try:
+                on_start()
+            except Exception as ex:
+                logging.error(''.join(("Handler start callback failed: ", repr(ex))))
+        self.in_flight += 1
+        task = asyncio.ensure_future(handler(*args))
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self.in_flight -= 1
+        self.handled += 1
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(''.join(("Handler failed: ", repr(task.exception()))))
+        while self._waiting and self.in_flight < self.limit:
+            handler, args, on_start = self._waiting.popleft()
+            self._start(handler, args, on_start)
@@ -0,0 +1,69 @@
+'''Compares the Secretary's previous framing (1024 byte slices, drain per slice, growing bytes on read)
+with framing.py over a loopback connection.
+Run from the repository root: python benchmarks/framing_benchmark.py
+'''
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import framing
+
+
+MAX_BYTE_TRANSFER = 1024
+SIZES = [("1 KB", 1024, 2000), ("100 KB", 100 * 1024, 200), ("10 MB", 10 * 1024 * 1024, 2)]
+
+
+async def legacy_write(writer, data):
+    writer.write(len(data).to_bytes(length=4, byteorder='big'))
+    index = 0
+    while index < len(data):
+        start_index = index
+        index += MAX_BYTE_TRANSFER
+        writer.write(data[start_index:index])
+        await writer.drain()
+
+async def legacy_read(reader):
+    data_size = int.from_bytes(bytes=await reader.readexactly(4), byteorder='big')
+    data = b''
+    while len(data) < data_size:
+        received = await reader.read(MAX_BYTE_TRANSFER)
+        data = data + received
+    return data
+
+async def framed_write(writer, data):
+    await framing.write_frame(writer=writer, payload=data)
+
+async def framed_read(reader):
+    return await framing.read_frame(reader=reader)
+
+async def run(write, read, payload, repeat):
+    # The legacy reader can read past the end of a frame, so every frame is acknowledged before the next is sent
+    async def serve(reader, writer):
+        for _ in range(repeat):
+            writer.write(len(await read(reader)).to_bytes(length=4, byteorder='big'))
+        writer.close()
+    server = await asyncio.start_server(serve, host='127.0.0.1', port=0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection(host='127.0.0.1', port=port)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await write(writer, payload)
+        assert int.from_bytes(await reader.readexactly(4), byteorder='big') == len(payload)
+    elapsed = time.perf_counter() - start
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return elapsed / repeat
+
+async def main():
+    print("size      legacy (ms/frame)   framing (ms/frame)   speedup")
+    for label, size, repeat in SIZES:
+        payload = os.urandom(size)
+        legacy = await run(legacy_write, legacy_read, payload, repeat)
+        framed = await run(framed_write, framed_read, payload, repeat)
+        print("{:<9} {:>17.3f}   {:>18.3f}   {:>6.1f}x".format(label, legacy * 1000, framed * 1000, legacy / framed))
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(main())
@@ -0,0 +1,67 @@
+'''Compares the previous intersect_strings (trying every substring, longest first) with fuzzy_index,
+picking the best match for a request from a set of saved site names, once by scanning them all and once from a FuzzyIndex.
+Run from the repository root: python benchmarks/fuzzy_benchmark.py
+'''
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fuzzy_index
+
+
+REPEAT = 20
+SITES = 2000
+WORDS = ("news", "music", "video", "mail", "maps", "store", "docs", "drive", "photos", "games", "forum", "wiki", "weather", "sports", "recipes", "travel")
+
+
+def legacy_intersect(item_one, item_two, minimum_word_size=2):
+    item_one = item_one.lower()
+    item_two = item_two.lower()
+    char_count = 0
+    start = 0
+    while start < len(item_one):
+        end = len(item_one)
+        while end > start:
+            possible_match = item_one[start:end]
+            if len(possible_match) > minimum_word_size and possible_match in item_two:
+                char_count += end - start
+                item_two = item_two.replace(possible_match, '', 1)
+                start = end - 1
+                break
+            end -= 1
+        start += 1
+    return char_count
+
+def legacy_greedy_match(match_string, possible_matches):
+    matches = {possible_match: legacy_intersect(match_string, possible_match) for possible_match in possible_matches}
+    return sorted(matches.items(), key=lambda x: x[1], reverse=True)[0][0]
+
+def scan_greedy_match(match_string, possible_matches):
+    return max(possible_matches, key=lambda possible_match: fuzzy_index.intersect(match_string, possible_match)[0])
+
+def measure(function, repeat:int=REPEAT):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+def main():
+    random.seed(0)
+    sites = ["{}{}.com {}".format(random.choice(WORDS), number, random.choice(WORDS)) for number in range(SITES)]
+    request = "open the weather1234 site for photos"
+    build_time, index = measure(lambda: fuzzy_index.FuzzyIndex(candidates=sites), repeat=1)
+    cases = [
+        ("legacy", lambda: legacy_greedy_match(request, sites)),
+        ("scan", lambda: scan_greedy_match(request, sites)),
+        ("index", lambda: index.get_greedy_match(request)["match"]),
+    ]
+    print("{} sites, index built in {:.2f} ms".format(SITES, build_time * 1e3))
+    print("method   ms/match   match")
+    for label, function in cases:
+        match_time, match = measure(function)
+        print("{:<8} {:>8.2f}   {}".format(label, match_time * 1e3, match))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''Compares the previous Message (a plain object with a list header, distilled with copy.deepcopy)
+with the slotted Message in communication.py: construction, distill_msg and deriving a header.
+Run from the repository root: python benchmarks/message_benchmark.py
+'''
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import command  # imported before communication, as cerebrate does, to settle their import cycle
+import communication
+import mysysteminfo
+
+
+REPEAT = 100000
+TEXT = ("tell everyone in the kitchen that dinner is ready " * 80).strip()  # about 4 KB
+
+
+class LegacyMessage:
+    sender_mac = None
+    sender_ip = None
+    header = None
+    data = None
+
+    def __init__(self, *headers, data:list=None):
+        self.sender_mac = mysysteminfo.get_mac_address()
+        self.sender_ip = mysysteminfo.get_ip_address()
+        self.header = [header for header in headers if header]
+        self.data = data
+
+def legacy_distill(msg, sediment):
+    distilled = copy.deepcopy(msg)
+    if sediment.lower() in distilled.data.lower():
+        distilled.header.append(sediment.lower())
+        distilled.data = distilled.data.replace(sediment, '', 1).strip()
+    return distilled
+
+def legacy_derive(msg, header):
+    derived = copy.copy(msg)
+    derived.header = msg.header + [header]
+    return derived
+
+def measure(function, repeat:int=REPEAT):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    legacy_msg = LegacyMessage("cmd", "message", data=TEXT)
+    msg = communication.Message("cmd", "message", data=TEXT)
+    cases = [
+        ("construct", lambda: LegacyMessage("cmd", "message", data=TEXT), lambda: communication.Message("cmd", "message", data=TEXT)),
+        ("distill", lambda: legacy_distill(legacy_msg, "Kitchen"), lambda: communication.distill_msg(msg, "Kitchen")),
+        ("derive", lambda: legacy_derive(legacy_msg, "keep alive"), lambda: msg.derive("keep alive")),
+    ]
+    print("operation   legacy (us/op)   slotted (us/op)   speedup")
+    for label, legacy, slotted in cases:
+        legacy_time = measure(legacy)
+        slotted_time = measure(slotted)
+        print("{:<11} {:>14.2f}   {:>15.2f}   {:>6.1f}x".format(label, legacy_time * 1e6, slotted_time * 1e6, legacy_time / slotted_time))
+    print("instance size: legacy {} bytes + {} byte __dict__, slotted {} bytes".format(
+        sys.getsizeof(legacy_msg), sys.getsizeof(legacy_msg.__dict__), sys.getsizeof(msg)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+'''Compares pickle with the wire codec on a 20 record update_records Message, as the overmind receives when records are synced:
+frame size, encode and decode time, with the value encoded with the schema and embedded pickled (the default).
+Run from the repository root: python benchmarks/wire_benchmark.py
+'''
+import datetime
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import command  # imported before communication, as cerebrate does, to settle their import cycle
+import cerebratesinfo, communication, wire_codec
+from cerebratesinfo import Record, Role, Status
+
+
+REPEAT = 2000
+RECORDS = 20
+
+
+def make_record(number:int):
+    mac = ':'.join(["0A", "0B", "0C", "0D", "0E", "{:02X}".format(number)])
+    record = cerebratesinfo.default_dictionary()
+    record[Record.NAME] = "cerebrate{}".format(number)
+    record[Record.MAC] = mac
+    record[Record.IP] = "192.168.0.{}".format(100 + number)
+    record[Record.LOCATION] = ("kitchen", "office", "living room", "garage")[number % 4]
+    record[Record.ROLE] = Role.OVERMIND if number == 0 else Role.DRONE
+    record[Record.STATUS] = Status.AWAKE
+    record[Record.LASTCONTACT] = datetime.datetime(2026, 10, 18, 12, 0, number)
+    record[Record.MANIFEST] = "{:064x}".format(number * 7919)
+    record[Record.TAGS] = ["speaker", "display"] if number % 2 else ["speaker"]
+    record[Record.VERSION] = (1792310400000 + number, number % 3, mac)
+    return record
+
+def measure(function, repeat:int=REPEAT):
+    best = None
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        elapsed = (time.perf_counter() - start) / repeat
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    msg = communication.Message("update_records", data=[make_record(number) for number in range(RECORDS)])
+    msg.sender_mac, msg.sender_ip, msg.timestamp = "0A:0B:0C:0D:0E:FF", "192.168.0.99", (1792310400000, 0, "0A:0B:0C:0D:0E:FF")
+    pickled = pickle.dumps(msg)
+    print("{} record update_records Message".format(RECORDS))
+    print("format          bytes   encode (us)   decode (us)")
+    print("{:<15} {:>5}   {:>11.1f}   {:>11.1f}".format("pickle", len(pickled), measure(lambda: pickle.dumps(msg)) * 1e6, measure(lambda: pickle.loads(pickled)) * 1e6))
+    for label, schema in (("wire schema", True), ("wire pickled", False)):
+        encoded = wire_codec.encode(msg, schema=schema)
+        assert wire_codec.decode(encoded)[0].data == msg.data
+        print("{:<15} {:>5}   {:>11.1f}   {:>11.1f}".format(label, len(encoded), measure(lambda: wire_codec.encode(msg, schema=schema)) * 1e6, measure(lambda: wire_codec.decode(encoded)) * 1e6))
+        compressed = wire_codec.compress(encoded, compression=wire_codec.ZLIB_DICTIONARY)
+        print("{:<15} {:>5}   {:>11.1f}   {:>11.1f}".format(label + " zlib", len(compressed),
+            measure(lambda: wire_codec.compress(wire_codec.encode(msg, schema=schema), compression=wire_codec.ZLIB_DICTIONARY)) * 1e6, measure(lambda: wire_codec.decode(compressed)) * 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -12,7 +12,7 @@ try:
     import asyncio
     import cerebrate_config as cc
     from aioconsole import ainput
-    import audio, cerebratesinfo, command, communication, mysysteminfo, utilities
+    import audio, cerebratesinfo, command, communication, election, gossip, heartbeat, manifest, mysysteminfo, utilities
     from utilities import dprint, get_cerebrate_file_names
     from resources import resource_handler
     import traceback
@@ -61,8 +61,25 @@ async def audio_listener(loop):
         except Exception:
             traceback.print_exc()
             
+async def address_changed(previous_ip, ip):
+    '''Moves the Secretary's servers to the new IP address, and tells the other cerebrates about it once they are there.
+    Returns False if the servers couldn't be moved yet, to be tried again on the next address poll.
+    '''
+    print("IP address changed from ", previous_ip, " to ", ip)
+    if not await communication.Secretary.rebind():
+        logging.warning(''.join(("Not announcing IP address ", str(ip), " until the servers are bound to it")))
+        return False
+    cerebratesinfo.update_my_record()
+    communication.Secretary.broadcast_message(msg=communication.Message("update_records", data=[cerebratesinfo.get_cerebrate_record(record_attribute=cerebratesinfo.Record.MAC, attribute_value=mysysteminfo.get_mac_address())]))
+    return True
+
 def start_listeners(loop):
     communication.initialize(loop=loop)
+    if gossip.is_enabled():
+        gossip.start(loop=loop)
+    heartbeat.start(loop=loop)
+    cerebratesinfo.start_flushing(loop=loop)
+    asyncio.ensure_future(mysysteminfo.watch_ip_address(on_change=address_changed), loop=loop)
     asyncio.ensure_future(console_listener(), loop=loop)
     asyncio.ensure_future(audio_listener(loop), loop=loop)
 
@@ -74,13 +91,15 @@ def setup_loop():
 def say_hello():
     #Assume everyone is asleep
     for mac in cerebratesinfo.get_cerebrate_macs():
-        cerebratesinfo.update_cerebrate_attribute(mac=mac, record_attribute=cerebratesinfo.Record.STATUS, attribute_value=cerebratesinfo.Status.ASLEEP)
+        cerebratesinfo.update_cerebrate_attribute(mac=mac, record_attribute=cerebratesinfo.Record.STATUS, attribute_value=cerebratesinfo.Status.ASLEEP, stamp=False)
     #Set self status to awake
     cerebratesinfo.update_cerebrate_attribute(mac=mysysteminfo.get_mac_address(), record_attribute=cerebratesinfo.Record.STATUS, attribute_value=cerebratesinfo.Status.AWAKE)
-    #Assume we are the only cerebrate up, temporarily designate ourself as Overmind
-    cerebratesinfo.designate_overmind(mac=mysysteminfo.get_mac_address())
     #Contact existing Overmind, if there is one
-    communication.Secretary.broadcast_message(msg=communication.Message('acknowledge', data={"version": cc.my_version}))
+    manifest_digest = cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=mysysteminfo.get_mac_address(), record_attribute=cerebratesinfo.Record.MANIFEST)
+    communication.Secretary.broadcast_message(msg=communication.Message('acknowledge', data={"version": cc.my_version, "manifest": manifest_digest}))
+    #If none answers, elect one
+    election.load_term()
+    asyncio.ensure_future(election.elect_if_leaderless())
 
 async def designate_successor():
     '''Establishes a new Overmind among the remaining (awake) cerebrates.
@@ -88,15 +107,7 @@ async def designate_successor():
     '''
     successor_mac = cerebratesinfo.get_overmind_mac()
     if mysysteminfo.get_mac_address() == successor_mac:
-        for record in cerebratesinfo.get_cerebrate_records():
-            if record.get(cerebratesinfo.Record.MAC) == mysysteminfo.get_mac_address():
-                continue
-            if record.get(cerebratesinfo.Record.STATUS, cerebratesinfo.Status.UNKNOWN) == cerebratesinfo.Status.AWAKE:
-                if cerebratesinfo.designate_overmind(mac=record.get(cerebratesinfo.Record.MAC, None)):
-                    received = await communication.Secretary.communicate_message(cerebrate_mac=record.get(cerebratesinfo.Record.MAC, None), msg=communication.Message("assume_overmind", data=None))
-                    if received == cc.SUCCESS:
-                        successor_mac = record.get(cerebratesinfo.Record.MAC)
-                        break
+        successor_mac = await election.hand_over()
     return successor_mac
     
 async def say_goodbye():
@@ -105,11 +116,12 @@ async def say_goodbye():
     #Tell Overmind that we are going to sleep
     # If no other cerebrate is online we end up sending this to ourselves, which is ignored
     cerebratesinfo.update_cerebrate_attribute(mac=mysysteminfo.get_mac_address(), record_attribute=cerebratesinfo.Record.STATUS, attribute_value=cerebratesinfo.Status.ASLEEP)
-    cerebratesinfo.update_cerebrate_contact_time(mac=mysysteminfo.get_mac_address())
+    cerebratesinfo.update_cerebrate_contact_time(mac=mysysteminfo.get_mac_address(), stamp=True)
     await communication.Secretary.communicate_message(cerebrate_mac=successor_mac, msg=communication.Message("update_records", data=[cerebratesinfo.get_cerebrate_record(record_attribute=cerebratesinfo.Record.MAC, attribute_value=mysysteminfo.get_mac_address())]))
 
 async def terminate(msg=None, loop=None):
     await say_goodbye()
+    cerebratesinfo.stop_flushing()
     cc.change_my_state(state=cc.State.TERMINATING)
     if not loop:
         loop = asyncio.get_event_loop()
@@ -122,6 +134,7 @@ if __name__ == '__main__':
     signal.signal(signalnum=signal.SIGINT, handler=sigint_handler)
     loop = setup_loop()
     start_listeners(loop=loop)
+    loop.run_until_complete(manifest.advertise_manifest())
     say_hello()
     try:
         print("\nCerebrate online\n")
@@ -135,6 +148,7 @@ if __name__ == '__main__':
         print("\nCerebrate going offline...")
         loop.run_until_complete(loop.shutdown_asyncgens())
         loop.close()
+        cerebratesinfo.flush()
         print("Cerebrate offline\n")
         if cc.restart_cerebrate_on_terminate:
             restart_cerebrate()
\ No newline at end of file
@@ -17,6 +17,14 @@ COMMAND = "cmd"
 REMOTE_COMMAND = "remotecmd"
 FILE_TRANSFER = "filetransfer"
 CLOSE_CONNECTION = "close connection"
+BATCH = "batch"
+KEEP_ALIVE = "keep alive"
+DATAGRAM_ACK = "datagram ack"
+MULTICAST = "multicast"
+HEARTBEAT = "heartbeat"
+
+CALL = "call"
+RESPONSE = "response"
 
 RECIPROCATE = "reciprocate"
 OVERRULE = "overrule"
@@ -27,6 +35,8 @@ FINISHED = "finished"
 
 LOCATION = "location"
 NAME = "name"
+SIZE = "size"
+HASH = "hash"
 
 # Operation flags
 update_in_progress = False
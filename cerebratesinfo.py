@@ -1,11 +1,15 @@
+import asyncio
+import atexit
 import collections
+import copy
 import os
 import shelve
 import json
 import enum
 import datetime
 import logging
-import mysysteminfo
+import threading
+import hlc, mysysteminfo
 from utilities import dprint
 
 
@@ -23,6 +27,9 @@ class Record(enum.Enum):
 	ROLE = enum.auto()
 	STATUS = enum.auto()
 	LASTCONTACT = enum.auto()
+	MANIFEST = enum.auto()
+	TAGS = enum.auto()
+	VERSION = enum.auto()
 
 class Status(enum.Enum):
 	AWAKE = enum.auto()
@@ -39,52 +46,145 @@ def default_dictionary():
 
 initialized = False
 
+# Records are kept in memory, read from disk once and found through indexes on the attributes they are looked up by.
+# Changed records are noted in a journal and written to disk together, every FLUSH_INTERVAL seconds and on shutdown.
+FLUSH_INTERVAL = 5
+INDEXED_ATTRIBUTES = (Record.MAC, Record.NAME, Record.LOCATION, Record.ROLE, Record.STATUS)
+UNVERSIONED = hlc.from_datetime(datetime.datetime(1, 1, 1))  # version of records no change has been stamped on yet, the same on every cerebrate and older than any stamped one
+
+_records = None  # mac: record, read from disk when first needed
+_indexes = {record_attribute: collections.defaultdict(dict) for record_attribute in INDEXED_ATTRIBUTES}  # attribute: key: {mac: None}
+_index_keys = {}  # mac: {attribute: key it is filed under}
+_journal = set()  # macs of records changed since the last flush
+_lock = threading.RLock()
+_flush_lock = threading.Lock()
+_flush_task = None
+
+
+def _get_index_key(value):
+    '''Returns the key a record is filed under for the given attribute value, None if it can't be filed.
+    Strings are compared regardless of case.
+    '''
+    if isinstance(value, str):
+        return value.upper()
+    try:
+        hash(value)
+    except TypeError:
+        return None
+    return value
+
+def _file(mac, record):
+    '''Files the record in the indexes, taking it out from under the keys it was filed under before.
+    '''
+    for record_attribute, key in _index_keys.pop(mac, {}).items():
+        macs = _indexes[record_attribute].get(key, None)
+        if macs is not None:
+            macs.pop(mac, None)
+            if not macs:
+                del _indexes[record_attribute][key]
+    keys = {}
+    for record_attribute in INDEXED_ATTRIBUTES:
+        key = _get_index_key(record.get(record_attribute, ""))
+        if key is not None:
+            _indexes[record_attribute][key][mac] = None
+            keys[record_attribute] = key
+    _index_keys[mac] = keys
+
+def _load():
+    '''Returns the dict of mac: record for all known cerebrates, reading it from disk the first time.
+    '''
+    global _records
+    if _records is None:
+        with _lock:
+            if _records is None:
+                records = {}
+                with shelve.open(CEREBRATE_RECORDS, flag='r') as db:
+                    for key in db:
+                        records[key] = db[key]
+                for mac, record in records.items():
+                    _file(mac=mac, record=record)
+                _records = records
+    return _records
+
+def _put(mac, record):
+    '''Stores the record in memory and notes it in the journal, to be written to disk by the next flush.
+    Callers hold _lock.
+    '''
+    _load()[mac] = record
+    _file(mac=mac, record=record)
+    _journal.add(mac)
+
+def _get_or_create(mac):
+    record = _load().get(mac, None)
+    if not record:
+        record = default_dictionary()
+        record[Record.MAC] = mac
+        record[Record.VERSION] = UNVERSIONED
+    return record
+
+def _find_macs(record_attribute, attribute_value):
+    '''Returns the macs of the records whose attribute matches the given value, regardless of case for strings.
+    '''
+    records = _load()
+    key = _get_index_key(attribute_value)
+    if record_attribute in _indexes:
+        return list(_indexes[record_attribute].get(key, ()))
+    return [mac for mac, record in list(records.items()) if _get_index_key(record.get(record_attribute, "")) == key]
 
 def get_cerebrate_names():
     '''Returns an iterator for all known cerebrate names.
     '''
-    with shelve.open(CEREBRATE_RECORDS, flag='r') as db:
-        for key in db:
-            yield db[key].get(Record.NAME, "unknown")
+    for record in list(_load().values()):
+        yield record.get(Record.NAME, "unknown")
 
 def get_cerebrate_mac(record_attribute, cerebrate_attribute):
     '''Returns the mac of the cerebrate with the given attribute value.
     Returns None if no matches are found.
     '''
-    with shelve.open(CEREBRATE_RECORDS, flag='r') as db:
-        for key in db:
-            if db[key].get(record_attribute, "unknown") == cerebrate_attribute:
-                return db[key].get(Record.MAC)
+    records = _load()
+    for mac in _find_macs(record_attribute=record_attribute, attribute_value=cerebrate_attribute):
+        record = records.get(mac, None)
+        if record is not None and record.get(record_attribute, "unknown") == cerebrate_attribute:
+            return record.get(Record.MAC)
     return None
 
 def get_cerebrate_macs():
     '''Returns a list of all known cerebrate macs.
     '''
-    macs = []
-    with shelve.open(CEREBRATE_RECORDS, flag='r') as db:
-        for key in db:
-            macs.append(db[key].get(Record.MAC, "unknown"))
-    return macs
+    return [record.get(Record.MAC, "unknown") for record in list(_load().values())]
     
 def get_cerebrate_locations():
     '''Returns a list of all known cerebrate locations.
     '''
-    locations = []
-    with shelve.open(CEREBRATE_RECORDS, flag='r') as db:
-        for key in db:
-            locations.append(db[key].get(Record.LOCATION, "unknown"))
-    return locations
+    return [record.get(Record.LOCATION, "unknown") for record in list(_load().values())]
 
-def update_cerebrate_attribute(mac, record_attribute, attribute_value):
+def update_cerebrate_attribute(mac, record_attribute, attribute_value, stamp=True):
+    '''Sets the attribute value in the given cerebrate's record.
+    If stamp is False the change is a local observation (status, IP), and doesn't give the record a new version.
+    '''
     if not mac:
         return False
-    with shelve.open(CEREBRATE_RECORDS, writeback=True) as db:
-        if not db.get(mac, None):
-            db[mac] = default_dictionary()
-            db[mac][Record.MAC] = mac
-        db[mac][record_attribute] = attribute_value
+    with _lock:
+        record = _get_or_create(mac=mac)
+        record[record_attribute] = attribute_value
+        if stamp:
+            record[Record.VERSION] = hlc.now()
+        _put(mac=mac, record=record)
     return True
 
+def get_record_version(cerebrate_record):
+    '''Returns the hybrid logical clock timestamp ordering versions of a cerebrate's record, newer records having greater versions.
+    Records from before they were stamped are ordered by their contact time.
+    '''
+    return cerebrate_record.get(Record.VERSION, None) or hlc.from_datetime(cerebrate_record.get(Record.LASTCONTACT, None) or datetime.datetime(1, 1, 1))
+
+def get_record_versions():
+    '''Returns a dict of mac: record version for all known cerebrates, for comparing records with peers.
+    Only stamped versions are compared. Contact times are local observations that differ from cerebrate to cerebrate,
+    so records without a version are all UNVERSIONED here.
+    '''
+    return {mac: record.get(Record.VERSION, None) or UNVERSIONED for mac, record in list(_load().items())}
+
 def update_cerebrate_record(cerebrate_record):
     '''Overwrites the appropriate cerebrate record with the given record.
     Creates a new one if the given cerebrate does not exist.
@@ -95,46 +195,57 @@ def update_cerebrate_record(cerebrate_record):
         logging.warning('No MAC address provided in record:')
         logging.info(''.join(("record: ", str(cerebrate_record))))
         return False
-    with shelve.open(CEREBRATE_RECORDS, writeback=True) as db:
-        if not db.get(mac, None):
-            db[mac] = default_dictionary()
-        cerebrate_time = cerebrate_record.get(Record.LASTCONTACT, datetime.datetime(1, 1, 1))
-        db_time = db[mac].get(Record.LASTCONTACT, datetime.datetime(1, 1, 1))
-        #print(cerebrate_time, " vs ", db_time)
-        if cerebrate_time >= db_time:
-            #print("Updating '", mac, "' record")
+    cerebrate_version = get_record_version(cerebrate_record)
+    #a version too far ahead of the local clock would win out over every later change to the record
+    if Record.VERSION in cerebrate_record and not hlc.receive(cerebrate_version):
+        logging.warning(''.join(("Rejecting record of ", str(mac), " with version ", str(cerebrate_version), " too far ahead of the local clock")))
+        return False
+    with _lock:
+        known_record = _load().get(mac, None)
+        #an equal version is the same update, so it is only accepted (and passed on) once
+        if not known_record or cerebrate_version > get_record_version(known_record):
             dprint("Updating record:")
             dprint(cerebrate_record)
-            db[mac] = cerebrate_record
+            _put(mac=mac, record=copy.copy(cerebrate_record))
             return True
         else:
             dprint("Out of date:")
             dprint(cerebrate_record)
             return False
-    return True
 
 def get_cerebrate_record(record_attribute, attribute_value):
-    '''Returns the first cerebrate found that matches the given attribute value.
+    '''Returns a copy of the first cerebrate found that matches the given attribute value.
     Returns None if no matching cerebrate is found.
     '''
-    with shelve.open(CEREBRATE_RECORDS, flag='r') as db:
-	    return next((db[key] for key in db if db[key].get(record_attribute, "").upper() == attribute_value.upper()), None)
+    records = _load()
+    for mac in _find_macs(record_attribute=record_attribute, attribute_value=attribute_value):
+        record = records.get(mac, None)
+        if record is not None:
+            return copy.copy(record)
     return None
 
+def _get_overmind_mac():
+    '''Returns the mac the Overmind's record is kept under, the local mac if no cerebrate is known to be Overmind.
+    '''
+    for mac in _indexes[Record.ROLE].get(Role.OVERMIND, ()):
+        return mac
+    return mysysteminfo.get_mac_address()
+
 def get_overmind_record():
-    with shelve.open(CEREBRATE_RECORDS, flag='r') as db:
-        return next((db[key] for key in db if db[key].get(Record.ROLE, Role.DRONE) == Role.OVERMIND), get_cerebrate_record(record_attribute=Record.MAC, attribute_value=mysysteminfo.get_mac_address()))
+    _load()
+    return get_cerebrate_record(record_attribute=Record.MAC, attribute_value=_get_overmind_mac())
 
 def get_overmind_mac():
-    record = get_overmind_record()
+    record = _load().get(_get_overmind_mac(), None)
+    if record is None:
+        return ''
     return record.get(Record.MAC, '')
 
 def get_cerebrate_records():
-    '''Returns an iterator for all known cerebrate records.
+    '''Returns an iterator for copies of all known cerebrate records.
     '''
-    with shelve.open(CEREBRATE_RECORDS, flag='r') as db:
-        for key in db:
-            yield db[key]
+    for record in list(_load().values()):
+        yield copy.copy(record)
 
 def get_cerebrate_records_list():
     '''Returns the full list of all known cerebrate records.
@@ -148,8 +259,7 @@ def get_cerebrate_attribute(cerebrate_mac, record_attribute):
     '''Returns the requested attribute value for the given cerebrate.
     Returns an empty string if the cerebrate does not have a value for that attribute.
     '''
-    with shelve.open(CEREBRATE_RECORDS, flag='r') as db:
-    	return db[cerebrate_mac].get(record_attribute, "")
+    return _load()[cerebrate_mac].get(record_attribute, "")
 
 def update_my_record():
     '''Updates the local cerebrate's record (mostly IP address, but also sets defaults for any attributes without values).
@@ -161,36 +271,91 @@ def update_my_record():
     my_record[Record.LASTCONTACT] = datetime.datetime.now()
     my_record[Record.STATUS] = Status.AWAKE
     my_record[Record.ROLE] = my_record.get(Record.ROLE, Role.DRONE)
+    my_record[Record.VERSION] = hlc.now()
     update_cerebrate_record(cerebrate_record=my_record)
 
-def update_cerebrate_contact_time(mac):
+def update_cerebrate_contact_time(mac, stamp=False):
+    '''Notes contact with the given cerebrate now.
+    If stamp is True the record also gets a new version, so that changes made to it win out when shared.
+    '''
     if not mac:
         return False
-    with shelve.open(CEREBRATE_RECORDS, writeback=True) as db:
-        if not db.get(mac, None):
-            db[mac] = default_dictionary()
-            db[mac][Record.MAC] = mac
-        #print("Updating '", mac, "' contact time")
-        db[mac][Record.LASTCONTACT] = datetime.datetime.now()
+    with _lock:
+        record = _get_or_create(mac=mac)
+        record[Record.LASTCONTACT] = datetime.datetime.now()
+        if stamp:
+            record[Record.VERSION] = hlc.now()
+        if mac in _records:
+            _journal.add(mac)
+        else:
+            _put(mac=mac, record=record)
     return True
 
 def designate_overmind(mac):
     if not mac:
         return False
-    success = False
-    with shelve.open(CEREBRATE_RECORDS, writeback=True) as db:
-        if not db.get(mac, None):
-            db[mac] = default_dictionary()
-            db[mac][Record.MAC] = mac
-        for record in get_cerebrate_records():
-            if record.get(Record.MAC) == mac:
-                db[mac][Record.ROLE] = Role.OVERMIND
-                success = True
-            elif record.get(Record.ROLE, Role.DRONE) == Role.OVERMIND:
-                db[record.get(Record.MAC)][Record.ROLE] = Role.QUEEN
-    #if success:
-        #update_cerebrate_contact_time(mac)
-    return success
+    with _lock:
+        _load()
+        for overmind_mac in list(_indexes[Record.ROLE].get(Role.OVERMIND, ())):
+            if overmind_mac != mac:
+                record = _records[overmind_mac]
+                record[Record.ROLE] = Role.QUEEN
+                record[Record.VERSION] = hlc.now()
+                _put(mac=overmind_mac, record=record)
+        record = _get_or_create(mac=mac)
+        record[Record.ROLE] = Role.OVERMIND
+        record[Record.VERSION] = hlc.now()
+        _put(mac=mac, record=record)
+    return True
+
+def flush():
+    '''Writes the records changed since the last flush to disk.
+    Returns the number of records written.
+    '''
+    global _journal
+    with _flush_lock:
+        with _lock:
+            if not _journal:
+                return 0
+            journal, _journal = _journal, set()
+            changed_records = {mac: copy.copy(_records[mac]) for mac in journal if mac in _records}
+        try:
+            with shelve.open(CEREBRATE_RECORDS) as db:
+                for mac, record in changed_records.items():
+                    db[mac] = record
+        except Exception:
+            with _lock:
+                _journal |= journal
+            raise
+    return len(changed_records)
+
+def is_flushing():
+    return _flush_task is not None and not _flush_task.done()
+
+def start_flushing(loop=None, interval:float=FLUSH_INTERVAL):
+    '''Starts writing changed records to disk every interval seconds.
+    '''
+    global _flush_task
+    if is_flushing():
+        return
+    _flush_task = asyncio.ensure_future(_flush_periodically(interval=interval), loop=loop)
+
+def stop_flushing():
+    '''Stops flushing periodically, and writes whatever changed since the last flush.
+    '''
+    global _flush_task
+    if _flush_task:
+        _flush_task.cancel()
+        _flush_task = None
+    flush()
+
+async def _flush_periodically(interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, flush)
+        except Exception as ex:
+            logging.error(ex)
 
 #for testing
 def add_specific_record():
@@ -214,4 +379,5 @@ if not initialized:
     os.makedirs(CEREBRATE_RECORDS, exist_ok=True)
     with shelve.open(CEREBRATE_RECORDS, flag='c'):
         '''do nothing'''
-    load()
\ No newline at end of file
+    load()
+    atexit.register(flush)
\ No newline at end of file
@@ -8,13 +8,14 @@ from utilities import aprint, dprint, intersect_strings
 from definitions import Command
 from communication import distill_msg
 from commands import emit, info, system, web, media_player
-import cerebrate_config as cc, mysysteminfo
+import cerebrate_config as cc, command_router, mysysteminfo
 
 
 COMMANDS_DIRECTORY = os.path.join(mysysteminfo.get_my_directory(), "commands")
 
 
 command_modules = []
+_router = command_router.CommandRouter(routes=[])
 
 
 async def _shutdown_(msg):
@@ -35,15 +36,16 @@ async def _what_(msg):
 #async def _location_(msg):
 #    return "'location' not implemented yet"
 
+@functools.lru_cache(maxsize=1024)
+def _format_header_item(cmd):
+    formatted_command = cmd.replace(".", " ")
+    formatted_command = formatted_command.lower()
+    formatted_command = formatted_command.replace(",", " ")
+    formatted_command = formatted_command.replace(" ", "_")
+    return formatted_command
+
 def format_header(header):
-    formatted_header = []
-    for cmd in header:
-        formatted_command = cmd.replace(".", " ")
-        formatted_command = formatted_command.lower()
-        formatted_command = formatted_command.replace(",", " ")
-        formatted_command = formatted_command.replace(" ", "_")
-        formatted_header.append(formatted_command)
-    return formatted_header
+    return [_format_header_item(cmd) for cmd in header]
 
 def format_command(cmd):
     formatted_command = cmd.replace(".", " ")
@@ -67,28 +69,23 @@ async def run_command(msg):
         return False
     cc.change_my_state(state=cc.State.COORDINATING)
     formatted_command = format_command(cmd=msg.data)
-    for module_name, command_key, command_dict in get_all_commands():
-        if command_key in formatted_command:
-        #if intersect_strings(command_key, formatted_command).get("char_count", 0) >= 2:
-        # test = command_key.split(" ")
-        # try:
-        #     answer = set(test).issubset(set(formatted_command))
-        # except:
-        #     traceback.print_exc()
-        # if answer:
-            #actually run the command
-            dprint(command_key)
-            module_function = getattr(sys.modules[module_name], command_dict[Command.FUNCTION])
-            result = await module_function(msg)
-            if result != False:
-                cc.change_my_state(state=cc.State.LISTENING)
-                return result
+    #every command whose key is in the input, in the order they would have been checked
+    for module_name, command_key, command_dict in _router.route(formatted_command):
+        #actually run the command
+        dprint(command_key)
+        module_function = getattr(sys.modules[module_name], command_dict[Command.FUNCTION])
+        result = await module_function(msg)
+        if result != False:
+            cc.change_my_state(state=cc.State.LISTENING)
+            return result
     aprint("I don't know what you mean by \'", msg.data, "\'.")
     cc.change_my_state(state=cc.State.LISTENING)
     return False
 
 def load_commands():
-    global command_modules
+    '''Collects the commands of every module in the commands directory, and compiles the router that finds them in input.
+    '''
+    global command_modules, _router
     dprint("Loading commands...")
     command_modules = []
     for module_filename in os.listdir(COMMANDS_DIRECTORY):
@@ -112,5 +109,6 @@ def load_commands():
                 command_modules.append(mod_path)
         except Exception as _:
             traceback.print_exc()
+    _router = command_router.CommandRouter(routes=[(command_key, (module_name, command_key, command_dict)) for module_name, command_key, command_dict in get_all_commands()])
 
 load_commands()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import collections
+
+
+# Console and voice commands are found by looking for command keys anywhere in the formatted input.
+# All keys are compiled into one Aho-Corasick automaton, which finds every key in a single pass over the input
+# however many keys there are, and recent inputs are remembered along with the commands they matched.
+ROUTE_CACHE_SIZE = 256
+
+
+class Automaton:
+    '''An Aho-Corasick automaton over a set of keys.
+    '''
+    def __init__(self, keys):
+        self._transitions = [{}]
+        self._fail = [0]
+        self._found = [()]
+        for key in keys:
+            self._add(key)
+        self._link()
+
+    def _add(self, key):
+        state = 0
+        for char in key:
+            next_state = self._transitions[state].get(char, None)
+            if next_state is None:
+                next_state = len(self._transitions)
+                self._transitions[state][char] = next_state
+                self._transitions.append({})
+                self._fail.append(0)
+                self._found.append(())
+            state = next_state
+        if key not in self._found[state]:
+            self._found[state] += (key,)
+
+    def _link(self):
+        # breadth first, so every state's fail state is finished before its children need it
+        queue = collections.deque(self._transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._transitions[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._transitions[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._transitions[fail].get(char, 0)
+                self._found[next_state] += self._found[self._fail[next_state]]
+
+    def find(self, text):
+        '''Returns the set of keys that occur in text.
+        '''
+        found = set()
+        state = 0
+        transitions = self._transitions
+        fail = self._fail
+        for char in text:
+            while state and char not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(char, 0)
+            if self._found[state]:
+                found.update(self._found[state])
+        return found
+
+
+class CommandRouter:
+    '''Finds the commands whose keys occur in an input.
+    Routes are (key, target) pairs, given in the order matching commands should be tried in.
+    '''
+    def __init__(self, routes, cache_size:int=ROUTE_CACHE_SIZE):
+        self._routes = list(routes)
+        self._targets = {}
+        for priority, (key, target) in enumerate(self._routes):
+            self._targets.setdefault(key, []).append((priority, target))
+        self._automaton = Automaton(keys=self._targets.keys())
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+
+    def route(self, text):
+        '''Returns the targets of every route whose key occurs in text, in route order.
+        '''
+        targets = self._cache.get(text, None)
+        if targets is not None:
+            self._cache.move_to_end(text)
+            return targets
+        matched = []
+        for key in self._automaton.find(text):
+            matched.extend(self._targets[key])
+        targets = tuple(target for _, target in sorted(matched, key=lambda match: match[0]))
+        self._cache[text] = targets
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return targets
@@ -12,6 +12,7 @@ _commands = {
 async def send_message(msg):
     data = msg.data
     recipients = []
+    locations = []
     for cerebrate in cerebratesinfo.get_cerebrate_records():
         name = cerebrate.get(cerebratesinfo.Record.NAME, "")
         if name in data:
@@ -21,14 +22,21 @@ async def send_message(msg):
                 communication.distill_msg(msg, name)
     for cerebrate in cerebratesinfo.get_cerebrate_records():
         location = cerebrate.get(cerebratesinfo.Record.LOCATION, "")
-        if location in data:
-            mac = cerebrate.get(cerebratesinfo.Record.MAC, "")
-            if not mac in recipients:
-                recipients.append(mac)    
-                communication.distill_msg(msg, location)
-    if recipients.__len__() <= 0:
+        if location and location in data and not location in locations:
+            locations.append(location)
+            communication.distill_msg(msg, location)
+    if len(recipients) <= 0 and len(locations) <= 0:
         recipients = cerebratesinfo.get_cerebrate_macs()
         recipients.remove(mysysteminfo.get_mac_address())
+    #everyone at a location is reached by one multicast, the rest and any that don't acknowledge it are messaged individually
+    recipients = [mac for mac in recipients if cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=mac, record_attribute=cerebratesinfo.Record.LOCATION) not in locations]
+    for location in locations:
+        members = []
+        for cerebrate in cerebratesinfo.get_cerebrate_records():
+            mac = cerebrate.get(cerebratesinfo.Record.MAC, "")
+            if cerebrate.get(cerebratesinfo.Record.LOCATION, "") == location and mac != mysysteminfo.get_mac_address() and not mac in recipients:
+                members.append(mac)
+        recipients.extend(await communication.Secretary.multicast_acked_message(msg=communication.Message('display_message', data=msg.data), record_attribute=cerebratesinfo.Record.LOCATION, attribute_value=location, cerebrate_macs=members))
     for recipient in recipients:
         await communication.Secretary.communicate_message(cerebrate_mac=recipient, msg=communication.Message('display_message', data=msg.data))
     # speak msg
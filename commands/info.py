@@ -3,7 +3,7 @@ from decorators import console_only
 import command
 from utilities import aprint, prompt
 from communication import distill_msg
-import audio, cerebratesinfo, communication, mysysteminfo
+import audio, cerebratesinfo, communication, gossip, mysysteminfo
 import traceback
 import re
 
@@ -50,6 +50,10 @@ async def change(msg):
             record[cerebratesinfo.Record.LOCATION] = await prompt(prompt_string="New location")
             cerebratesinfo.update_cerebrate_record(cerebrate_record=record)
             aprint(current_location, " => ", record.get(cerebratesinfo.Record.LOCATION, "unknown"))
+        if "_gossip_" in cmd:
+            attribute_recognized = True
+            gossip.set_enabled(enabled=not gossip.is_enabled())
+            aprint("Records spread ", "by gossip" if gossip.is_enabled() else "through the Overmind")
         '''
         if "_role_" in cmd:
             attribute_recognized = True
@@ -75,7 +79,11 @@ async def change(msg):
         msg.data = response
         aprint("")
     #broadcast the changes we made to other cerebrates
-    cerebratesinfo.update_cerebrate_contact_time(mac=mysysteminfo.get_mac_address())
+    cerebratesinfo.update_cerebrate_contact_time(mac=mysysteminfo.get_mac_address(), stamp=True)
+    communication.Secretary.update_multicast_groups()
+    if gossip.is_enabled():
+        #peers pick the change up from us as they gossip
+        return True
     msg = communication.Message("update_records", data=[cerebratesinfo.get_cerebrate_record(record_attribute=cerebratesinfo.Record.MAC, attribute_value=mysysteminfo.get_mac_address())])
     if cerebratesinfo.get_overmind_mac() == mysysteminfo.get_mac_address():
         communication.Secretary.broadcast_message(msg=msg)
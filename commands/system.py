@@ -1,11 +1,15 @@
+import asyncio
 import cerebrate, cerebrate_config as cc
 from definitions import Command
 from feedback import feedback_response, Response
+from utilities import aprint
+import cerebratesinfo, communication
 
 _commands = {
     '_terminate_': {Command.NAME: 'Terminate', Command.DESCRIPTION: 'Ends this cerebrate.', Command.USE: 'terminate', Command.FUNCTION: "terminate_loop"},
     '_hey_': {Command.NAME: 'Toggle Listening On', Command.DESCRIPTION: 'Toggles audio control on.', Command.USE: 'hey eddie', Command.FUNCTION: "toggle_listening"},
-    '_that\'s_all_': {Command.NAME: 'Toggle Listening Off', Command.DESCRIPTION: 'Toggles audio control off.', Command.USE: 'that\'s all', Command.FUNCTION: "toggle_listening"}
+    '_that\'s_all_': {Command.NAME: 'Toggle Listening Off', Command.DESCRIPTION: 'Toggles audio control off.', Command.USE: 'that\'s all', Command.FUNCTION: "toggle_listening"},
+    '_rollout_': {Command.NAME: 'Update Rollout', Command.DESCRIPTION: 'Shows the Overmind\'s update rollout, resuming it if it was halted by a failed wave.', Command.USE: 'rollout [resume]', Command.FUNCTION: "rollout"}
 }
 
 
@@ -27,4 +31,20 @@ async def toggle_listening(msg):
             cc.feedback_on_commands(False)
             feedback_response(Response.FAREWELL)
             command_complete = True
-    return command_complete
\ No newline at end of file
+    return command_complete
+
+async def rollout(msg):
+    '''Asks the Overmind for its update rollout status, resuming the rollout first if asked to.
+    '''
+    request = communication.Message("rollout", data={"resume": "resume" in msg.data.lower()})
+    try:
+        status = await communication.Secretary.call(cerebrate_mac=cerebratesinfo.get_overmind_mac(), msg=request)
+    except (asyncio.TimeoutError, ConnectionError):
+        aprint("The Overmind did not answer")
+        return False
+    if not isinstance(status, dict):
+        aprint("The Overmind does not know rollouts: ", status)
+        return False
+    aprint("Update rollout", " (halted)" if status.get("halted", False) else "", "\n",
+        '\n'.join([''.join(("\t", state, ": ", ", ".join(status.get(state, [])) or "none")) for state in ("pending", "updated", "failed", "refused")]))
+    return True
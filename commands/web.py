@@ -6,6 +6,7 @@ from definitions import Command
 from mysysteminfo import get_my_directory
 from decorators import athreaded
 from utilities import get_greedy_match, intersect_strings, dprint, pad_string
+from fuzzy_index import FuzzyIndex
 from communication import distill_msg, Secretary, Message
 from feedback import feedback
 from validators.url import url as validate_url
@@ -176,15 +177,9 @@ class Website(resource_handler.Resource_BC):
         If query_string is given will return the appropriate URL, provided search pattern has been previously saved.
         Returns None if no saved URL even remotely matches.
         '''
-        best_match = {}
-        for domain, ws in resource_handler.get_resources(section=_WEBSITE_SECTION):
-            contender = ws.get_greedy_match(match_string=match_string, minimum_word_size=minimum_word_size)
-            if contender.get("char_count", 0) > best_match.get("char_count", 0):
-                best_match = contender
-                best_match["domain"] = domain
-                best_match["ws"] = ws
+        best_match = _website_index.get_greedy_match(match_string=match_string, minimum_word_size=minimum_word_size)
         new_url = None
-        if best_match.get("char_count", 0) > 0:
+        if best_match["char_count"]:
             if query_string:
                 new_url = best_match["ws"].get_query_url(query_string=query_string)
             else:
@@ -192,6 +187,71 @@ class Website(resource_handler.Resource_BC):
         return new_url
 
 
+class _WebsiteIndex():
+    '''The saved websites, held in memory along with a FuzzyIndex of the names they can be asked for by.
+    Loaded from the websites section when first needed, and kept up to date through a resource_handler update hook.
+    '''
+    def __init__(self):
+        self._lock = Lock()
+        self._websites = None  # domain: Website
+        self._names = {}  # domain: the names it can be asked for by
+        self._owners = {}  # name: domain
+        self._index = FuzzyIndex()
+
+    def _load(self):
+        if self._websites is None:
+            self._websites = {}
+            for domain, ws in resource_handler.get_resources(section=_WEBSITE_SECTION):
+                self._put(domain=domain, ws=ws)
+
+    def _put(self, domain:str, ws:Website):
+        for name in self._names.pop(domain, ()):
+            if self._owners.get(name, None) == domain:
+                del self._owners[name]
+                self._index.remove(name)
+        # paths first, so a path name wins a tie with its bare domain
+        names = [' '.join((domain, path_name)) for path_name in ws.get_info()["paths"].keys()]
+        names.append(domain)
+        for name in names:
+            if name not in self._owners:
+                self._owners[name] = domain
+                self._index.add(name)
+        self._names[domain] = names
+        self._websites[domain] = ws
+
+    def update(self, section:str, resources:dict):
+        '''Takes in websites updated in resource_handler. Until the index is first needed they are left to be loaded from disk.
+        '''
+        with self._lock:
+            if self._websites is None:
+                return
+            for domain, value in resources.items():
+                ws = value.get(resource_handler.RESOURCE_VALUE, value) if type(value) is dict else value
+                if isinstance(ws, Website):
+                    self._put(domain=domain, ws=ws)
+
+    def get_websites(self):
+        '''Returns a list of domain, Website tuples.
+        '''
+        with self._lock:
+            self._load()
+            return list(self._websites.items())
+
+    def get_greedy_match(self, match_string:str, minimum_word_size:int=2):
+        '''Greedy matches between match_string and the names of all saved websites.
+        Returns a dict containing "match", "char_count" and the matching Website as "ws", all None if no websites are saved.
+        '''
+        with self._lock:
+            self._load()
+            best_match = self._index.get_greedy_match(match_string=match_string, minimum_word_size=minimum_word_size)
+            best_match["ws"] = self._websites.get(self._owners.get(best_match["match"], None), None)
+            return best_match
+
+
+_website_index = _WebsiteIndex()
+resource_handler.add_update_hook(section=_WEBSITE_SECTION, hook=_website_index.update)
+
+
 class _Lock_Bypass():
     '''Used to bypass lock.
     '''
@@ -234,14 +294,15 @@ async def list_info(msg):
         if "_all_" in distilled.data or "_every" in distilled.data:
             show_all = True
         requested_sites = []
+        websites = _website_index.get_websites()
         if not show_all:
-            for key in resource_handler.get_resource_keys(section=_WEBSITE_SECTION):
+            for key, _ in websites:
                 if intersect_strings(distilled.data, key)["char_count"] >= 4:
                     requested_sites.append(key)
         if len(requested_sites) <= 0:
             show_all = True
         display_strings = []
-        for key, ws in resource_handler.get_resources(section=_WEBSITE_SECTION):
+        for key, ws in websites:
             if show_all or key in requested_sites:
                 try:
                     display_strings.append(await form_display_string(website_info=ws.get_info()))
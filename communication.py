@@ -1,15 +1,18 @@
 import sys
 import asyncio
+import functools
+import itertools
 import pickle
-import socket
 import traceback
 import logging
 from contextlib import suppress
 import os
 import copy
+import time
 from datetime import datetime
 from decorators import print_func_name
-import cerebrate_config as cc, cerebratesinfo, command, mysysteminfo, remote_command, utilities
+from connection_pool import ConnectionPool, POOL_EVICTION_INTERVAL, POOL_IDLE_TIMEOUT
+import cerebrate_config as cc, admission, cerebratesinfo, command, file_transfer, fragmentation, framing, heartbeat, hlc, multicast, mysysteminfo, remote_command, utilities, wire_codec
 from utilities import dprint
 
 
@@ -17,41 +20,122 @@ BROADCAST = '255.255.255.255'
 TCP_PORT = 8888  # the base communication port, used for short communication and initializing prolonged communication
 UDP_PORT = 9999
 
-MAX_BYTE_TRANSFER = 1024
+MAX_FRAME_SIZE = framing.MAX_FRAME_SIZE
 COMMUNICATION_TIMEOUT = 14
+CONNECTION_TIMEOUT = 3
+SESSION_IDLE_TIMEOUT = POOL_IDLE_TIMEOUT * 2  # longer than the pool's, so the initiating side evicts first
+
+COALESCE_WINDOW = 0.05  # seconds queued Messages wait for others to the same destination
+COALESCE_MAX_MESSAGES = 32
+DATAGRAM_ACK_TIMEOUT = 0.05  # seconds before an unacknowledged datagram is first resent, doubling with each retry
+DATAGRAM_RETRIES = 3  # resends before falling back to TCP
+DATAGRAM_ACK_MARKER = 0xF8  # first byte of an ack, followed by the 4 byte id being acknowledged
+MULTICAST_ACK_TIMEOUT = 0.5  # seconds to wait for a group's members to acknowledge a multicast before messaging the rest individually
+MULTICAST_REFRESH_INTERVAL = 30  # seconds between checks of the local record for changed multicast groups
+REBIND_RETRY_INTERVAL = 5  # seconds before trying again to bind to a new IP address that couldn't be bound to
 
 EOF = b'\b'
 
 BY_REQUEST = "by request"
 TIMEOUT = "timed out"
+ERROR = "ERROR"
 
 event_loop = None
 
+_LOCAL = object()  # stands in for the sender fields of Messages made here, which are looked up when read
+
+
+def _intern_header(headers):
+    return tuple([sys.intern(header) if type(header) is str else header for header in headers if header])
+
 class Message:
     """A Message object for standardized communication in Cerebrate program.
     Header contains intended destination/function for Message, Data contains data.
+    The header is an immutable tuple, so Messages derived with derive() can share everything else.
     """
-    sender_mac = None
-    sender_ip = None
-    header = None
-    data = None
+    __slots__ = ('_sender_mac', '_sender_ip', '_header', 'data', 'correlation_id', 'timestamp')
 
     def __init__(self, *headers, data:list=None):
-        self.sender_mac = mysysteminfo.get_mac_address()
-        self.sender_ip = mysysteminfo.get_ip_address()
-        self.header = [header for header in headers if header]
+        self._sender_mac = _LOCAL
+        self._sender_ip = _LOCAL
+        # headers are almost always string literals, which are interned already; decoded headers are interned as they are set
+        self._header = tuple([header for header in headers if header])
         self.data = data
+        self.correlation_id = None  # set on cc.CALL requests and their cc.RESPONSE
+        self.timestamp = None  # the sender's hybrid logical clock when sent
+
+    @property
+    def sender_mac(self):
+        return mysysteminfo.get_mac_address() if self._sender_mac is _LOCAL else self._sender_mac
+
+    @sender_mac.setter
+    def sender_mac(self, value):
+        self._sender_mac = value
+
+    @property
+    def sender_ip(self):
+        return mysysteminfo.get_ip_address() if self._sender_ip is _LOCAL else self._sender_ip
+
+    @sender_ip.setter
+    def sender_ip(self, value):
+        self._sender_ip = value
+
+    @property
+    def header(self):
+        return self._header
+
+    @header.setter
+    def header(self, value):
+        self._header = _intern_header(value or ())
+
+    def derive(self, *headers, data=_LOCAL):
+        '''Returns a shallow copy of this Message with the given headers added, and data replaced if given.
+        '''
+        derived = self.__copy__()
+        if headers:
+            derived._header = self._header + _intern_header(headers)
+        if data is not _LOCAL:
+            derived.data = data
+        return derived
+
+    def __copy__(self):
+        copied = Message.__new__(Message)
+        copied._sender_mac = self._sender_mac
+        copied._sender_ip = self._sender_ip
+        copied._header = self._header
+        copied.data = self.data
+        copied.correlation_id = self.correlation_id
+        copied.timestamp = self.timestamp
+        return copied
+
+    def __getstate__(self):
+        # pickled as a plain dict with a list header, the form cerebrates from before the slotted Message unpickle
+        return {"sender_mac": self.sender_mac, "sender_ip": self.sender_ip, "header": list(self._header), "data": self.data,
+            "correlation_id": self.correlation_id, "timestamp": self.timestamp}
+
+    def __setstate__(self, state):
+        if type(state) is tuple:
+            # (dict state, slot state), as pickled for slotted objects without __getstate__
+            state = dict(state[0] or {}, **(state[1] or {}))
+        self._sender_mac = state.get("sender_mac", state.get("_sender_mac", None))
+        self._sender_ip = state.get("sender_ip", state.get("_sender_ip", None))
+        self._header = _intern_header(state.get("header", state.get("_header", ())) or ())
+        self.data = state.get("data", None)
+        self.correlation_id = state.get("correlation_id", None)
+        self.timestamp = state.get("timestamp", None)
+
+wire_codec.register_message_class(Message)
 
 
 def distill_msg(msg, sediment):
     '''Moves the first sediment from msg.data to msg.header.
+    The payload is never copied, the distilled Message shares everything but its header and data with msg.
     Returns the distilled msg.
     '''
-    distilled = copy.deepcopy(msg)
-    if sediment.lower() in distilled.data.lower():
-        distilled.header.append(sediment.lower())
-        distilled.data = distilled.data.replace(sediment, '', 1).strip()
-    return distilled
+    lowered = sediment.lower()
+    if lowered not in msg.data.lower():
+        return msg
+    return msg.derive(lowered, data=msg.data.replace(sediment, '', 1).strip())
 
 async def handle_message(msg):
     '''Parses the message header and calls the appropriate function(s).
@@ -60,19 +144,49 @@ async def handle_message(msg):
     success = True
     try:
         if cc.CLOSE_CONNECTION in msg.header:
+            if cc.KEEP_ALIVE in msg.header:
+                return cc.CLOSE_CONNECTION, cc.KEEP_ALIVE
             return cc.CLOSE_CONNECTION, BY_REQUEST
         elif cc.FILE_TRANSFER in msg.header:
             return cc.FILE_TRANSFER, BY_REQUEST
+        elif cc.BATCH in msg.header:
+            return await handle_batch(msg=msg)
         else:
             return await remote_command.run_command(msg)
     except Exception as ex:
         success = False
         traceback.print_exc()
         logging.error(ex)
-        return cc.CLOSE_CONNECTION, "ERROR"
+        return cc.CLOSE_CONNECTION, ERROR
     #finally:
         #Secretary._made_contact(mac=msg.sender_mac, time=True)
 
+async def handle_batch(msg):
+    '''Handles each Message batched in msg.data in order.
+    Results of the batched Messages are discarded, so only Messages that don't expect a reply should be batched.
+    Returns an action, Message pair.
+    '''
+    for batched_msg in msg.data:
+        await handle_message(msg=batched_msg)
+    return cc.CLOSE_CONNECTION, "batch handled"
+
+def coalesce_messages(messages):
+    '''Merges Messages with identical headers and list data into one, keeping the order they were first seen in.
+    Returns the list of merged Messages.
+    '''
+    merged = []
+    by_header = {}
+    for msg in messages:
+        key = msg.header
+        if type(msg.data) is list and key in by_header:
+            by_header[key].data = by_header[key].data + msg.data
+            continue
+        msg = copy.copy(msg)
+        if type(msg.data) is list:
+            by_header[key] = msg
+        merged.append(msg)
+    return merged
+
 class Secretary(asyncio.Protocol):
     """Handles connections with other Cerebrates.
     """
@@ -81,13 +195,32 @@ class Secretary(asyncio.Protocol):
     udp_server = None
 
     _no_active_connections = asyncio.Event()
-    connections = []
+    connections = set()
+    _idle_sessions = {}  # writer: None, for incoming sessions waiting on their next message, the longest idle first
+    _pool = ConnectionPool()
+    _wire_versions = {}
+    _compressions = {}
+    _announced_compressions = set()
+    _compression_stats = {}
+    _call_channels = {}
+    _outbox = {}
+    _datagram_ids = itertools.count(1)
+    multicast_server = None
+    _multicast_groups = set()
+    _multicast_addresses = {}  # joined multicast address: group key
+    _pending_acks = {}
+    _multicast_acks = {}  # multicast ack id: (IPs of the members yet to acknowledge, future set once all have)
+    _rebind_retry = None
+    _bound_ip = None
+    _sessions = admission.SessionLimiter()
+    _datagram_handlers = admission.HandlerQueue()
+    _peer_rates = admission.RateLimiter()
 
     @staticmethod
     def _timed_out(mac):
         '''Makes a note that they may be asleep.
         '''
-        cerebratesinfo.update_cerebrate_attribute(mac=mac, record_attribute=cerebratesinfo.Record.STATUS, attribute_value=cerebratesinfo.Status.UNKNOWN)
+        cerebratesinfo.update_cerebrate_attribute(mac=mac, record_attribute=cerebratesinfo.Record.STATUS, attribute_value=cerebratesinfo.Status.UNKNOWN, stamp=False)
 
     @staticmethod
     def _made_contact(mac, ip=None, time=None):
@@ -96,8 +229,8 @@ class Secretary(asyncio.Protocol):
         If time is True will update contact time.
         '''
         if ip:
-            cerebratesinfo.update_cerebrate_attribute(mac=mac, record_attribute=cerebratesinfo.Record.IP, attribute_value=ip)
-            cerebratesinfo.update_cerebrate_attribute(mac=mac, record_attribute=cerebratesinfo.Record.STATUS, attribute_value=cerebratesinfo.Status.AWAKE)
+            cerebratesinfo.update_cerebrate_attribute(mac=mac, record_attribute=cerebratesinfo.Record.IP, attribute_value=ip, stamp=False)
+            cerebratesinfo.update_cerebrate_attribute(mac=mac, record_attribute=cerebratesinfo.Record.STATUS, attribute_value=cerebratesinfo.Status.AWAKE, stamp=False)
         if time:
             cerebratesinfo.update_cerebrate_contact_time(mac=mac)
 
@@ -108,18 +241,15 @@ class Secretary(asyncio.Protocol):
         '''
         if not reader:
             return None
-        data_size = await reader.readexactly(4)
-        data_size = int.from_bytes(bytes=data_size, byteorder='big')
-        data = b''
-        while len(data) < data_size:
-            received = await reader.read(MAX_BYTE_TRANSFER)
-            data = data + received
-        msg = pickle.loads(data)
+        data = await framing.read_frame(reader=reader, max_frame_size=MAX_FRAME_SIZE)
+        #large frames are decoded in an executor, so what the sender's frame tells about it is noted back here on the loop
+        msg, version, pickled = await framing.decode_frame(payload=data, decode=Secretary._decode_payload, loop=event_loop)
+        Secretary._note_sender(msg=msg, version=version, pickled=pickled)
         return msg
 
     @staticmethod
-    async def _write_message(writer, msg):
-        '''Writes a message to the reader.
+    async def _write_message(writer, msg, cerebrate_mac=None):
+        '''Writes a message to the reader, encoded for the given cerebrate.
         Returns True if successful.
         '''
         if not writer:
@@ -127,24 +257,165 @@ class Secretary(asyncio.Protocol):
         if not msg:
             return False
         #print("\n Sending ", msg, "\n")
-        data = pickle.dumps(msg)
-        writer.write(len(data).to_bytes(length=4, byteorder='big'))
-        index = 0
-        while index < len(data):
-            start_index = index
-            index += MAX_BYTE_TRANSFER
-            fragment = data[start_index:index]
-            writer.write(fragment)
-            await writer.drain()
+        data = Secretary._encode(msg=msg, cerebrate_mac=cerebrate_mac)
+        await framing.write_frame(writer=writer, payload=data)
+        #datagrams may be dropped or lost, so only a frame written over TCP counts as having delivered the compression offer
+        if isinstance(msg, Message) and cerebrate_mac not in (None, BROADCAST):
+            Secretary._announced_compressions.add(cerebrate_mac)
         return True
 
     @staticmethod
-    async def close_connection(reader, writer, close_reason=None):
+    def _get_wire_version(cerebrate_mac):
+        '''Returns the wire version negotiated with the given cerebrate, 0 meaning pickle.
+        For BROADCAST returns the version every known cerebrate has negotiated.
+        '''
+        if cerebrate_mac == BROADCAST:
+            versions = [Secretary._wire_versions.get(mac, 0) for mac in cerebratesinfo.get_cerebrate_macs() if mac != mysysteminfo.get_mac_address()]
+            return min(versions, default=0)
+        return Secretary._wire_versions.get(cerebrate_mac, 0)
+
+    @staticmethod
+    def _get_accepted_compressions(cerebrate_mac):
+        '''Returns the set of compressions the given cerebrate accepts.
+        For BROADCAST returns the compressions every known cerebrate accepts.
+        '''
+        if cerebrate_mac == BROADCAST:
+            accepted = [Secretary._compressions.get(mac, set()) for mac in cerebratesinfo.get_cerebrate_macs() if mac != mysysteminfo.get_mac_address()]
+            return set.intersection(*accepted) if accepted else set()
+        return Secretary._compressions.get(cerebrate_mac, set())
+
+    @staticmethod
+    def __add_offers(msg, cerebrate_mac, version):
+        '''Adds this cerebrate's wire version offer (if msg will be pickled) and compression offer (until one is known to have been delivered) to msg's header.
+        Returns msg, or a shallow copy of it if any offers were added.
+        '''
+        offers = []
+        if version <= 0 and not wire_codec.get_offer(msg.header):
+            offers.append(wire_codec.make_offer())
+        if cerebrate_mac not in Secretary._announced_compressions:
+            offers.append(wire_codec.make_compression_offer())
+        if not offers:
+            return msg
+        return msg.derive(*offers)
+
+    @staticmethod
+    def __note_compression(cerebrate_mac, raw_size, sent_size):
+        stats = Secretary._compression_stats.setdefault(cerebrate_mac, {"frames": 0, "compressed_frames": 0, "raw_bytes": 0, "sent_bytes": 0})
+        stats["frames"] += 1
+        stats["raw_bytes"] += raw_size
+        stats["sent_bytes"] += sent_size
+        if sent_size < raw_size:
+            stats["compressed_frames"] += 1
+
+    @staticmethod
+    def get_compression_stats(cerebrate_mac=None):
+        '''Returns a dict of frame and byte counts for encoded frames sent to the given cerebrate, including "saved_bytes".
+        If no cerebrate is given returns a dict of those dicts keyed by cerebrate mac.
+        '''
+        if cerebrate_mac is None:
+            return {mac: Secretary.get_compression_stats(cerebrate_mac=mac) for mac in Secretary._compression_stats}
+        stats = dict(Secretary._compression_stats.get(cerebrate_mac, {"frames": 0, "compressed_frames": 0, "raw_bytes": 0, "sent_bytes": 0}))
+        stats["saved_bytes"] = stats["raw_bytes"] - stats["sent_bytes"]
+        return stats
+
+    @staticmethod
+    def get_admission_stats():
+        '''Returns a dict of how much work the Secretary has taken on, is holding back, and has shed.
+        '''
+        return {
+            "active_sessions": Secretary._sessions.active,
+            "waiting_sessions": Secretary._sessions.waiting,
+            "shed_sessions": Secretary._sessions.shed,
+            "evicted_sessions": Secretary._sessions.evicted,
+            "datagram_handlers": Secretary._datagram_handlers.in_flight,
+            "datagram_queue_depth": Secretary._datagram_handlers.queue_depth,
+            "shed_datagrams": Secretary._datagram_handlers.shed,
+            "rate_limited": Secretary._peer_rates.limited,
+        }
+
+    @staticmethod
+    def _encode(msg, cerebrate_mac=None, timestamp=None):
+        '''Encodes msg with the wire codec if the given cerebrate has negotiated it, otherwise pickles it.
+        Messages are encoded stamped with the given hybrid logical clock timestamp, or the current one; msg itself is left unchanged.
+        Encoded frames over the compression threshold are compressed with a compression the cerebrate accepts.
+        Pickled Messages carry an offer of this cerebrate's wire version, so the receiver can switch over.
+        Returns the encoded bytes.
+        '''
+        version = Secretary._get_wire_version(cerebrate_mac=cerebrate_mac)
+        if isinstance(msg, Message):
+            msg = msg.derive()
+            msg.timestamp = timestamp or hlc.now()
+            msg = Secretary.__add_offers(msg=msg, cerebrate_mac=cerebrate_mac, version=version)
+        if version <= 0:
+            return pickle.dumps(msg)
+        frame = wire_codec.encode(msg, version=version)
+        compression = wire_codec.choose_compression(accepted=Secretary._get_accepted_compressions(cerebrate_mac=cerebrate_mac), frame_size=len(frame))
+        compressed = wire_codec.compress(frame=frame, compression=compression)
+        Secretary.__note_compression(cerebrate_mac=cerebrate_mac, raw_size=len(frame), sent_size=len(compressed))
+        return compressed
+
+    @staticmethod
+    def _decode(data):
+        '''Decodes data whether it was encoded with the wire codec or pickled, noting what it tells about the sender.
+        Returns the decoded message.
+        '''
+        msg, version, pickled = Secretary._decode_payload(data=data)
+        Secretary._note_sender(msg=msg, version=version, pickled=pickled)
+        return msg
+
+    @staticmethod
+    def _decode_payload(data):
+        '''Decodes data whether it was encoded with the wire codec or pickled, without touching any shared state, so it can run in an executor.
+        Returns a decoded message, wire version (None if none was offered), pickled tuple.
+        '''
+        if wire_codec.is_encoded(data):
+            msg, version = wire_codec.decode(data)
+            return msg, version, False
+        msg = pickle.loads(data)
+        return msg, (wire_codec.get_offer(msg.header) if isinstance(msg, Message) else None), True
+
+    @staticmethod
+    def _note_sender(msg, version, pickled:bool):
+        '''Notes the wire version and compressions the sender of msg is able to use, and advances the local clock past the sender's.
+        Must run on the event loop.
+        '''
+        if pickled and version:
+            # they don't know our wire version yet, so they may not know our compressions either
+            Secretary._announced_compressions.discard(msg.sender_mac)
+        if version is not None and isinstance(msg, Message) and msg.sender_mac:
+            Secretary._wire_versions[msg.sender_mac] = wire_codec.negotiate(offered_version=version)
+            accepted = wire_codec.get_compression_offer(msg.header)
+            if accepted is not None:
+                Secretary._compressions[msg.sender_mac] = accepted
+        if getattr(msg, "timestamp", None):
+            hlc.receive(msg.timestamp)
+
+    @staticmethod
+    def _add_connection(reader, writer):
+        '''Tracks the connection as active.
+        Returns False if it is already being tracked.
+        '''
         if (reader, writer) in Secretary.connections:
-            Secretary.connections.remove((reader, writer))
-            if len(Secretary.connections) <= 0:
-                Secretary._no_active_connections.set()
-        else:
+            return False
+        Secretary.connections.add((reader, writer))
+        Secretary._no_active_connections.clear()
+        return True
+
+    @staticmethod
+    def _remove_connection(reader, writer):
+        '''Stops tracking the connection as active.
+        Returns False if it was not being tracked.
+        '''
+        if (reader, writer) not in Secretary.connections:
+            return False
+        Secretary.connections.remove((reader, writer))
+        if len(Secretary.connections) <= 0:
+            Secretary._no_active_connections.set()
+        return True
+
+    @staticmethod
+    async def close_connection(reader, writer, close_reason=None):
+        if not Secretary._remove_connection(reader=reader, writer=writer):
             logging.error("(reader, writer) closed but not in connections list.")
         data = cc.FINISHED
         if close_reason:
@@ -152,81 +423,143 @@ class Secretary(asyncio.Protocol):
         await Secretary._write_message(writer=writer, msg=Message(cc.CLOSE_CONNECTION, data=data))
         writer.close()
 
+    @staticmethod
+    def __get_file_path(location, filename):
+        if location == cc.FileLocation.SOURCE:
+            location = mysysteminfo.get_my_directory()
+        elif location == cc.FileLocation.HIVE:
+            location = mysysteminfo.get_hive_directory()
+        else:
+            return filename
+        return os.path.join(location, filename.lstrip('/\\'))
+
     @staticmethod
     @print_func_name
-    async def __receive_files(reader, writer):
-        data = None
-        while not Secretary.terminating:
-            await Secretary._write_message(writer=writer, msg=cc.READY)
-            msg = await Secretary._read_message(reader=reader)
-            if cc.CLOSE_CONNECTION in msg.header:
-                return BY_REQUEST
-            #Get proper directory to save this file to
-            location = msg.data.get(cc.LOCATION, cc.FileLocation.ABSOLUTE)
-            if location == cc.FileLocation.SOURCE:
-                location = mysysteminfo.get_my_directory()
-            elif location == cc.FileLocation.HIVE:
-                location = mysysteminfo.get_hive_directory()
-            else:
-                location = ""
-            filename = msg.data.get(cc.NAME, None)
-            if not filename:
-                return "no cc.NAME included"
-            file_path = os.path.join(location, filename)
-            #backup file we're overwriting, just in case
-            utilities.backup_file(file_path=file_path)
+    async def __receive_files(reader, writer, msg):
+        '''Receives the files listed in msg's data, which are streamed back to back right after it.
+        Each file is checked against its SHA-256, and restored from backup if it doesn't match.
+        Replies with the names of the files that failed, then waits for the sender to end the exchange.
+        Returns the reason (as string) for the end of communication.
+        '''
+        cerebrate_mac = msg.sender_mac
+        failed = []
+        received = 0
+        for entry in msg.data or []:
+            filename = entry.get(cc.NAME, None)
+            file_path = None
+            if filename:
+                file_path = Secretary.__get_file_path(location=entry.get(cc.LOCATION, cc.FileLocation.ABSOLUTE), filename=filename)
+                #backup file we're overwriting, just in case
+                utilities.backup_file(file_path=file_path)
             try:
-                with open(file_path, 'w+') as new_file:
-                    await Secretary._write_message(writer=writer, msg=cc.READY)
-                    data = await Secretary._read_message(reader=reader)
-                    while data != cc.FINISHED:
-                        new_file.write(data)
-                        await Secretary._write_message(writer=writer, msg=cc.READY)
-                        data = await Secretary._read_message(reader=reader)
+                new_file = open(file_path, 'wb') if file_path else open(os.devnull, 'wb')
+            except OSError as ex:
+                logging.error(ex)
+                #the bytes still have to be read off the stream
+                file_path = None
+                new_file = open(os.devnull, 'wb')
+            try:
+                with new_file:
+                    received, digest = await file_transfer.receive_file(reader=reader, writer=writer, new_file=new_file, size=entry.get(cc.SIZE, 0), received=received)
             except Exception as ex:
                 logging.error(ex)
                 traceback.print_exc()
-                utilities.restore_file(file_path=file_path)
+                if file_path:
+                    utilities.restore_file(file_path=file_path)
                 return "failed while receiving/writing file"
-                
-        return "secretary terminating"
+            if not file_path or digest != entry.get(cc.HASH, None):
+                failed.append(filename)
+                if file_path:
+                    utilities.restore_file(file_path=file_path)
+        await Secretary._write_message(writer=writer, msg=Message(cc.FINISHED, data=failed), cerebrate_mac=cerebrate_mac)
+        msg = await Secretary._read_message(reader=reader)
+        if isinstance(msg, Message) and cc.CLOSE_CONNECTION in msg.header and cc.KEEP_ALIVE in msg.header:
+            return cc.KEEP_ALIVE
+        return BY_REQUEST
 
     @staticmethod
     @print_func_name
-    async def __communicate(reader, writer):
+    async def __communicate(reader, writer, msg=None, keep_alive=False):
         ''' Communicates with the cerebrate on the other end of reader, writer pair.
-        Returns the reason (as string) for the end of communication.
+        If msg is given it is handled before anything is read.
+        If keep_alive is set the exchange is ended without closing the connection.
+        Returns the reason (as string) for the end of communication, which is cc.KEEP_ALIVE if the connection can be reused.
         '''
         while not Secretary.terminating:
-            msg = await Secretary._read_message(reader=reader)
+            if not msg:
+                msg = await Secretary._read_message(reader=reader)
             #print("Received: ", msg.header)
             if msg.sender_mac == mysysteminfo.get_mac_address():
                 return "schizophrenia"
+            cerebrate_mac = msg.sender_mac
             action, message = await handle_message(msg=msg)
+            received, msg = msg, None
             if action == cc.CLOSE_CONNECTION:
+                if keep_alive and message not in (BY_REQUEST, ERROR, cc.KEEP_ALIVE):
+                    await Secretary._write_message(writer=writer, msg=Message(cc.CLOSE_CONNECTION, cc.KEEP_ALIVE, data=message), cerebrate_mac=cerebrate_mac)
+                    return cc.KEEP_ALIVE
                 return message
             elif action == cc.FILE_TRANSFER:
-                return await Secretary.__receive_files(reader=reader, writer=writer)
+                return await Secretary.__receive_files(reader=reader, writer=writer, msg=received)
             else:
-                await Secretary._write_message(writer=writer, msg=message)
+                await Secretary._write_message(writer=writer, msg=message, cerebrate_mac=cerebrate_mac)
         return "secretary terminating"
     
     @staticmethod
     @print_func_name
     async def __connection_made(reader, writer):
-        '''Handles TCP connections (both incoming and outgoing).
+        '''Admits incoming TCP connections, closing those from peers over their rate or once too many sessions are waiting.
+        Returns the reason (as string) for the end of the session.
+        '''
+        peer = (writer.get_extra_info('peername') or ("unknown",))[0]
+        if not Secretary._peer_rates.allow(peer=peer) or not await Secretary._sessions.acquire(make_room=Secretary._evict_idle_session):
+            writer.close()
+            return "shed"
+        try:
+            return await Secretary.__serve_session(reader=reader, writer=writer)
+        finally:
+            await Secretary._sessions.release()
+
+    @staticmethod
+    def _evict_idle_session():
+        '''Closes the incoming session that has been idle the longest, so a new one can have its slot.
+        Returns False if no session is idle.
+        '''
+        writer = next(iter(Secretary._idle_sessions), None)
+        if writer is None:
+            return False
+        del Secretary._idle_sessions[writer]
+        writer.close()
+        return True
+
+    @staticmethod
+    async def __serve_session(reader, writer):
+        '''Handles incoming TCP connections.
+        Connections opened with cc.KEEP_ALIVE stay open between exchanges until they sit idle for SESSION_IDLE_TIMEOUT.
         Throws asyncio.TimeoutError.
         '''
-        if (reader, writer) in Secretary.connections:
+        if not Secretary._add_connection(reader=reader, writer=writer):
             return "duplicate"
-        else:
-            Secretary.connections.append((reader, writer))
-            Secretary._no_active_connections.clear()
         close_reason = "secretary closing"
         try:
-            if not Secretary.terminating:
-                fut = Secretary.__communicate(reader=reader, writer=writer)
+            while not Secretary.terminating:
+                Secretary._idle_sessions[writer] = None
+                try:
+                    fut = Secretary._read_message(reader=reader)
+                    msg = await asyncio.wait_for(fut=fut, timeout=SESSION_IDLE_TIMEOUT, loop=event_loop)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    close_reason = "idle"
+                    break
+                finally:
+                    Secretary._idle_sessions.pop(writer, None)
+                if cc.CALL in msg.header:
+                    close_reason = await Secretary.__answer_calls(reader=reader, writer=writer, msg=msg)
+                    break
+                keep_alive = cc.KEEP_ALIVE in msg.header
+                fut = Secretary.__communicate(reader=reader, writer=writer, msg=msg, keep_alive=keep_alive)
                 close_reason = await asyncio.wait_for(fut=fut, timeout=COMMUNICATION_TIMEOUT, loop=event_loop)
+                if close_reason != cc.KEEP_ALIVE:
+                    break
         except asyncio.TimeoutError:
             close_reason = TIMEOUT
             raise asyncio.TimeoutError()
@@ -237,6 +570,136 @@ class Secretary(asyncio.Protocol):
                 await Secretary.close_connection(reader=reader, writer=writer, close_reason=close_reason)
         return close_reason
 
+    @staticmethod
+    async def __open_connection(cerebrate_ip):
+        '''Opens a connection to the given IP address.
+        Throws an asyncio.TimeoutError if no connection is made.
+        Returns a reader, writer pair.
+        '''
+        global event_loop
+        try:
+            fut = asyncio.open_connection(host=cerebrate_ip, port=TCP_PORT, loop=event_loop)
+            return await asyncio.wait_for(fut, timeout=CONNECTION_TIMEOUT)
+        except asyncio.TimeoutError:
+            print("Failed to connect to ", cerebrate_ip)
+            raise asyncio.TimeoutError()
+
+    @staticmethod
+    async def __answer_call(writer, write_lock, msg):
+        '''Runs the called command and writes its result back as a cc.RESPONSE with the same correlation id.
+        '''
+        action, result = await handle_message(msg=msg)
+        if action == cc.FILE_TRANSFER:
+            result = "file transfers cannot be called"
+        response = Message(cc.RESPONSE, data=result)
+        response.correlation_id = msg.correlation_id
+        async with write_lock:
+            await Secretary._write_message(writer=writer, msg=response, cerebrate_mac=msg.sender_mac)
+
+    @staticmethod
+    @print_func_name
+    async def __answer_calls(reader, writer, msg):
+        '''Serves a connection opened by Secretary.call, answering each cc.CALL as soon as it completes.
+        Calls are handled concurrently, so many can be in flight on the connection at once.
+        Returns the reason (as string) for the end of communication.
+        '''
+        write_lock = asyncio.Lock()
+        answering = set()
+        close_reason = "secretary terminating"
+        while not Secretary.terminating:
+            if msg.sender_mac == mysysteminfo.get_mac_address():
+                close_reason = "schizophrenia"
+                break
+            if cc.CLOSE_CONNECTION in msg.header:
+                close_reason = BY_REQUEST
+                break
+            task = asyncio.ensure_future(Secretary.__answer_call(writer=writer, write_lock=write_lock, msg=msg))
+            answering.add(task)
+            task.add_done_callback(answering.discard)
+            Secretary._idle_sessions[writer] = None
+            try:
+                fut = Secretary._read_message(reader=reader)
+                msg = await asyncio.wait_for(fut=fut, timeout=SESSION_IDLE_TIMEOUT, loop=event_loop)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                close_reason = "idle"
+                break
+            finally:
+                Secretary._idle_sessions.pop(writer, None)
+        if answering:
+            await asyncio.wait(answering, timeout=COMMUNICATION_TIMEOUT)
+        return close_reason
+
+    class _CallChannel:
+        '''A connection dedicated to Secretary.call requests to one cerebrate.
+        Responses are matched to their requests by correlation id, so requests can be pipelined.
+        '''
+        def __init__(self, cerebrate_mac, reader, writer):
+            self.cerebrate_mac = cerebrate_mac
+            self.reader = reader
+            self.writer = writer
+            self.write_lock = asyncio.Lock()
+            self.pending = {}
+            self.correlation_ids = itertools.count(1)
+            self.last_used = time.monotonic()
+            self.listener = asyncio.ensure_future(self.listen())
+
+        def is_open(self):
+            return not self.listener.done() and not self.writer.transport.is_closing()
+
+        def is_idle(self):
+            return not self.pending and time.monotonic() - self.last_used >= POOL_IDLE_TIMEOUT
+
+        def close(self):
+            with suppress(Exception):
+                self.writer.close()
+
+        async def call(self, msg, timeout):
+            correlation_id = next(self.correlation_ids)
+            request = msg.derive(cc.CALL)
+            request.correlation_id = correlation_id
+            future = asyncio.get_event_loop().create_future()
+            self.pending[correlation_id] = future
+            self.last_used = time.monotonic()
+            try:
+                async with self.write_lock:
+                    await Secretary._write_message(writer=self.writer, msg=request, cerebrate_mac=self.cerebrate_mac)
+                return await asyncio.wait_for(future, timeout=timeout)
+            finally:
+                self.pending.pop(correlation_id, None)
+                self.last_used = time.monotonic()
+
+        async def listen(self):
+            '''Reads responses until the connection ends, then fails whatever is still pending.
+            '''
+            reason = "connection closed"
+            try:
+                while True:
+                    msg = await Secretary._read_message(reader=self.reader)
+                    if msg.correlation_id is None:
+                        # cerebrates that can't answer calls handle the request as a normal exchange and close
+                        reason = "cerebrate does not answer calls"
+                        break
+                    future = self.pending.get(msg.correlation_id, None)
+                    if future and not future.done():
+                        future.set_result(msg.data)
+            except asyncio.IncompleteReadError:
+                pass
+            except Exception as ex:
+                reason = str(ex)
+                traceback.print_exc()
+            finally:
+                self.close()
+                for future in self.pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError(reason))
+
+    @staticmethod
+    def _check_alive(cerebrate_mac):
+        '''Throws an asyncio.TimeoutError straight away if heartbeats say the given cerebrate is down, rather than waiting to time out connecting.
+        '''
+        if heartbeat.is_suspected(cerebrate_mac=cerebrate_mac):
+            raise asyncio.TimeoutError(''.join((cerebrate_mac, " is suspected down")))
+
     @staticmethod
     @print_func_name
     async def __initiate_connection(cerebrate_mac):
@@ -246,34 +709,134 @@ class Secretary(asyncio.Protocol):
         '''
         if cerebrate_mac == mysysteminfo.get_mac_address():
             return None, None
-        global event_loop
+        Secretary._check_alive(cerebrate_mac=cerebrate_mac)
+        cerebrate_ip = cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=cerebrate_mac, record_attribute=cerebratesinfo.Record.IP)
+        return await Secretary.__open_connection(cerebrate_ip=cerebrate_ip)
+
+    @staticmethod
+    @print_func_name
+    async def _acquire_connection(cerebrate_mac):
+        '''Gets a pooled connection with given cerebrate, opening one if no idle one can be reused.
+        Idle connections to an outdated IP address are replaced.
+        Throws an asyncio.TimeoutError if no connection is made.
+        Returns a PooledConnection, or None if given cerebrate is this one.
+        '''
+        if cerebrate_mac == mysysteminfo.get_mac_address():
+            return None
+        Secretary._check_alive(cerebrate_mac=cerebrate_mac)
         cerebrate_ip = cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=cerebrate_mac, record_attribute=cerebratesinfo.Record.IP)
-        reader, writer = None, None
+        connection = await Secretary._pool.acquire(mac=cerebrate_mac, ip=cerebrate_ip, open_connection=Secretary.__open_connection)
+        Secretary._add_connection(reader=connection.reader, writer=connection.writer)
+        return connection
+
+    @staticmethod
+    def _release_connection(connection, reusable=True):
+        '''Hands the connection back to the pool, closing it instead if it cannot be reused.
+        '''
+        Secretary._remove_connection(reader=connection.reader, writer=connection.writer)
+        Secretary._pool.release(connection=connection, reusable=reusable and not Secretary.terminating)
+
+    @staticmethod
+    def _keep_alive(msg:Message):
+        '''Returns a shallow copy of msg marked to keep its connection open once the exchange is over.
+        '''
+        if cc.KEEP_ALIVE in msg.header:
+            return msg
+        return msg.derive(cc.KEEP_ALIVE)
+
+    @staticmethod
+    @print_func_name
+    async def __converse(connection):
+        '''Carries a pooled connection through the rest of an exchange, then hands it back to the pool.
+        Returns the reason (as string) for the end of the exchange.
+        '''
+        close_reason = "secretary closing"
+        reusable = False
         try:
-            fut = asyncio.open_connection(host=cerebrate_ip, port=TCP_PORT, loop=event_loop)
-            reader, writer = await asyncio.wait_for(fut, timeout=3)
-            #Secretary._made_contact(mac=cerebrate_mac, ip=cerebrate_ip)
+            fut = Secretary.__communicate(reader=connection.reader, writer=connection.writer, keep_alive=True)
+            close_reason = await asyncio.wait_for(fut=fut, timeout=COMMUNICATION_TIMEOUT, loop=event_loop)
+            reusable = (close_reason == cc.KEEP_ALIVE)
         except asyncio.TimeoutError:
-            print("Failed to connect to ", cerebrate_ip)
-            raise asyncio.TimeoutError()
-        return reader, writer
+            close_reason = TIMEOUT
+        except asyncio.IncompleteReadError:
+            close_reason = "connection closed by peer"
+        except Exception as _:
+            traceback.print_exc()
+        finally:
+            Secretary._release_connection(connection=connection, reusable=reusable)
+        return close_reason
+
+    @staticmethod
+    async def __evict_idle_connections():
+        '''Periodically closes pooled connections and call channels that have sat unused for too long.
+        '''
+        while not Secretary.terminating:
+            await asyncio.sleep(POOL_EVICTION_INTERVAL)
+            Secretary._pool.evict_idle()
+            for mac, channel in list(Secretary._call_channels.items()):
+                if channel.is_idle() or not channel.is_open():
+                    channel.close()
+                    del Secretary._call_channels[mac]
+
+    @staticmethod
+    async def __get_call_channel(cerebrate_mac):
+        '''Returns the open call channel to the given cerebrate, connecting a new one if needed.
+        Throws an asyncio.TimeoutError if no connection is made.
+        '''
+        channel = Secretary._call_channels.get(cerebrate_mac, None)
+        if channel and channel.is_open():
+            return channel
+        reader, writer = await Secretary.__initiate_connection(cerebrate_mac=cerebrate_mac)
+        channel = Secretary._call_channels.get(cerebrate_mac, None)
+        if channel and channel.is_open():
+            # another call connected while we were connecting
+            writer.close()
+            return channel
+        channel = Secretary._CallChannel(cerebrate_mac=cerebrate_mac, reader=reader, writer=writer)
+        Secretary._call_channels[cerebrate_mac] = channel
+        return channel
+
+    @staticmethod
+    @print_func_name
+    async def call(cerebrate_mac, msg:Message, timeout=COMMUNICATION_TIMEOUT):
+        """Runs msg as a command on the given cerebrate and waits for the result.
+        Calls to the same cerebrate share one connection and may be in flight concurrently.
+        Throws an asyncio.TimeoutError if no result arrives in time, and a ConnectionError if the connection is lost.
+        Returns the result of the remote command (the data half of its action, data pair).
+        """
+        if cerebrate_mac == mysysteminfo.get_mac_address():
+            _, result = await handle_message(msg=msg)
+            return result
+        try:
+            channel = await Secretary.__get_call_channel(cerebrate_mac=cerebrate_mac)
+        except asyncio.TimeoutError:
+            Secretary._timed_out(mac=cerebrate_mac)
+            raise
+        return await channel.call(msg=msg, timeout=timeout)
 
     @staticmethod
     @print_func_name
     async def communicate_message(cerebrate_mac, msg:Message):
-        """Opens a TCP connection with the given cerebrate, provided they are running a Secretary.
-        Returns a cc.SUCCESS if connection and initial write are successful.
+        """Sends msg to the given cerebrate over a pooled TCP connection, provided they are running a Secretary.
+        Small idempotent remote commands go as an acknowledged datagram instead, falling back to TCP if no ack arrives.
+        Returns a cc.SUCCESS if connection and initial write (or the datagram's ack) are successful.
         No guarantee after that.
         """
         #print("Communicating: ", msg.header)
         dprint(msg.data)
         result_string = "Fail"
+        if await Secretary._send_acked_datagram(cerebrate_mac=cerebrate_mac, msg=msg):
+            return cc.SUCCESS
         try:
-            reader, writer = await Secretary.__initiate_connection(cerebrate_mac=cerebrate_mac)
-            if not reader or not writer:
+            connection = await Secretary._acquire_connection(cerebrate_mac=cerebrate_mac)
+            if not connection:
                 return result_string
-            await Secretary._write_message(writer=writer, msg=msg)
-            asyncio.ensure_future(Secretary.__connection_made(reader=reader, writer=writer))
+            try:
+                await Secretary._write_message(writer=connection.writer, msg=Secretary._keep_alive(msg), cerebrate_mac=cerebrate_mac)
+            except Exception:
+                Secretary._release_connection(connection=connection, reusable=False)
+                raise
+            asyncio.ensure_future(Secretary.__converse(connection=connection))
             result_string = cc.SUCCESS
         except asyncio.TimeoutError:
             print(cerebrate_mac, " timed out")
@@ -281,8 +844,9 @@ class Secretary(asyncio.Protocol):
         return result_string
 
     @staticmethod
-    async def __transfer_file(reader, writer, file_name):
-        #Determine file location
+    async def __describe_file(file_name):
+        '''Returns the manifest entry for the given file path: where the receiver should place it, its size and its SHA-256.
+        '''
         filename = file_name
         location = os.path.dirname(file_name)
         if mysysteminfo.get_my_directory() in location:
@@ -293,91 +857,301 @@ class Secretary(asyncio.Protocol):
             filename = filename.replace(mysysteminfo.get_hive_directory(), '', 1)
         else:
             location = cc.FileLocation.ABSOLUTE
-        #Send header
-        header = Message("file header", data={cc.LOCATION: location, cc.NAME: filename})
-        await Secretary._write_message(writer=writer, msg=header)
-        #Send file
-        with open(file_name, 'r') as open_file:
-            data = open_file.read(512)
-            while data:
-                response = await Secretary._read_message(reader=reader)
-                if response == cc.CLOSE_CONNECTION:
-                    break
-                elif response != cc.READY:
-                    #wait for ready
-                    continue
-                await Secretary._write_message(writer=writer, msg=data)
-                data = open_file.read(512)
-        #One last wait for READY response
-        response = ""
-        while response != cc.READY:
-            response = await Secretary._read_message(reader=reader)
-            if response == cc.CLOSE_CONNECTION:
-                return False
-        #Send 'eof'
-        await Secretary._write_message(writer=writer, msg=cc.FINISHED)
-        return True
+        size, digest = await file_transfer.describe_file(file_path=file_name, loop=event_loop)
+        return {cc.LOCATION: location, cc.NAME: filename, cc.SIZE: size, cc.HASH: digest}
 
     @staticmethod
     async def transfer_files(cerebrate_mac, file_names):
         '''Transfers the files (passed as file paths) to the given cerebrate mac.
         Returns True on successful file transfer.
         '''
+        connection = None
+        success = False
+        reusable = False
         try:
-            reader, writer = await Secretary.__initiate_connection(cerebrate_mac=cerebrate_mac)
-            await Secretary._write_message(writer=writer, msg=Message(cc.FILE_TRANSFER))
-            for file_name in file_names:
-                response = await Secretary._read_message(reader=reader)
-                if response == cc.READY:
-                    if not await Secretary.__transfer_file(reader=reader, writer=writer, file_name=file_name):
-                        return False
-                elif response == cc.CLOSE_CONNECTION:
-                    return False
-            #receiver sends ready response, so we consume it here before sending close connection
-            await Secretary._read_message(reader=reader)
+            manifest = [await Secretary.__describe_file(file_name=file_name) for file_name in file_names]
+            connection = await Secretary._acquire_connection(cerebrate_mac=cerebrate_mac)
+            if not connection:
+                return False
+            reader, writer = connection.reader, connection.writer
+            await Secretary._write_message(writer=writer, msg=Message(cc.FILE_TRANSFER, cc.KEEP_ALIVE, data=manifest), cerebrate_mac=cerebrate_mac)
+            await file_transfer.send_files(reader=reader, writer=writer, files=zip(file_names, [entry[cc.SIZE] for entry in manifest]), loop=event_loop)
+            response = await Secretary._read_message(reader=reader)
+            if not isinstance(response, Message) or cc.FINISHED not in response.header:
+                return False
+            await Secretary._write_message(writer=writer, msg=Message(cc.CLOSE_CONNECTION, cc.KEEP_ALIVE, data=cc.FINISHED), cerebrate_mac=cerebrate_mac)
+            reusable = True
+            if response.data:
+                logging.error(''.join(("Files failed to transfer to ", cerebrate_mac, ": ", ", ".join(str(name) for name in response.data))))
+            else:
+                success = True
         except asyncio.TimeoutError:
             print(cerebrate_mac, " timed out")
             Secretary._timed_out(mac=cerebrate_mac)
-            return False
         except:
             traceback.print_exc()
+        finally:
+            if connection:
+                Secretary._release_connection(connection=connection, reusable=reusable)
+        return success
+
+    @staticmethod
+    def _fits_datagram(cerebrate_mac, msg:Message):
+        '''Returns the encoded msg if it is an idempotent remote command small enough to be sent as one acknowledged datagram, otherwise None.
+        '''
+        if cerebrate_mac in (BROADCAST, mysysteminfo.get_mac_address()) or not isinstance(msg, Message):
+            return None
+        if not remote_command.is_idempotent(msg=msg):
+            return None
+        msg = msg.derive(cc.DATAGRAM_ACK)
+        msg.correlation_id = next(Secretary._datagram_ids) & 0xFFFFFFFF
+        data = Secretary._encode(msg=msg, cerebrate_mac=cerebrate_mac)
+        if len(data) > fragmentation.DATAGRAM_MAX_PAYLOAD:
+            return None
+        return msg.correlation_id, data
+
+    @staticmethod
+    async def _send_acked_datagram(cerebrate_mac, msg:Message):
+        '''Sends msg as a single datagram, resending it until the receiver acknowledges it.
+        Returns True if acknowledged, False if msg doesn't fit in a datagram or no ack arrived in time.
+        '''
+        encoded = Secretary._fits_datagram(cerebrate_mac=cerebrate_mac, msg=msg)
+        if not encoded:
+            return False
+        ack_id, data = encoded
+        cerebrate_ip = cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=cerebrate_mac, record_attribute=cerebratesinfo.Record.IP)
+        future = asyncio.get_event_loop().create_future()
+        Secretary._pending_acks[ack_id] = future
+        try:
+            timeout = DATAGRAM_ACK_TIMEOUT
+            for _ in range(DATAGRAM_RETRIES + 1):
+                if not Secretary._send_datagrams(payload=data, addresses=[(cerebrate_ip, UDP_PORT)]):
+                    return False
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+                    return True
+                except asyncio.TimeoutError:
+                    timeout *= 2
             return False
         finally:
-            await Secretary.close_connection(reader=reader, writer=writer)
+            Secretary._pending_acks.pop(ack_id, None)
+
+    @staticmethod
+    def _in_multicast_group(msg:Message):
+        '''Returns False if msg was multicast to a group the local cerebrate isn't in.
+        Groups can share an address, and on some platforms a socket receives every group joined on the host.
+        '''
+        prefix = cc.MULTICAST + ':'
+        for item in msg.header:
+            if type(item) is str and item.startswith(prefix):
+                return item[len(prefix):] in Secretary._multicast_groups
         return True
 
+    @staticmethod
+    def update_multicast_groups():
+        '''Joins the multicast groups for the local cerebrate's location, role and tags, leaving any it no longer belongs to.
+        Returns the set of group keys the local cerebrate is in.
+        '''
+        if not Secretary.multicast_server or not Secretary.multicast_server.transport:
+            return Secretary._multicast_groups
+        my_record = cerebratesinfo.get_cerebrate_record(record_attribute=cerebratesinfo.Record.MAC, attribute_value=mysysteminfo.get_mac_address()) or {}
+        groups = multicast.get_record_groups(record=my_record)
+        addresses = {multicast.get_group_address(group_key=group): group for group in groups}
+        sock = Secretary.multicast_server.transport.get_extra_info('socket')
+        for address in Secretary._multicast_addresses.keys() - addresses.keys():
+            with suppress(OSError):
+                multicast.leave_group(sock=sock, group_key=Secretary._multicast_addresses[address], interface_ip=mysysteminfo.get_ip_address())
+        joined = {}
+        for address, group in addresses.items():
+            if address not in Secretary._multicast_addresses:
+                try:
+                    multicast.join_group(sock=sock, group_key=group, interface_ip=mysysteminfo.get_ip_address())
+                except OSError as ex:
+                    logging.error(''.join(("Could not join multicast group ", group, ": ", str(ex))))
+                    continue
+            joined[address] = group
+        Secretary._multicast_addresses = joined
+        Secretary._multicast_groups = groups
+        return groups
+
+    @staticmethod
+    async def __refresh_multicast_groups():
+        while not Secretary.terminating:
+            await asyncio.sleep(MULTICAST_REFRESH_INTERVAL)
+            Secretary.update_multicast_groups()
+
+    @staticmethod
+    @print_func_name
+    def multicast_message(msg:Message, record_attribute, attribute_value):
+        '''Sends a UDP message to every cerebrate whose record has the given attribute value (e.g. Record.LOCATION, "kitchen").
+        Only cerebrates in that group receive it, the local cerebrate doesn't.
+        '''
+        group = multicast.get_group_key(record_attribute=record_attribute, attribute_value=attribute_value)
+        msg = msg.derive(':'.join((cc.MULTICAST, group)))
+        return Secretary._send_datagrams(payload=Secretary._encode(msg=msg, cerebrate_mac=BROADCAST), addresses=[(multicast.get_group_address(group_key=group), multicast.MULTICAST_PORT)])
+
+    @staticmethod
+    async def multicast_acked_message(msg:Message, record_attribute, attribute_value, cerebrate_macs):
+        '''Multicasts msg as multicast_message does, asking each receiver to acknowledge it.
+        cerebrate_macs are the cerebrates expected in the group, any of which may not have joined it yet or may miss the datagram.
+        Returns the list of those that did not acknowledge msg within MULTICAST_ACK_TIMEOUT seconds, to be messaged individually.
+        '''
+        if not cerebrate_macs:
+            return []
+        cerebrate_ips = [cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=mac, record_attribute=cerebratesinfo.Record.IP) for mac in cerebrate_macs]
+        group = multicast.get_group_key(record_attribute=record_attribute, attribute_value=attribute_value)
+        msg = msg.derive(':'.join((cc.MULTICAST, group)), cc.DATAGRAM_ACK)
+        msg.correlation_id = next(Secretary._datagram_ids) & 0xFFFFFFFF
+        waiting = set(cerebrate_ips)
+        future = asyncio.get_event_loop().create_future()
+        Secretary._multicast_acks[msg.correlation_id] = (waiting, future)
+        try:
+            if Secretary._send_datagrams(payload=Secretary._encode(msg=msg, cerebrate_mac=BROADCAST), addresses=[(multicast.get_group_address(group_key=group), multicast.MULTICAST_PORT)]):
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(future, timeout=MULTICAST_ACK_TIMEOUT)
+        finally:
+            Secretary._multicast_acks.pop(msg.correlation_id, None)
+        return [mac for mac, ip in zip(cerebrate_macs, cerebrate_ips) if ip in waiting]
+
     class UDPServerProtocol:
+        '''The Secretary's single datagram endpoint, used both to receive and to send UDP messages.
+        Fragmented messages are reassembled before being handled.
+        '''
+        def __init__(self):
+            self.transport = None
+            self.reassembler = fragmentation.Reassembler()
+
         def connection_made(self, transport):
             self.transport = transport
 
+        def connection_lost(self, exc):
+            '''Called when the endpoint is closed, as when the Secretary rebinds.
+            '''
+
+        def error_received(self, exc):
+            logging.error(''.join(("Datagram endpoint error: ", str(exc))))
+
         def datagram_received(self, data, addr):
-            msg = pickle.loads(data)
             if Secretary.terminating:
                 return
-            if msg.sender_mac == mysysteminfo.get_mac_address():
+            if len(data) == 5 and data[0] == DATAGRAM_ACK_MARKER:
+                ack_id = int.from_bytes(data[1:], byteorder='big')
+                if ack_id in Secretary._multicast_acks:
+                    waiting, future = Secretary._multicast_acks[ack_id]
+                    waiting.discard(addr[0])
+                    if not waiting and not future.done():
+                        future.set_result(True)
+                    return
+                future = Secretary._pending_acks.get(ack_id, None)
+                if future and not future.done():
+                    future.set_result(True)
+                return
+            data = self.reassembler.add(datagram=data, address=addr)
+            if data is None:
+                return
+            if not Secretary._peer_rates.allow(peer=addr[0]):
                 return
             try:
-                asyncio.ensure_future(handle_message(msg=msg))
-            except Exception as _:
-                traceback.print_exc()
+                msg = Secretary._decode(data=data)
+            except Exception as ex:
+                logging.error(''.join(("Undecodable datagram from ", str(addr), ": ", str(ex))))
+                return
+            if not isinstance(msg, Message):
+                return
+            if cc.HEARTBEAT in msg.header:
+                heartbeat.heard_from(cerebrate_mac=msg.sender_mac)
+                return
+            if not Secretary._in_multicast_group(msg=msg):
+                return
+            if msg.sender_mac == mysysteminfo.get_mac_address():
+                return
+            #acks go out only once the handler starts, so a message shed on arrival or while waiting goes unacknowledged
+            #and its sender falls back to TCP
+            on_start = None
+            if cc.DATAGRAM_ACK in msg.header and msg.correlation_id is not None:
+                ack = bytes((DATAGRAM_ACK_MARKER,)) + msg.correlation_id.to_bytes(length=4, byteorder='big')
+                on_start = functools.partial(self.transport.sendto, ack, addr)
+            Secretary._datagram_handlers.submit(handle_message, msg, on_start=on_start)
+
+    @staticmethod
+    def queue_message(msg:Message, cerebrate_mac=BROADCAST):
+        '''Queues msg to be sent to the given cerebrate (or broadcast) along with others queued for them.
+        Queued Messages are sent COALESCE_WINDOW seconds after the first, or once COALESCE_MAX_MESSAGES are waiting.
+        Messages with identical headers and list data are merged, the rest go out as one cc.BATCH Message.
+        Can be called from any thread. Replies to queued Messages are discarded.
+        '''
+        if not event_loop:
+            return False
+        event_loop.call_soon_threadsafe(Secretary.__enqueue_message, msg, cerebrate_mac)
+        return True
+
+    @staticmethod
+    def __enqueue_message(msg, cerebrate_mac):
+        queued = Secretary._outbox.setdefault(cerebrate_mac, [])
+        queued.append(msg)
+        if len(queued) >= COALESCE_MAX_MESSAGES:
+            Secretary.__flush_outbox(cerebrate_mac=cerebrate_mac)
+        elif len(queued) == 1:
+            event_loop.call_later(COALESCE_WINDOW, Secretary.__flush_outbox, cerebrate_mac)
+
+    @staticmethod
+    def __flush_outbox(cerebrate_mac):
+        '''Sends whatever is queued for the given cerebrate (or broadcast) as a single Message.
+        '''
+        queued = Secretary._outbox.pop(cerebrate_mac, [])
+        if not queued:
+            return
+        messages = coalesce_messages(messages=queued)
+        msg = messages[0] if len(messages) == 1 else Message(cc.BATCH, data=messages)
+        if cerebrate_mac == BROADCAST:
+            Secretary.broadcast_message(msg=msg)
+        else:
+            asyncio.ensure_future(Secretary.communicate_message(cerebrate_mac=cerebrate_mac, msg=msg), loop=event_loop)
+
+    @staticmethod
+    def _send_datagrams(payload, addresses):
+        '''Sends payload, fragmented if it doesn't fit in one datagram, to each of the given addresses over the shared UDP endpoint.
+        Returns False if the endpoint isn't open.
+        '''
+        transport = Secretary.udp_server.transport if Secretary.udp_server else None
+        if not transport or transport.is_closing():
+            logging.error("UDP endpoint not open, datagram not sent")
+            return False
+        datagrams = fragmentation.make_datagrams(payload=payload)
+        for address in addresses:
+            for datagram in datagrams:
+                transport.sendto(datagram, address)
+        return True
 
     @staticmethod
     @print_func_name
     def send_message(cerebrate_mac, msg:Message):
         '''Sends a UDP message to given cerebrate.
         '''
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         cerebrate_ip = cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=cerebrate_mac, record_attribute=cerebratesinfo.Record.IP)
-        s.sendto(pickle.dumps(msg), (cerebrate_ip, UDP_PORT))
+        return Secretary._send_datagrams(payload=Secretary._encode(msg=msg, cerebrate_mac=cerebrate_mac), addresses=[(cerebrate_ip, UDP_PORT)])
+
+    @staticmethod
+    @print_func_name
+    def send_messages(cerebrate_macs, msg:Message):
+        '''Sends a UDP message to each of the given cerebrates.
+        Cerebrates that would be sent the same bytes share one encoding.
+        '''
+        addresses = {}
+        timestamp = hlc.now()
+        for cerebrate_mac in cerebrate_macs:
+            cerebrate_ip = cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=cerebrate_mac, record_attribute=cerebratesinfo.Record.IP)
+            if not cerebrate_ip:
+                continue
+            addresses.setdefault(Secretary._encode(msg=msg, cerebrate_mac=cerebrate_mac, timestamp=timestamp), []).append((cerebrate_ip, UDP_PORT))
+        return all([Secretary._send_datagrams(payload=payload, addresses=payload_addresses) for payload, payload_addresses in addresses.items()])
 
     @staticmethod
     @print_func_name
     def broadcast_message(msg:Message):
         '''Sends a UDP message to broadcast address.
         '''
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, True)
-        s.sendto(pickle.dumps(msg), (BROADCAST, UDP_PORT))
+        return Secretary._send_datagrams(payload=Secretary._encode(msg=msg, cerebrate_mac=BROADCAST), addresses=[(BROADCAST, UDP_PORT)])
 
     @staticmethod
     def initialize(loop):
@@ -388,26 +1162,108 @@ class Secretary(asyncio.Protocol):
             return False
         Secretary.terminating = False
         Secretary._no_active_connections.set()
+        event_loop.run_until_complete(Secretary.__start_servers())
+        asyncio.ensure_future(Secretary.__refresh_multicast_groups(), loop=event_loop)
+        asyncio.ensure_future(Secretary.__evict_idle_connections(), loop=event_loop)
+
+    @staticmethod
+    async def __open_servers(ip_address):
+        '''Opens a TCP server, UDP endpoint and multicast endpoint on the given IP address.
+        Raises OSError if the TCP server or UDP endpoint can't be bound, having closed whichever was opened.
+        Returns a TCP server, UDP protocol, multicast protocol tuple, the multicast protocol being None if multicast is unavailable.
+        '''
         #setup tcp
-        tcp_server_coroutine = asyncio.start_server(Secretary.__connection_made, host=mysysteminfo.get_ip_address(), port=TCP_PORT, loop=event_loop)
-        Secretary.tcp_server = event_loop.run_until_complete(tcp_server_coroutine)
+        tcp_server = await asyncio.start_server(Secretary.__connection_made, host=ip_address, port=TCP_PORT, loop=event_loop)
         #setup udp
-        Secretary.udp_server = event_loop.create_datagram_endpoint(Secretary.UDPServerProtocol, local_addr=(mysysteminfo.get_ip_address(), UDP_PORT))
-        Secretary.udp_server = event_loop.run_until_complete(Secretary.udp_server)
+        try:
+            _, udp_server = await event_loop.create_datagram_endpoint(Secretary.UDPServerProtocol, local_addr=(ip_address, UDP_PORT), allow_broadcast=True)
+        except OSError:
+            tcp_server.close()
+            raise
+        #setup multicast
+        multicast_server = None
+        try:
+            _, multicast_server = await event_loop.create_datagram_endpoint(Secretary.UDPServerProtocol, sock=multicast.make_receiving_socket())
+            multicast.set_sending_options(sock=udp_server.transport.get_extra_info('socket'), interface_ip=ip_address)
+        except OSError as ex:
+            logging.error(''.join(("Multicast unavailable: ", str(ex))))
+        return tcp_server, udp_server, multicast_server
+
+    @staticmethod
+    def __use_servers(servers, ip_address):
+        Secretary.tcp_server, Secretary.udp_server, Secretary.multicast_server = servers
+        Secretary._bound_ip = ip_address
+        Secretary._multicast_addresses = {}
+        Secretary.update_multicast_groups()
+
+    @staticmethod
+    async def __start_servers():
+        '''Starts the TCP server, UDP endpoint and multicast endpoint on the current IP address.
+        '''
+        ip_address = mysysteminfo.get_ip_address()
+        Secretary.__use_servers(servers=await Secretary.__open_servers(ip_address=ip_address), ip_address=ip_address)
+
+    @staticmethod
+    def __close_servers():
+        if Secretary.tcp_server != None:
+            Secretary.tcp_server.close()
+            Secretary.tcp_server = None
+        if Secretary.udp_server != None:
+            Secretary.udp_server.transport.close()
+            Secretary.udp_server = None
+        if Secretary.multicast_server != None:
+            Secretary.multicast_server.transport.close()
+            Secretary.multicast_server = None
+
+    @staticmethod
+    def __cancel_rebind_retry():
+        if Secretary._rebind_retry is not None:
+            Secretary._rebind_retry.cancel()
+            Secretary._rebind_retry = None
+
+    @staticmethod
+    async def rebind():
+        '''Restarts the servers on the current IP address, after it has changed.
+        The new servers are opened before the old ones are closed, so if the new address can't be bound to yet
+        the old servers are kept, and binding is tried again every REBIND_RETRY_INTERVAL seconds.
+        Connections already open are left to finish, pooled ones are dropped.
+        Returns True once the servers are on the current IP address.
+        '''
+        Secretary.__cancel_rebind_retry()
+        if Secretary.terminating:
+            return False
+        ip_address = mysysteminfo.get_ip_address()
+        if ip_address == Secretary._bound_ip and Secretary.tcp_server is not None:
+            return True
+        try:
+            servers = await Secretary.__open_servers(ip_address=ip_address)
+        except OSError as ex:
+            logging.error(''.join(("Could not bind to ", str(ip_address), ", retrying in ", str(REBIND_RETRY_INTERVAL), " seconds: ", str(ex))))
+            Secretary._rebind_retry = event_loop.call_later(REBIND_RETRY_INTERVAL, lambda: asyncio.ensure_future(Secretary.rebind(), loop=event_loop))
+            return False
+        Secretary._pool.close_all()
+        for channel in Secretary._call_channels.values():
+            channel.close()
+        Secretary._call_channels.clear()
+        Secretary.__close_servers()
+        Secretary.__use_servers(servers=servers, ip_address=ip_address)
+        return True
 
     @staticmethod
     async def terminate():
         """Shuts down the Secretary, closing current connections and rejecting future connections.
         """
         Secretary.terminating = True
+        Secretary.__cancel_rebind_retry()
+        for writer in list(Secretary._idle_sessions):
+            writer.close()
+        Secretary._pool.close_all()
+        for channel in Secretary._call_channels.values():
+            channel.close()
+        Secretary._call_channels.clear()
         with suppress(asyncio.CancelledError):
             await Secretary._no_active_connections.wait()
-        if Secretary.tcp_server != None:
-            Secretary.tcp_server.close()
-            Secretary.tcp_server = None
-        if Secretary.udp_server != None:
-            Secretary.udp_server.close()
-            Secretary.udp_server = None
+        Secretary.__close_servers()
 
 
 async def terminate():
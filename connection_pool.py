@@ -0,0 +1,127 @@
+import asyncio
+import time
+from contextlib import suppress
+
+
+POOL_MAX_CONNECTIONS_PER_PEER = 2
+POOL_IDLE_TIMEOUT = 30  # seconds an unused connection is kept open before being evicted
+POOL_EVICTION_INTERVAL = 10
+
+
+class PooledConnection:
+    '''A reader, writer pair held open to a single cerebrate.
+    '''
+    def __init__(self, mac, ip, reader, writer):
+        self.mac = mac
+        self.ip = ip
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def idle_time(self):
+        return time.monotonic() - self.last_used
+
+    def is_healthy(self):
+        '''Returns False if either end of the connection has been closed.
+        '''
+        if not self.reader or not self.writer:
+            return False
+        if self.reader.at_eof() or self.reader.exception():
+            return False
+        return not self.writer.transport.is_closing()
+
+    async def is_reusable(self):
+        '''Returns False if the connection isn't healthy, or the other end has sent anything unasked.
+        Nothing is owed on a connection between uses, so anything waiting to be read is the other end closing it
+        (at_eof() stays False until that is read). The read is given one pass of the event loop, where it completes if anything is waiting.
+        '''
+        if not self.is_healthy():
+            return False
+        read = asyncio.ensure_future(self.reader.read(1))
+        await asyncio.sleep(0)
+        if not read.done():
+            read.cancel()
+            with suppress(asyncio.CancelledError):
+                await read
+            return True
+        return False
+
+    def close(self):
+        with suppress(Exception):
+            self.writer.close()
+
+
+class ConnectionPool:
+    '''Keeps connections to other cerebrates open for reuse, keyed by cerebrate mac.
+    At most max_per_peer connections are in use per cerebrate, further acquires wait for one to be released.
+    '''
+    def __init__(self, max_per_peer:int=POOL_MAX_CONNECTIONS_PER_PEER, idle_timeout:float=POOL_IDLE_TIMEOUT):
+        self.max_per_peer = max_per_peer
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._slots = {}
+
+    def _get_slots(self, mac):
+        if mac not in self._slots:
+            self._slots[mac] = asyncio.Semaphore(self.max_per_peer)
+        return self._slots[mac]
+
+    async def acquire(self, mac, ip, open_connection):
+        '''Returns a PooledConnection to the given cerebrate, reusing an idle one if it is still healthy and its IP is current.
+        open_connection is awaited with the IP to make a new connection, and must return a reader, writer pair.
+        Any exception raised by open_connection is passed on.
+        '''
+        slots = self._get_slots(mac)
+        await slots.acquire()
+        try:
+            idle = self._idle.get(mac, [])
+            while idle:
+                connection = idle.pop()
+                if connection.ip == ip and await connection.is_reusable():
+                    connection.touch()
+                    return connection
+                connection.close()
+            reader, writer = await open_connection(ip)
+            return PooledConnection(mac=mac, ip=ip, reader=reader, writer=writer)
+        except BaseException:
+            slots.release()
+            raise
+
+    def release(self, connection:PooledConnection, reusable:bool=True):
+        '''Returns the connection to the pool, or closes it if it cannot be reused.
+        '''
+        if reusable and connection.is_healthy():
+            connection.touch()
+            self._idle.setdefault(connection.mac, []).append(connection)
+        else:
+            connection.close()
+        self._get_slots(connection.mac).release()
+
+    def evict_idle(self):
+        '''Closes connections that have been idle for too long or are no longer healthy.
+        Returns the number of connections closed.
+        '''
+        evicted = 0
+        for mac, idle in self._idle.items():
+            keep = []
+            for connection in idle:
+                if connection.idle_time() < self.idle_timeout and connection.is_healthy():
+                    keep.append(connection)
+                else:
+                    connection.close()
+                    evicted += 1
+            self._idle[mac] = keep
+        return evicted
+
+    def discard_peer(self, mac):
+        '''Closes all idle connections to the given cerebrate.
+        '''
+        for connection in self._idle.pop(mac, []):
+            connection.close()
+
+    def close_all(self):
+        for mac in list(self._idle.keys()):
+            self.discard_peer(mac=mac)
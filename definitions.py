@@ -6,6 +6,7 @@ class Command(enum.Enum):
     DESCRIPTION = enum.auto()
     USE = enum.auto()
     FUNCTION = enum.auto()
+    IDEMPOTENT = enum.auto()
 
 class Resource(enum.Enum):
     SECTION = enum.auto()
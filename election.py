@@ -0,0 +1,176 @@
+import asyncio
+import datetime
+import logging
+from utilities import dprint
+import cerebrate_config as cc, cerebratesinfo, communication, heartbeat, mysysteminfo
+
+
+# The Overmind is chosen with the bully algorithm: a cerebrate holding an election asks every higher ranked cerebrate at once,
+# and takes over if none of them answers. Every election has a greater term than the last one seen,
+# and Overmind claims from an earlier term are refused, so a stale Overmind can't win out over a newer one.
+# The term is kept in the cerebrate's config so it survives restarts, and cerebrates not heard from lately aren't asked.
+ELECTION_TIMEOUT = 1  # seconds higher ranked cerebrates have to answer
+COORDINATOR_TIMEOUT = 3  # seconds an answering cerebrate has to claim the Overmind role before electing again
+ELECTION_ROUNDS = 3  # after this many rounds without a claim, take the role
+BOOT_GRACE = 2  # seconds a booting cerebrate waits to hear from a sitting Overmind before holding an election
+TERM = "term"  # header prefix carrying an election term, as "term:3"
+TERM_CONFIG_KEY = "election_term"  # config setting the last term seen is kept in, so a restarted cerebrate doesn't go back to term 0
+
+current_term = 0
+_election_task = None
+_leader_event = None
+
+
+def _get_leader_event():
+    global _leader_event
+    if _leader_event is None:
+        _leader_event = asyncio.Event()
+    return _leader_event
+
+def get_rank(cerebrate_mac):
+    '''Returns the value cerebrates are ranked by, the highest ranked one becoming Overmind.
+    '''
+    return cerebrate_mac.upper()
+
+def make_term_header(term:int=None):
+    return ':'.join((TERM, str(current_term if term is None else term)))
+
+def get_term(header):
+    '''Returns the election term in the given message header, or None if it carries none.
+    '''
+    prefix = TERM + ':'
+    for item in header:
+        if isinstance(item, str) and item.startswith(prefix):
+            try:
+                return int(item[len(prefix):])
+            except ValueError:
+                return None
+    return None
+
+def load_term():
+    '''Picks up the last term seen before the cerebrate was restarted.
+    '''
+    global current_term
+    current_term = max(current_term, cc.get_config(TERM_CONFIG_KEY) or 0)
+
+def _set_term(term):
+    global current_term
+    current_term = term
+    try:
+        cc.set_config(TERM_CONFIG_KEY, term)
+    except Exception as ex:
+        logging.error(ex)
+
+def note_term(term):
+    if term is not None and term > current_term:
+        _set_term(term=term)
+
+def accept_leader(cerebrate_mac, term=None):
+    '''Decides whether a claim to the Overmind role from the given cerebrate stands.
+    Claims without a term (from cerebrates that don't hold elections) always stand.
+    Returns False if the claim is from an earlier term than the current one.
+    '''
+    if term is not None and term < current_term:
+        dprint("refusing stale Overmind ", cerebrate_mac, " of term ", term)
+        return False
+    note_term(term=term)
+    _get_leader_event().set()
+    return True
+
+def claim_leadership(term=None):
+    '''Makes the local cerebrate the Overmind, and tells the others.
+    '''
+    note_term(term=term)
+    cerebratesinfo.designate_overmind(mac=mysysteminfo.get_mac_address())
+    communication.Secretary.update_multicast_groups()
+    msg = communication.Message("update_records", cc.OVERRULE, make_term_header(), data=[cerebratesinfo.get_overmind_record()])
+    #known cerebrates are told directly too, in case they are out of reach of the broadcast
+    communication.Secretary.send_messages(cerebrate_macs=[mac for mac in cerebratesinfo.get_cerebrate_macs() if mac != mysysteminfo.get_mac_address()], msg=msg)
+    communication.Secretary.broadcast_message(msg=msg)
+    _get_leader_event().set()
+
+def is_electing():
+    return _election_task is not None and not _election_task.done()
+
+def start_election(loop=None):
+    '''Starts holding an election, unless one is being held already.
+    '''
+    global _election_task
+    if is_electing():
+        return
+    _election_task = asyncio.ensure_future(hold_election(), loop=loop)
+
+async def _probe(cerebrate_mac, msg):
+    '''Returns True if the given cerebrate answers msg within ELECTION_TIMEOUT.
+    '''
+    try:
+        await asyncio.wait_for(communication.Secretary.call(cerebrate_mac=cerebrate_mac, msg=msg, timeout=ELECTION_TIMEOUT), timeout=ELECTION_TIMEOUT)
+        return True
+    except (asyncio.TimeoutError, ConnectionError, OSError):
+        return False
+    except Exception as ex:
+        logging.error(ex)
+        return False
+
+def _get_candidates(now=None):
+    '''Returns the macs of the other cerebrates that were in contact within the heartbeat's PEER_HORIZON and aren't suspected to be down.
+    '''
+    if now is None:
+        now = datetime.datetime.now()
+    horizon = now - datetime.timedelta(seconds=heartbeat.PEER_HORIZON)
+    my_mac = mysysteminfo.get_mac_address()
+    candidates = []
+    for record in cerebratesinfo.get_cerebrate_records():
+        mac = record.get(cerebratesinfo.Record.MAC, None)
+        last_contact = record.get(cerebratesinfo.Record.LASTCONTACT, None)
+        if not mac or mac == my_mac or not isinstance(last_contact, datetime.datetime) or last_contact < horizon:
+            continue
+        if not heartbeat.is_suspected(cerebrate_mac=mac):
+            candidates.append(mac)
+    return candidates
+
+async def hold_election():
+    '''Asks every higher ranked cerebrate at once whether it is there, taking the Overmind role if none answers
+    and otherwise waiting for one of them to claim it.
+    Settles within ELECTION_ROUNDS * (ELECTION_TIMEOUT + COORDINATOR_TIMEOUT) seconds.
+    Returns the Overmind's mac.
+    '''
+    my_mac = mysysteminfo.get_mac_address()
+    for _ in range(ELECTION_ROUNDS):
+        term = current_term + 1
+        _set_term(term=term)
+        leader_event = _get_leader_event()
+        leader_event.clear()
+        higher = [mac for mac in _get_candidates() if get_rank(mac) > get_rank(my_mac)]
+        dprint("holding election for term ", term, ", asking ", higher)
+        answers = await asyncio.gather(*[_probe(cerebrate_mac=mac, msg=communication.Message("election", make_term_header(term))) for mac in higher])
+        if not any(answers):
+            break
+        try:
+            await asyncio.wait_for(leader_event.wait(), timeout=COORDINATOR_TIMEOUT)
+            return cerebratesinfo.get_overmind_mac()
+        except asyncio.TimeoutError:
+            continue
+    claim_leadership()
+    return my_mac
+
+async def elect_if_leaderless():
+    '''Holds an election unless a sitting Overmind makes itself known within BOOT_GRACE seconds.
+    '''
+    try:
+        await asyncio.wait_for(_get_leader_event().wait(), timeout=BOOT_GRACE)
+    except asyncio.TimeoutError:
+        start_election()
+
+async def hand_over():
+    '''Hands the Overmind role to the highest ranked of the other cerebrates that answer, asking them all at once.
+    Returns the new Overmind's mac, or the local mac if no one else answered.
+    '''
+    candidates = _get_candidates()
+    answers = await asyncio.gather(*[_probe(cerebrate_mac=mac, msg=communication.Message("ping")) for mac in candidates])
+    for mac in sorted((mac for mac, answered in zip(candidates, answers) if answered), key=get_rank, reverse=True):
+        if await _probe(cerebrate_mac=mac, msg=communication.Message("assume_overmind", make_term_header(current_term + 1))):
+            note_term(term=current_term + 1)
+            cerebratesinfo.designate_overmind(mac=mac)
+            return mac
+    return mysysteminfo.get_mac_address()
@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+import mmap
+import os
+
+import framing
+
+
+# Files are streamed back to back as raw bytes, the receiver acknowledges the running byte count as it writes them.
+TRANSFER_CHUNK_SIZE = 256 * 1024
+TRANSFER_WINDOW = 4 * 1024 * 1024  # bytes the sender may have in flight without an acknowledgement
+ACK_SIZE = 8
+
+
+class TransferError(Exception):
+    '''Raised when the other end acknowledges bytes that were never sent.
+    '''
+
+
+def hash_file(file_path):
+    '''Returns the hex SHA-256 digest of the file at file_path.
+    '''
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as open_file:
+        if os.fstat(open_file.fileno()).st_size > 0:
+            with mmap.mmap(open_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                sha.update(mapped)
+    return sha.hexdigest()
+
+async def describe_file(file_path, loop=None):
+    '''Hashes the file at file_path in the loop's default executor.
+    Returns the file's size and hex SHA-256 digest.
+    '''
+    if not loop:
+        loop = asyncio.get_event_loop()
+    digest = await loop.run_in_executor(None, hash_file, file_path)
+    return os.path.getsize(file_path), digest
+
+async def _read_ack(reader, sent):
+    acked = int.from_bytes(bytes=await framing.read_frame(reader=reader, max_frame_size=ACK_SIZE), byteorder='big')
+    if acked > sent:
+        raise TransferError(''.join(("receiver acknowledged ", str(acked), " bytes, only ", str(sent), " sent")))
+    return acked
+
+async def write_ack(writer, received):
+    await framing.write_frame(writer=writer, payload=received.to_bytes(length=ACK_SIZE, byteorder='big'))
+
+async def _send_chunk(writer, open_file, offset, count, loop):
+    '''Hands count bytes of open_file, starting at offset, to the transport.
+    Uses the loop's sendfile where the transport supports it, otherwise writes a slice of the file.
+    '''
+    await writer.drain()
+    try:
+        await loop.sendfile(writer.transport, open_file, offset=offset, count=count)
+        return
+    except (AttributeError, NotImplementedError, RuntimeError):
+        pass
+    open_file.seek(offset)
+    writer.write(open_file.read(count))
+    await writer.drain()
+
+async def send_files(reader, writer, files, loop=None):
+    '''Streams the given (file path, size) pairs over writer, one after another without waiting in between.
+    At most TRANSFER_WINDOW bytes are sent before the receiver acknowledges them.
+    Returns once the receiver has acknowledged every byte.
+    '''
+    if not loop:
+        loop = asyncio.get_event_loop()
+    sent = 0
+    acked = 0
+    for file_path, size in files:
+        with open(file_path, 'rb') as open_file:
+            offset = 0
+            while offset < size:
+                while sent - acked >= TRANSFER_WINDOW:
+                    acked = await _read_ack(reader=reader, sent=sent)
+                count = min(TRANSFER_CHUNK_SIZE, size - offset, TRANSFER_WINDOW - (sent - acked))
+                await _send_chunk(writer=writer, open_file=open_file, offset=offset, count=count, loop=loop)
+                offset += count
+                sent += count
+    while acked < sent:
+        acked = await _read_ack(reader=reader, sent=sent)
+
+async def receive_file(reader, writer, new_file, size, received=0):
+    '''Reads size bytes from reader into new_file, acknowledging each chunk.
+    received is the running count of bytes already received this session.
+    Returns the new running count and the hex SHA-256 digest of what was read.
+    '''
+    sha = hashlib.sha256()
+    remaining = size
+    while remaining > 0:
+        chunk = await reader.readexactly(min(TRANSFER_CHUNK_SIZE, remaining))
+        new_file.write(chunk)
+        sha.update(chunk)
+        remaining -= len(chunk)
+        received += len(chunk)
+        await write_ack(writer=writer, received=received)
+    return received, sha.hexdigest()
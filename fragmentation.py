@@ -0,0 +1,98 @@
+import collections
+import itertools
+import random
+import time
+
+
+# Datagrams larger than this are split into fragments, each prefixed with a marker, message id, index and count.
+DATAGRAM_MAX_PAYLOAD = 1400  # keeps each fragment within a typical ethernet MTU
+FRAGMENT_MARKER = 0xF7  # never the first byte of a pickle (0x80) or an encoded wire frame
+FRAGMENT_HEADER_SIZE = 9
+MAX_FRAGMENTS = 0xFFFF
+REASSEMBLY_TIMEOUT = 5  # seconds a partly received message is kept waiting for the rest of its fragments
+REASSEMBLY_MAX_BYTES = 8 * 1024 * 1024  # fragments held at once across all partly received messages
+
+_message_ids = itertools.count(random.getrandbits(31))
+
+
+class FragmentError(ValueError):
+    '''Raised when a payload is too large to be fragmented.
+    '''
+
+
+def is_fragment(datagram):
+    return len(datagram) >= FRAGMENT_HEADER_SIZE and datagram[0] == FRAGMENT_MARKER
+
+def make_datagrams(payload, max_payload:int=DATAGRAM_MAX_PAYLOAD):
+    '''Splits payload into datagrams of at most max_payload bytes, or returns it as the only datagram if it fits.
+    Raises FragmentError if it would need more than MAX_FRAGMENTS fragments.
+    Returns a list of datagrams.
+    '''
+    if len(payload) <= max_payload:
+        return [payload]
+    fragment_size = max_payload - FRAGMENT_HEADER_SIZE
+    count = -(-len(payload) // fragment_size)
+    if count > MAX_FRAGMENTS:
+        raise FragmentError(''.join(("payload of ", str(len(payload)), " bytes needs too many fragments")))
+    message_id = (next(_message_ids) & 0xFFFFFFFF).to_bytes(length=4, byteorder='big')
+    view = memoryview(payload)
+    return [b''.join((bytes((FRAGMENT_MARKER,)), message_id, index.to_bytes(length=2, byteorder='big'), count.to_bytes(length=2, byteorder='big'), view[index * fragment_size:(index + 1) * fragment_size]))
+        for index in range(count)]
+
+
+class Reassembler:
+    '''Collects fragments by sender and message id until every fragment of a message has arrived.
+    Partly received messages are dropped after timeout seconds, or oldest first once max_bytes are held.
+    '''
+    def __init__(self, timeout:float=REASSEMBLY_TIMEOUT, max_bytes:int=REASSEMBLY_MAX_BYTES):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.held_bytes = 0
+        self.dropped = 0
+        self._partial = collections.OrderedDict()  # (sender address, message id): [first seen, fragment count, {index: fragment}]
+
+    def _drop(self, key):
+        _, _, fragments = self._partial.pop(key)
+        self.held_bytes -= sum(len(fragment) for fragment in fragments.values())
+        self.dropped += 1
+
+    def expire(self, now=None):
+        '''Drops partly received messages that have waited longer than the timeout.
+        '''
+        if now is None:
+            now = time.monotonic()
+        while self._partial:
+            key, (first_seen, _, _) = next(iter(self._partial.items()))
+            if now - first_seen < self.timeout:
+                break
+            self._drop(key)
+
+    def add(self, datagram, address):
+        '''Adds a datagram received from address.
+        Returns the full payload once it is complete (datagrams that aren't fragments are complete already), otherwise None.
+        '''
+        if not is_fragment(datagram):
+            return datagram
+        now = time.monotonic()
+        self.expire(now=now)
+        key = (address, bytes(datagram[1:5]))
+        index = int.from_bytes(datagram[5:7], byteorder='big')
+        count = int.from_bytes(datagram[7:9], byteorder='big')
+        if index >= count:
+            return None
+        partial = self._partial.get(key, None)
+        if not partial:
+            partial = self._partial[key] = [now, count, {}]
+        if partial[1] != count or index in partial[2]:
+            return None
+        fragment = bytes(datagram[FRAGMENT_HEADER_SIZE:])
+        partial[2][index] = fragment
+        self.held_bytes += len(fragment)
+        if len(partial[2]) == count:
+            fragments = partial[2]
+            self._drop(key)
+            self.dropped -= 1
+            return b''.join(fragments[index] for index in range(count))
+        while self.held_bytes > self.max_bytes and self._partial:
+            self._drop(next(iter(self._partial)))
+        return None
@@ -0,0 +1,48 @@
+import asyncio
+
+
+# Frames are a 4 byte big-endian payload length followed by the payload.
+FRAME_HEADER_SIZE = 4
+MAX_FRAME_SIZE = 64 * 1024 * 1024  # frames announcing anything larger are refused
+OFF_LOOP_DECODE_SIZE = 256 * 1024  # frames at least this large are decoded in an executor
+
+
+class FrameTooLarge(ValueError):
+    '''Raised when a frame announces a payload larger than the allowed maximum.
+    '''
+
+
+def make_header(payload_size:int):
+    return payload_size.to_bytes(length=FRAME_HEADER_SIZE, byteorder='big')
+
+async def read_frame(reader:asyncio.StreamReader, max_frame_size:int=MAX_FRAME_SIZE):
+    '''Reads exactly one frame from reader.
+    Raises FrameTooLarge if the frame exceeds max_frame_size, and asyncio.IncompleteReadError if the stream ends first.
+    Returns the payload as bytes.
+    '''
+    header = await reader.readexactly(FRAME_HEADER_SIZE)
+    payload_size = int.from_bytes(bytes=header, byteorder='big')
+    if payload_size > max_frame_size:
+        raise FrameTooLarge(''.join(("frame of ", str(payload_size), " bytes exceeds ", str(max_frame_size))))
+    return await reader.readexactly(payload_size)
+
+async def write_frame(writer:asyncio.StreamWriter, payload):
+    '''Writes payload as one frame, handing header and payload to the transport in a single call.
+    Raises FrameTooLarge if the payload is too large to be framed.
+    '''
+    if len(payload) >= 1 << (8 * FRAME_HEADER_SIZE):
+        raise FrameTooLarge(''.join(("payload of ", str(len(payload)), " bytes cannot be framed")))
+    writer.writelines((make_header(payload_size=len(payload)), payload))
+    await writer.drain()
+
+async def decode_frame(payload, decode, loop=None, off_loop_size:int=OFF_LOOP_DECODE_SIZE):
+    '''Decodes payload with the given decode function.
+    Payloads of at least off_loop_size bytes are decoded in the loop's default executor, so they don't stall the loop.
+    decode may then run on another thread, so it mustn't touch state shared with the loop.
+    Returns the decoded payload.
+    '''
+    if len(payload) < off_loop_size:
+        return decode(payload)
+    if not loop:
+        loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, decode, payload)
@@ -0,0 +1,156 @@
+import collections
+import heapq
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Names spoken or typed by the user are matched against known names (saved sites, window titles) by the runs of characters they share.
+# A run only counts if it is longer than the minimum word size, so every run contains at least one of its n-grams of GRAM_SIZE characters,
+# and a candidate sharing no n-gram with the query can't match at all. A FuzzyIndex keeps the posting list of each n-gram,
+# so a query only looks at the candidates sharing an n-gram with it, scored together in one pass (with numpy when it is installed).
+MINIMUM_WORD_SIZE = 2  # runs must be longer than this many characters to count
+GRAM_SIZE = MINIMUM_WORD_SIZE + 1
+
+
+def intersect(item_one:str, item_two:str, minimum_word_size:int=MINIMUM_WORD_SIZE):
+    '''Greedily takes the longest runs of item_one's characters, from left to right, that also occur in item_two,
+    each run taken out of item_two so it only counts once.
+    Returns a tuple of the number of characters matched and the list of runs.
+    '''
+    item_one = item_one.lower()
+    item_two = item_two.lower()
+    char_count = 0
+    runs = []
+    start = 0
+    length = len(item_one)
+    while start < length:
+        # a run is in item_two only if every run it starts with is too, so grow the run until it isn't
+        end = start + minimum_word_size + 1
+        if end > length or item_one[start:end] not in item_two:
+            start += 1
+            continue
+        while end < length and item_one[start:end + 1] in item_two:
+            end += 1
+        run = item_one[start:end]
+        char_count += end - start
+        runs.append(run)
+        item_two = item_two.replace(run, '', 1)
+        start = end
+    return char_count, runs
+
+def get_grams(text:str, gram_size:int=GRAM_SIZE):
+    '''Returns the set of distinct n-grams in text, lowercased.
+    '''
+    text = text.lower()
+    return {text[index:index + gram_size] for index in range(len(text) - gram_size + 1)}
+
+
+class FuzzyIndex:
+    '''An n-gram index over a set of candidate strings, which can be added to and removed from.
+    '''
+    def __init__(self, candidates=(), gram_size:int=GRAM_SIZE):
+        self.gram_size = gram_size
+        self._candidates = []  # slot: candidate, None for a freed slot
+        self._slots = {}  # candidate: slot, in the order candidates were added
+        self._added = {}  # candidate: when it was added, for breaking ties
+        self._additions = 0
+        self._free_slots = []
+        self._postings = collections.defaultdict(set)  # n-gram: slots of the candidates containing it
+        self._arrays = {}  # n-gram: its postings as a numpy array, built when first needed
+        for candidate in candidates:
+            self.add(candidate)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, candidate):
+        return candidate in self._slots
+
+    def __iter__(self):
+        '''Iterates over the candidates in the order they were added.
+        '''
+        return iter(self._slots)
+
+    def add(self, candidate:str):
+        if candidate in self._slots:
+            return
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._candidates[slot] = candidate
+        else:
+            slot = len(self._candidates)
+            self._candidates.append(candidate)
+        self._slots[candidate] = slot
+        self._added[candidate] = self._additions
+        self._additions += 1
+        for gram in get_grams(candidate, gram_size=self.gram_size):
+            self._postings[gram].add(slot)
+            self._arrays.pop(gram, None)
+
+    def remove(self, candidate:str):
+        slot = self._slots.pop(candidate, None)
+        if slot is None:
+            return
+        del self._added[candidate]
+        for gram in get_grams(candidate, gram_size=self.gram_size):
+            postings = self._postings[gram]
+            postings.discard(slot)
+            if not postings:
+                del self._postings[gram]
+            self._arrays.pop(gram, None)
+        self._candidates[slot] = None
+        self._free_slots.append(slot)
+
+    def _get_array(self, gram):
+        array = self._arrays.get(gram, None)
+        if array is None:
+            array = numpy.fromiter(self._postings[gram], dtype=numpy.intp, count=len(self._postings[gram]))
+            self._arrays[gram] = array
+        return array
+
+    def score(self, query:str):
+        '''Counts, for every candidate sharing an n-gram with query, how many of query's n-grams it contains.
+        Returns a dict of candidate: count.
+        '''
+        grams = [gram for gram in get_grams(query, gram_size=self.gram_size) if gram in self._postings]
+        if not grams:
+            return {}
+        if numpy is not None:
+            counts = numpy.bincount(numpy.concatenate([self._get_array(gram) for gram in grams]), minlength=len(self._candidates))
+            return {self._candidates[slot]: int(counts[slot]) for slot in numpy.flatnonzero(counts)}
+        counts = collections.Counter()
+        for gram in grams:
+            counts.update(self._postings[gram])
+        return {self._candidates[slot]: count for slot, count in counts.items()}
+
+    def top(self, query:str, k:int=1):
+        '''Returns up to k (candidate, count) pairs sharing the most n-grams with query, the best first.
+        '''
+        scores = self.score(query)
+        return heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], self._added[item[0]]))
+
+    def get_greedy_match(self, match_string:str, minimum_word_size:int=MINIMUM_WORD_SIZE):
+        '''Picks the candidate with the most characters matched by intersect, the earliest added winning ties.
+        Returns a dict containing "match" and "char_count", the first candidate with a char_count of 0 if none match,
+        and None for both if there are no candidates.
+        '''
+        if not self._slots:
+            return {"match": None, "char_count": None}
+        if minimum_word_size + 1 >= self.gram_size:
+            contenders = self.score(match_string)
+        else:
+            # runs this short needn't contain any of the indexed n-grams
+            contenders = self._slots
+        best_match = None
+        best_count = 0
+        best_added = None
+        for candidate in contenders:
+            added = self._added[candidate]
+            char_count = intersect(match_string, candidate, minimum_word_size=minimum_word_size)[0]
+            if char_count > best_count or (char_count == best_count and char_count and added < best_added):
+                best_match, best_count, best_added = candidate, char_count, added
+        if best_match is None:
+            return {"match": next(iter(self)), "char_count": 0}
+        return {"match": best_match, "char_count": best_count}
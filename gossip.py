@@ -0,0 +1,125 @@
+import asyncio
+import random
+import logging
+from utilities import dprint
+import cerebrate_config as cc
+import cerebratesinfo, communication, mysysteminfo
+
+
+# Every GOSSIP_INTERVAL seconds each cerebrate swaps record versions with GOSSIP_FANOUT random peers, and both sides take whatever is newer.
+GOSSIP_INTERVAL = 5
+GOSSIP_FANOUT = 2
+GOSSIP_TIMEOUT = 3
+GOSSIP_CONFIG_KEY = "gossip"  # config setting switching record propagation from the Overmind to gossip, off by default
+
+_gossip_task = None
+_enabled = None
+
+
+def is_running():
+    return _gossip_task is not None and not _gossip_task.done()
+
+def is_enabled():
+    '''Returns True if records are set to spread by gossip between peers, False if they spread through the Overmind (the default).
+    Every cerebrate in the hive should have the same setting.
+    '''
+    global _enabled
+    if _enabled is None:
+        _enabled = bool(cc.get_config(GOSSIP_CONFIG_KEY))
+    return _enabled
+
+def set_enabled(enabled:bool, loop=None):
+    '''Switches record propagation to gossip or back to the Overmind, starting or stopping gossip to match.
+    '''
+    global _enabled
+    cc.set_config(GOSSIP_CONFIG_KEY, enabled)
+    _enabled = enabled
+    if enabled:
+        start(loop=loop)
+    else:
+        stop()
+
+def start(loop=None, fanout:int=GOSSIP_FANOUT, interval:float=GOSSIP_INTERVAL):
+    '''Starts gossiping records with fanout peers every interval seconds.
+    Only cerebrates set to gossip (see is_enabled) start it, their record changes spread from peer to peer instead of through the Overmind.
+    '''
+    global _gossip_task
+    if is_running():
+        return
+    _gossip_task = asyncio.ensure_future(_gossip_periodically(fanout=fanout, interval=interval), loop=loop)
+
+def stop():
+    global _gossip_task
+    if _gossip_task:
+        _gossip_task.cancel()
+        _gossip_task = None
+
+def choose_peers(fanout:int=GOSSIP_FANOUT):
+    '''Returns up to fanout random macs of cerebrates other than the local one, preferring those that are awake.
+    '''
+    awake = []
+    others = []
+    for record in cerebratesinfo.get_cerebrate_records():
+        mac = record.get(cerebratesinfo.Record.MAC, None)
+        if not mac or mac == mysysteminfo.get_mac_address():
+            continue
+        if record.get(cerebratesinfo.Record.STATUS, cerebratesinfo.Status.UNKNOWN) == cerebratesinfo.Status.AWAKE:
+            awake.append(mac)
+        else:
+            others.append(mac)
+    peers = random.sample(awake, min(fanout, len(awake)))
+    if len(peers) < fanout:
+        peers.extend(random.sample(others, min(fanout - len(peers), len(others))))
+    return peers
+
+def compare_versions(theirs:dict):
+    '''Compares the given record versions (mac: version) with the local ones.
+    Returns the local records that are newer than theirs, and a list of the macs whose records they have newer.
+    '''
+    mine = cerebratesinfo.get_record_versions()
+    newer = []
+    for record in cerebratesinfo.get_cerebrate_records():
+        mac = record.get(cerebratesinfo.Record.MAC, None)
+        if mac not in theirs or mine.get(mac, cerebratesinfo.UNVERSIONED) > theirs[mac]:
+            newer.append(record)
+    wanted = [mac for mac, version in theirs.items() if mac not in mine or version > mine[mac]]
+    return newer, wanted
+
+def apply_records(records):
+    '''Stores the given records where they are newer than the local ones.
+    Returns the number of records stored.
+    '''
+    return sum(1 for record in records if cerebratesinfo.update_cerebrate_record(cerebrate_record=record))
+
+async def gossip_with(cerebrate_mac):
+    '''Does one push-pull exchange with the given cerebrate: sends the local record versions, takes the newer records it replies with,
+    and sends back the ones it asked for.
+    Returns the number of records each side received.
+    '''
+    reply = await communication.Secretary.call(cerebrate_mac=cerebrate_mac, msg=communication.Message("gossip", data={"versions": cerebratesinfo.get_record_versions()}), timeout=GOSSIP_TIMEOUT)
+    if not isinstance(reply, dict):
+        return 0, 0
+    received = apply_records(records=reply.get("records", []))
+    wanted = set(reply.get("wanted", []))
+    pushed = [record for record in cerebratesinfo.get_cerebrate_records() if record.get(cerebratesinfo.Record.MAC, None) in wanted]
+    if pushed:
+        await communication.Secretary.call(cerebrate_mac=cerebrate_mac, msg=communication.Message("gossip", data={"records": pushed}), timeout=GOSSIP_TIMEOUT)
+    return received, len(pushed)
+
+async def gossip_round(fanout:int=GOSSIP_FANOUT):
+    '''Gossips with fanout random peers at once.
+    '''
+    peers = choose_peers(fanout=fanout)
+    results = await asyncio.gather(*[gossip_with(cerebrate_mac=peer) for peer in peers], return_exceptions=True)
+    for peer, result in zip(peers, results):
+        if isinstance(result, Exception):
+            dprint("gossip with ", peer, " failed: ", result)
+
+async def _gossip_periodically(fanout, interval):
+    while True:
+        # jitter keeps cerebrates that started together from gossiping in lockstep
+        await asyncio.sleep(interval * random.uniform(0.5, 1.5))
+        try:
+            await gossip_round(fanout=fanout)
+        except Exception as ex:
+            logging.error(ex)
@@ -0,0 +1,138 @@
+import asyncio
+import collections
+import logging
+import math
+import time
+import cerebrate_config as cc, cerebratesinfo, communication, election, mysysteminfo
+
+
+# Every HEARTBEAT_INTERVAL seconds each cerebrate sends a small datagram to the Overmind and the peers it has lately heard from or been told are awake.
+# How suspicious a peer's silence is comes out as phi, -log10 of the chance a beat would still arrive this late,
+# judged against the intervals between its recent beats. A phi of 8 means roughly a one in 10^8 chance the peer is alive.
+# A suspected Overmind is replaced by holding an election.
+HEARTBEAT_INTERVAL = 1
+HEARTBEAT_WINDOW = 100  # intervals between beats kept per peer
+PHI_SUSPECT_THRESHOLD = 8
+MIN_STANDARD_DEVIATION = 0.1  # seconds, so a peer with very regular beats isn't suspected the moment one is late
+MAX_PHI = 100.0
+PEER_HORIZON = 60  # seconds a peer is beaten for after it was last heard from, or after it was first beaten if it never answers
+
+_heartbeat_task = None
+_arrivals = {}  # mac: [last beat, deque of intervals]
+_suspected = set()
+_unanswered = {}  # mac: when an awake peer that hasn't been heard from lately was first beaten
+
+
+def is_running():
+    return _heartbeat_task is not None and not _heartbeat_task.done()
+
+def start(loop=None, interval:float=HEARTBEAT_INTERVAL):
+    '''Starts sending heartbeats every interval seconds, and marking silent peers' status UNKNOWN.
+    '''
+    global _heartbeat_task
+    if is_running():
+        return
+    _heartbeat_task = asyncio.ensure_future(_beat_periodically(interval=interval), loop=loop)
+
+def stop():
+    global _heartbeat_task
+    if _heartbeat_task:
+        _heartbeat_task.cancel()
+        _heartbeat_task = None
+
+def heard_from(cerebrate_mac, now=None):
+    '''Notes a heartbeat from the given cerebrate, marking it awake if it is newly heard from or had been suspected.
+    '''
+    if not cerebrate_mac or cerebrate_mac == mysysteminfo.get_mac_address():
+        return
+    if now is None:
+        now = time.monotonic()
+    _unanswered.pop(cerebrate_mac, None)
+    arrival = _arrivals.get(cerebrate_mac, None)
+    revived = arrival is None or cerebrate_mac in _suspected
+    if arrival is None:
+        # the first beat says nothing about timing, so assume the peer keeps the usual interval
+        _arrivals[cerebrate_mac] = [now, collections.deque([HEARTBEAT_INTERVAL], maxlen=HEARTBEAT_WINDOW)]
+    else:
+        # the gap a suspected peer was silent for isn't its usual timing either
+        if cerebrate_mac not in _suspected:
+            arrival[1].append(now - arrival[0])
+        arrival[0] = now
+    if revived:
+        _suspected.discard(cerebrate_mac)
+        cerebratesinfo.update_cerebrate_attribute(mac=cerebrate_mac, record_attribute=cerebratesinfo.Record.STATUS, attribute_value=cerebratesinfo.Status.AWAKE, stamp=False)
+
+def get_phi(cerebrate_mac, now=None):
+    '''Returns the suspicion level of the given cerebrate, 0.0 if nothing has been heard from it yet.
+    '''
+    arrival = _arrivals.get(cerebrate_mac, None)
+    if arrival is None:
+        return 0.0
+    if now is None:
+        now = time.monotonic()
+    last, intervals = arrival
+    mean = sum(intervals) / len(intervals)
+    deviation = max(math.sqrt(sum((interval - mean) ** 2 for interval in intervals) / len(intervals)), MIN_STANDARD_DEVIATION)
+    later = 0.5 * math.erfc((now - last - mean) / (deviation * math.sqrt(2)))
+    if later <= 0.0:
+        return MAX_PHI
+    return min(-math.log10(later), MAX_PHI)
+
+def is_suspected(cerebrate_mac, threshold:float=PHI_SUSPECT_THRESHOLD):
+    '''Returns True if the given cerebrate has been silent long enough to be presumed down.
+    '''
+    return get_phi(cerebrate_mac=cerebrate_mac) >= threshold
+
+def check_peers(now=None):
+    '''Marks peers that have become suspected with status UNKNOWN.
+    Returns the list of newly suspected macs.
+    '''
+    newly_suspected = []
+    for mac in list(_arrivals):
+        if mac not in _suspected and get_phi(cerebrate_mac=mac, now=now) >= PHI_SUSPECT_THRESHOLD:
+            _suspected.add(mac)
+            newly_suspected.append(mac)
+            cerebratesinfo.update_cerebrate_attribute(mac=mac, record_attribute=cerebratesinfo.Record.STATUS, attribute_value=cerebratesinfo.Status.UNKNOWN, stamp=False)
+    return newly_suspected
+
+def get_peers(now=None):
+    '''Returns the macs of the cerebrates to beat: the Overmind, those heard from within PEER_HORIZON,
+    and those marked awake that haven't gone PEER_HORIZON without answering.
+    Awake peers that never answer are marked UNKNOWN, so sleeping and long dead cerebrates stop being beaten until they are heard from again.
+    '''
+    if now is None:
+        now = time.monotonic()
+    my_mac = mysysteminfo.get_mac_address()
+    overmind_mac = cerebratesinfo.get_overmind_mac()
+    peers = []
+    for record in cerebratesinfo.get_cerebrate_records():
+        mac = record.get(cerebratesinfo.Record.MAC, None)
+        if not mac or mac == my_mac:
+            continue
+        arrival = _arrivals.get(mac, None)
+        if mac == overmind_mac or (arrival is not None and now - arrival[0] < PEER_HORIZON):
+            peers.append(mac)
+        elif record.get(cerebratesinfo.Record.STATUS, None) == cerebratesinfo.Status.AWAKE:
+            if now - _unanswered.setdefault(mac, now) < PEER_HORIZON:
+                peers.append(mac)
+            else:
+                del _unanswered[mac]
+                cerebratesinfo.update_cerebrate_attribute(mac=mac, record_attribute=cerebratesinfo.Record.STATUS, attribute_value=cerebratesinfo.Status.UNKNOWN, stamp=False)
+    return peers
+
+def send_beats():
+    peers = get_peers()
+    if peers:
+        communication.Secretary.send_messages(cerebrate_macs=peers, msg=communication.Message(cc.HEARTBEAT))
+
+async def _beat_periodically(interval):
+    while True:
+        try:
+            send_beats()
+            for mac in check_peers():
+                logging.warning(''.join((mac, " suspected down")))
+                if mac == cerebratesinfo.get_overmind_mac():
+                    election.start_election()
+        except Exception as ex:
+            logging.error(ex)
+        await asyncio.sleep(interval)
@@ -0,0 +1,59 @@
+import datetime
+import threading
+import time
+import mysysteminfo
+
+
+# Hybrid logical clock timestamps are (physical milliseconds, logical counter, mac) tuples.
+# They follow wall clock time, but never run backwards and always move past every timestamp received,
+# so the order they give is consistent across cerebrates however skewed their clocks are. The mac breaks ties.
+MAX_DRIFT = 60 * 1000  # milliseconds; timestamps further ahead of the local clock than this are not followed
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+_lock = threading.Lock()
+_last = (0, 0)
+
+
+def _wall_time():
+    return int(time.time() * 1000)
+
+def now():
+    '''Returns a new timestamp for a local event, greater than any issued or received before.
+    '''
+    global _last
+    with _lock:
+        wall = _wall_time()
+        physical, logical = _last
+        _last = (wall, 0) if wall > physical else (physical, logical + 1)
+        return _last + (mysysteminfo.get_mac_address(),)
+
+def receive(timestamp):
+    '''Advances the clock past a timestamp received from another cerebrate.
+    Returns False if the timestamp is malformed or too far ahead of the local clock to be followed.
+    '''
+    global _last
+    try:
+        remote_physical, remote_logical = int(timestamp[0]), int(timestamp[1])
+    except (TypeError, ValueError, IndexError):
+        return False
+    with _lock:
+        wall = _wall_time()
+        if remote_physical - wall > MAX_DRIFT:
+            return False
+        physical, logical = _last
+        new_physical = max(wall, physical, remote_physical)
+        if new_physical == physical and new_physical == remote_physical:
+            new_logical = max(logical, remote_logical) + 1
+        elif new_physical == physical:
+            new_logical = logical + 1
+        elif new_physical == remote_physical:
+            new_logical = remote_logical + 1
+        else:
+            new_logical = 0
+        _last = (new_physical, new_logical)
+    return True
+
+def from_datetime(value:datetime.datetime):
+    '''Returns the timestamp for a wall clock reading, ordered before any timestamp issued in the same millisecond.
+    '''
+    return ((value - _EPOCH) // datetime.timedelta(milliseconds=1), 0, '')
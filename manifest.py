@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import os
+import cerebratesinfo, mysysteminfo
+from file_transfer import hash_file
+from utilities import get_cerebrate_file_names
+
+
+# A manifest maps each source file, relative to the cerebrate's directory, to its SHA-256.
+DELTA_MIN_SIZE = 64 * 1024  # files at least this large are sent as block deltas when the receiver has an older copy
+DELTA_BLOCK_SIZE = 4 * 1024
+_WEAK_MODULUS = 1 << 16
+
+_digest_cache = {}  # file path: (mtime, size, digest)
+
+
+def get_file_digest(file_path):
+    '''Returns the hex SHA-256 digest of the file, reusing the last one if its mtime and size haven't changed.
+    '''
+    stat = os.stat(file_path)
+    cached = _digest_cache.get(file_path, None)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    digest = hash_file(file_path)
+    _digest_cache[file_path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+def to_relative_path(file_path):
+    return os.path.relpath(file_path, mysysteminfo.get_my_directory()).replace(os.sep, '/')
+
+def to_file_path(relative_path):
+    return os.path.join(mysysteminfo.get_my_directory(), *relative_path.split('/'))
+
+def _build_manifest(file_names):
+    return {to_relative_path(file_name): get_file_digest(file_name) for file_name in file_names}
+
+async def get_manifest(loop=None):
+    '''Hashes the cerebrate's source files in the loop's default executor.
+    Returns a dict of relative file path: hex SHA-256 digest.
+    '''
+    if not loop:
+        loop = asyncio.get_event_loop()
+    file_names = await get_cerebrate_file_names()
+    return await loop.run_in_executor(None, _build_manifest, file_names)
+
+def get_manifest_digest(manifest:dict):
+    '''Returns a hex SHA-256 digest identifying the whole manifest, so cerebrates holding the same files can be matched.
+    '''
+    sha = hashlib.sha256()
+    for relative_path in sorted(manifest):
+        sha.update(''.join((relative_path, ' ', manifest[relative_path], '\n')).encode())
+    return sha.hexdigest()
+
+async def advertise_manifest():
+    '''Stores the digest of the local manifest in the local cerebrate's record, for others to find it as an update source.
+    Returns the digest.
+    '''
+    digest = get_manifest_digest(manifest=await get_manifest())
+    cerebratesinfo.update_cerebrate_attribute(mac=mysysteminfo.get_mac_address(), record_attribute=cerebratesinfo.Record.MANIFEST, attribute_value=digest)
+    return digest
+
+def find_sources(manifest_digest, exclude=()):
+    '''Returns a list of the macs of awake cerebrates advertising the given manifest digest, other than the local one and those in exclude.
+    '''
+    sources = []
+    for record in cerebratesinfo.get_cerebrate_records():
+        mac = record.get(cerebratesinfo.Record.MAC, None)
+        if not mac or mac == mysysteminfo.get_mac_address() or mac in exclude:
+            continue
+        if record.get(cerebratesinfo.Record.STATUS, cerebratesinfo.Status.UNKNOWN) != cerebratesinfo.Status.AWAKE:
+            continue
+        if record.get(cerebratesinfo.Record.MANIFEST, None) == manifest_digest:
+            sources.append(mac)
+    return sources
+
+def diff_manifests(mine:dict, theirs:dict):
+    '''Returns a sorted list of the relative file paths in mine that are missing from, or differ in, theirs.
+    '''
+    return sorted(path for path, digest in mine.items() if theirs.get(path, None) != digest)
+
+def _weak_sums(block):
+    a = sum(block) % _WEAK_MODULUS
+    b = sum((len(block) - i) * byte for i, byte in enumerate(block)) % _WEAK_MODULUS
+    return a, b
+
+def _strong_sum(block):
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+def make_signature(data, block_size:int=DELTA_BLOCK_SIZE):
+    '''Returns a list of [weak, strong] checksum pairs, one for each whole block of data.
+    '''
+    signature = []
+    for offset in range(0, len(data) - block_size + 1, block_size):
+        block = data[offset:offset + block_size]
+        a, b = _weak_sums(block)
+        signature.append([a | (b << 16), _strong_sum(block)])
+    return signature
+
+def make_delta(data, signature, block_size:int=DELTA_BLOCK_SIZE):
+    '''Compares data against the signature of an older copy using a rolling checksum.
+    Returns a list of block indexes (of the older copy) and bytes literals which rebuild data when joined.
+    '''
+    blocks = {}
+    for index, (weak, strong) in enumerate(signature):
+        blocks.setdefault(weak, []).append((index, strong))
+    delta = []
+    size = len(data)
+    literal_start = 0
+    offset = 0
+    a, b = _weak_sums(data[0:block_size])
+    while blocks and offset + block_size <= size:
+        match = None
+        for index, strong in blocks.get(a | (b << 16), ()):
+            if strong == _strong_sum(data[offset:offset + block_size]):
+                match = index
+                break
+        if match is not None:
+            if literal_start < offset:
+                delta.append(bytes(data[literal_start:offset]))
+            delta.append(match)
+            offset += block_size
+            literal_start = offset
+            a, b = _weak_sums(data[offset:offset + block_size])
+            continue
+        if offset + block_size >= size:
+            break
+        out_byte = data[offset]
+        a = (a - out_byte + data[offset + block_size]) % _WEAK_MODULUS
+        b = (b - block_size * out_byte + a) % _WEAK_MODULUS
+        offset += 1
+    if literal_start < size:
+        delta.append(bytes(data[literal_start:]))
+    return delta
+
+def apply_delta(base, delta, block_size:int=DELTA_BLOCK_SIZE):
+    '''Rebuilds data from an older copy (base) and a delta made against its signature.
+    Returns the rebuilt bytes.
+    '''
+    return b''.join(base[item * block_size:(item + 1) * block_size] if isinstance(item, int) else item for item in delta)
+
+def get_signatures(manifest:dict, min_size:int=DELTA_MIN_SIZE):
+    '''Returns a dict of relative file path: signature for the files in manifest that are large enough to be sent as deltas.
+    '''
+    signatures = {}
+    for relative_path in manifest:
+        file_path = to_file_path(relative_path)
+        if os.path.getsize(file_path) < min_size:
+            continue
+        with open(file_path, 'rb') as open_file:
+            signatures[relative_path] = make_signature(open_file.read())
+    return signatures
+
+def make_file_delta(relative_path, signature):
+    with open(to_file_path(relative_path), 'rb') as open_file:
+        return make_delta(open_file.read(), signature)
@@ -0,0 +1,178 @@
+import hashlib
+import cerebratesinfo, communication, gossip, mysysteminfo
+from resources import resource_handler
+
+
+# Stores are hashed into a tree of hex digit prefixes of their keys' SHA-256, MERKLE_DEPTH levels deep.
+# Peers compare root hashes and only descend into, and then exchange, the parts of a store that differ.
+MERKLE_DEPTH = 2
+MERKLE_TIMEOUT = 5
+RECORDS = "records"
+SECTIONS = "sections"
+SECTION = "section:"
+_HEX_DIGITS = '0123456789abcdef'
+
+
+class MerkleTree:
+    '''Hashes of a store's (key, version) pairs, bucketed by key hash prefix.
+    Only non-empty subtrees are kept, so sparse stores stay small.
+    '''
+    def __init__(self, versions:dict, depth:int=MERKLE_DEPTH):
+        self.depth = depth
+        self.buckets = {}
+        for key, version in versions.items():
+            self.buckets.setdefault(hashlib.sha256(str(key).encode()).hexdigest()[:depth], {})[key] = version
+        self.hashes = {}
+        for prefix, bucket in self.buckets.items():
+            sha = hashlib.sha256()
+            for key in sorted(bucket, key=str):
+                sha.update(''.join((str(key), '\0', str(bucket[key]), '\n')).encode())
+            self.hashes[prefix] = sha.digest()
+        for level in range(depth, 0, -1):
+            children = {}
+            for prefix in self.hashes:
+                if len(prefix) == level:
+                    children.setdefault(prefix[:-1], []).append(prefix)
+            for parent, child_prefixes in children.items():
+                sha = hashlib.sha256()
+                for child in sorted(child_prefixes):
+                    sha.update(child.encode() + self.hashes[child])
+                self.hashes[parent] = sha.digest()
+
+    def get_hash(self, prefix:str=''):
+        return self.hashes.get(prefix, b'')
+
+    def get_children(self, prefix:str=''):
+        '''Returns a dict of child prefix: hash for the non-empty children of the given prefix.
+        '''
+        return {prefix + digit: self.hashes[prefix + digit] for digit in _HEX_DIGITS if prefix + digit in self.hashes}
+
+    def get_bucket(self, prefix:str):
+        '''Returns a dict of key: version for the keys in the given leaf bucket.
+        '''
+        return dict(self.buckets.get(prefix, {}))
+
+
+def _get_section_versions(section):
+    return {key: value.get(resource_handler.MODIFIED_TIME, None) if type(value) is dict else None for key, value in resource_handler.get_resources(section=section, with_timestamp=True)}
+
+def get_versions(store:str):
+    '''Returns a dict of key: version for the named store.
+    "records" holds cerebrate records, "section:<name>" a resource section, and "sections" each section's root hash.
+    '''
+    if store == RECORDS:
+        return cerebratesinfo.get_record_versions()
+    if store == SECTIONS:
+        return {section: MerkleTree(versions=_get_section_versions(section=section)).get_hash().hex() for section in resource_handler.get_sections()}
+    if store.startswith(SECTION):
+        return _get_section_versions(section=store[len(SECTION):])
+    raise KeyError(store)
+
+def get_items(store:str, keys):
+    '''Returns the named store's items for the given keys, as a list of records or a dict of timestamped resources.
+    '''
+    keys = set(keys)
+    if store == RECORDS:
+        return [record for record in cerebratesinfo.get_cerebrate_records() if record.get(cerebratesinfo.Record.MAC, None) in keys]
+    if store.startswith(SECTION):
+        return {key: value for key, value in resource_handler.get_resources(section=store[len(SECTION):], with_timestamp=True) if key in keys}
+    raise KeyError(store)
+
+def apply_items(store:str, items):
+    '''Stores the given items in the named store, where they are newer than the local ones.
+    '''
+    if store == RECORDS:
+        #as with update_records, the Overmind passes on what it learns unless peers are set to gossip
+        propagate = (cerebratesinfo.get_overmind_mac() == mysysteminfo.get_mac_address()) and not gossip.is_enabled()
+        for record in items:
+            if cerebratesinfo.update_cerebrate_record(cerebrate_record=record) and propagate:
+                communication.Secretary.queue_message(msg=communication.Message("update_records", data=[record]))
+    elif store.startswith(SECTION):
+        resource_handler.update_resources(section=store[len(SECTION):], resources=items)
+    else:
+        raise KeyError(store)
+
+def answer(request:dict):
+    '''Answers a peer's "merkle" request for the named store.
+    "root" is compared first, returning True if the stores match. "children" (prefixes) are answered with their child hashes,
+    "buckets" (leaf prefixes) with their key versions, "get" (keys) with their items, and "put" items are stored.
+    Returns the answer as a dict.
+    '''
+    store = request["store"]
+    if "put" in request:
+        apply_items(store=store, items=request["put"])
+    if "get" in request:
+        return {"items": get_items(store=store, keys=request["get"])}
+    tree = MerkleTree(versions=get_versions(store=store))
+    if request.get("root", None) == tree.get_hash():
+        return {"in sync": True}
+    answer = {}
+    if "children" in request:
+        answer["children"] = {prefix: tree.get_children(prefix=prefix) for prefix in request["children"]}
+    if "buckets" in request:
+        answer["buckets"] = {prefix: tree.get_bucket(prefix=prefix) for prefix in request["buckets"]}
+    return answer
+
+async def _ask(cerebrate_mac, request:dict):
+    reply = await communication.Secretary.call(cerebrate_mac=cerebrate_mac, msg=communication.Message("merkle", data=request), timeout=MERKLE_TIMEOUT)
+    if not isinstance(reply, dict):
+        raise ValueError(''.join(("unexpected merkle reply from ", cerebrate_mac, ": ", str(reply))))
+    return reply
+
+async def find_differences(cerebrate_mac, store:str):
+    '''Descends the named store's tree alongside the given cerebrate's, into subtrees whose hashes differ.
+    Returns two dicts of key: version, the local and remote versions of the keys in differing buckets (both empty if in sync).
+    '''
+    tree = MerkleTree(versions=get_versions(store=store))
+    reply = await _ask(cerebrate_mac=cerebrate_mac, request={"store": store, "root": tree.get_hash(), "children": ['']})
+    if reply.get("in sync", False):
+        return {}, {}
+    prefixes = ['']
+    while True:
+        children = reply.get("children", {})
+        differing = []
+        for prefix in prefixes:
+            theirs = children.get(prefix, {})
+            mine = tree.get_children(prefix=prefix)
+            differing.extend(child for child in sorted(set(theirs) | set(mine)) if theirs.get(child, None) != mine.get(child, None))
+        prefixes = differing
+        if not prefixes or len(prefixes[0]) >= tree.depth:
+            break
+        reply = await _ask(cerebrate_mac=cerebrate_mac, request={"store": store, "children": prefixes})
+    if not prefixes:
+        return {}, {}
+    reply = await _ask(cerebrate_mac=cerebrate_mac, request={"store": store, "buckets": prefixes})
+    mine = {}
+    theirs = {}
+    for prefix in prefixes:
+        mine.update(tree.get_bucket(prefix=prefix))
+        theirs.update(reply.get("buckets", {}).get(prefix, {}))
+    return mine, theirs
+
+def _is_newer(version, than):
+    if than is None:
+        return version is not None
+    return version is not None and version > than
+
+async def sync_store(cerebrate_mac, store:str):
+    '''Brings the named store in sync with the given cerebrate's, both ways, exchanging only the items that differ.
+    Returns the number of items pulled and pushed.
+    '''
+    mine, theirs = await find_differences(cerebrate_mac=cerebrate_mac, store=store)
+    pull = [key for key, version in theirs.items() if key not in mine or _is_newer(version, mine[key])]
+    push = [key for key, version in mine.items() if key not in theirs or _is_newer(version, theirs[key])]
+    if pull:
+        reply = await _ask(cerebrate_mac=cerebrate_mac, request={"store": store, "get": pull})
+        apply_items(store=store, items=reply.get("items", []))
+    if push:
+        await _ask(cerebrate_mac=cerebrate_mac, request={"store": store, "put": get_items(store=store, keys=push)})
+    return len(pull), len(push)
+
+async def sync_with(cerebrate_mac):
+    '''Brings cerebrate records and every resource section in sync with the given cerebrate.
+    Stores that already match cost a single exchange of root hashes.
+    '''
+    await sync_store(cerebrate_mac=cerebrate_mac, store=RECORDS)
+    mine, theirs = await find_differences(cerebrate_mac=cerebrate_mac, store=SECTIONS)
+    for section in sorted(set(mine) | set(theirs)):
+        await sync_store(cerebrate_mac=cerebrate_mac, store=SECTION + section)
@@ -0,0 +1,66 @@
+import enum
+import hashlib
+import socket
+import struct
+import cerebratesinfo
+
+
+# Each (record attribute, value) pair a cerebrate has maps to one administratively scoped multicast group.
+MULTICAST_PORT = 9998
+MULTICAST_TTL = 1  # multicast stays on the local network
+GROUP_ATTRIBUTES = (cerebratesinfo.Record.LOCATION, cerebratesinfo.Record.ROLE, cerebratesinfo.Record.TAGS)
+_GROUP_PREFIX = (239, 192)  # the organization local scope, 239.192.0.0/14
+
+
+def get_group_key(record_attribute, attribute_value):
+    '''Returns the string naming the group of cerebrates with the given attribute value, e.g. "LOCATION:kitchen".
+    '''
+    if isinstance(attribute_value, enum.Enum):
+        attribute_value = attribute_value.name
+    return ':'.join((record_attribute.name, str(attribute_value).strip().lower()))
+
+def get_group_address(group_key):
+    '''Returns the multicast address for the given group key.
+    '''
+    digest = hashlib.sha256(group_key.encode()).digest()
+    return '.'.join(str(part) for part in (_GROUP_PREFIX[0], _GROUP_PREFIX[1] | (digest[0] & 0x03), digest[1], digest[2]))
+
+def get_record_groups(record):
+    '''Returns the set of group keys the cerebrate with the given record belongs to.
+    '''
+    groups = set()
+    for record_attribute in GROUP_ATTRIBUTES:
+        values = record.get(record_attribute, None)
+        if not values:
+            continue
+        if isinstance(values, (str, enum.Enum)):
+            values = [values]
+        for value in values:
+            groups.add(get_group_key(record_attribute=record_attribute, attribute_value=value))
+    return groups
+
+def make_receiving_socket(port:int=MULTICAST_PORT):
+    '''Returns a non-blocking UDP socket bound to the multicast port, ready to join groups.
+    '''
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, 'SO_REUSEPORT'):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('', port))
+    sock.setblocking(False)
+    return sock
+
+def set_sending_options(sock, interface_ip):
+    '''Sets sock up to send multicast datagrams out of the given interface.
+    '''
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface_ip))
+
+def _membership(group_key, interface_ip):
+    return struct.pack('4s4s', socket.inet_aton(get_group_address(group_key=group_key)), socket.inet_aton(interface_ip))
+
+def join_group(sock, group_key, interface_ip):
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, _membership(group_key=group_key, interface_ip=interface_ip))
+
+def leave_group(sock, group_key, interface_ip):
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP, _membership(group_key=group_key, interface_ip=interface_ip))
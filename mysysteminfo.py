@@ -1,19 +1,66 @@
+import asyncio
+import logging
 import socket
 import enum
 import os
 from sys import platform
 from uuid import getnode
 
+# The IP address is looked up once and cached, then looked up again in the background every ADDRESS_POLL_INTERVAL seconds
+# to notice when the network changes.
+ADDRESS_POLL_INTERVAL = 30
+
 _my_mac_address = None
+_my_ip_address = None
 
 class OS(enum.Enum):
 	LINUX = enum.auto()
 	WINDOWS = enum.auto()
 	OTHER = enum.auto()
 
-def get_ip_address():
+def _resolve_ip_address():
 	return socket.gethostbyname(socket.gethostname())
 
+def get_ip_address():
+	'''Returns the cached IP address, looking it up if it hasn't been yet.
+	'''
+	global _my_ip_address
+	if _my_ip_address is None:
+		_my_ip_address = _resolve_ip_address()
+	return _my_ip_address
+
+def refresh_ip_address():
+	'''Looks the IP address up again, without the cache. Blocks while the host name is resolved.
+	Returns the previous address if it changed, otherwise None.
+	'''
+	global _my_ip_address
+	try:
+		ip_address = _resolve_ip_address()
+	except OSError as ex:
+		logging.error(''.join(("Could not look up IP address: ", str(ex))))
+		return None
+	previous, _my_ip_address = _my_ip_address, ip_address
+	return previous if previous != ip_address else None
+
+async def watch_ip_address(on_change, interval:float=ADDRESS_POLL_INTERVAL):
+	'''Looks the IP address up every interval seconds, off the event loop.
+	When it changes on_change, a coroutine function, is awaited with the previous and the new address.
+	If on_change returns False or raises, the change isn't settled and on_change is awaited again on the next poll.
+	'''
+	loop = asyncio.get_event_loop()
+	unsettled = None  # address changed from, while on_change hasn't succeeded
+	while True:
+		await asyncio.sleep(interval)
+		previous = await loop.run_in_executor(None, refresh_ip_address)
+		previous = unsettled or previous
+		if previous is not None:
+			try:
+				settled = await on_change(previous, get_ip_address()) is not False
+			except Exception as ex:
+				logging.error(ex)
+				settled = False
+			unsettled = None if settled else previous
+
 def get_mac_address():
 	return _my_mac_address
 
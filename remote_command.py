@@ -1,9 +1,10 @@
 import asyncio
 import datetime
 import cerebrate_config as cc
-from utilities import aprint, dprint, get_cerebrate_file_names
+import hashlib
+from utilities import aprint, dprint, backup_file, get_cerebrate_file_names, restore_file
 from decorators import print_func_name
-import cerebrate, cerebratesinfo, command, communication, mysysteminfo, requirements
+import cerebrate, cerebratesinfo, command, communication, election, gossip, manifest, merkle, mysysteminfo, requirements, update_orchestrator
 from definitions import Resource
 from resources import resource_handler
 
@@ -28,10 +29,18 @@ async def send_update(msg):
         return cc.CLOSE_CONNECTION, "requester's version number not included"
     if version >= cc.my_version:
         return cc.CLOSE_CONNECTION, "requester not out of date"
+    if cerebratesinfo.get_overmind_mac() == mysysteminfo.get_mac_address():
+        #the Overmind updates cerebrates in waves rather than all at once
+        if not update_orchestrator.schedule_update(cerebrate_mac=msg.sender_mac):
+            return cc.CLOSE_CONNECTION, "rollout halted"
+        return cc.CLOSE_CONNECTION, "update scheduled"
     requirements.update_requirements()
     dprint("Sending updates to ", msg.sender_mac)
-    files = await get_cerebrate_file_names()
-    success = await communication.Secretary.transfer_files(cerebrate_mac=msg.sender_mac, file_names=files)
+    if "manifest" in msg.data:
+        success = await update_orchestrator.send_changes(cerebrate_mac=msg.sender_mac, remote=msg.data)
+    else:
+        files = await get_cerebrate_file_names()
+        success = await communication.Secretary.transfer_files(cerebrate_mac=msg.sender_mac, file_names=files)
     if success:
         await communication.Secretary.communicate_message(cerebrate_mac=msg.sender_mac, msg=communication.Message("restart", data="cerebrate updated"))
     else:
@@ -39,6 +48,24 @@ async def send_update(msg):
         return cc.CLOSE_CONNECTION, "failed"
     return cc.CLOSE_CONNECTION, cc.SUCCESS
 
+@print_func_name
+async def update_refused(msg):
+    '''The Overmind won't update this cerebrate until its halted rollout is resumed.
+    Stops waiting for the update, so the cerebrate can ask again when told to check its version.
+    '''
+    dprint("update refused: ", msg.data)
+    cc.update_in_progress = False
+    return cc.CLOSE_CONNECTION, cc.SUCCESS
+
+@print_func_name
+async def rollout(msg):
+    '''Message data may contain "resume" (True to resume a halted rollout).
+    Returns the local update rollout status (see update_orchestrator.get_rollout_status), after resuming it if asked to.
+    '''
+    if msg.data and msg.data.get("resume", False):
+        update_orchestrator.resume_rollout()
+    return cc.CLOSE_CONNECTION, update_orchestrator.get_rollout_status()
+
 @print_func_name
 async def check_version(msg):
     '''Compares cerebrate versions, requesting an update if needed.
@@ -48,26 +75,95 @@ async def check_version(msg):
     version = msg.data.get("version", None)
     if not version:
         return cc.CLOSE_CONNECTION, cc.FINISHED
-    if cc.my_version > version:
+    if cc.my_version > version and cerebratesinfo.get_overmind_mac() == mysysteminfo.get_mac_address():
+        update_orchestrator.schedule_update(cerebrate_mac=msg.sender_mac)
+    elif cc.my_version > version:
         await communication.Secretary.communicate_message(cerebrate_mac=msg.sender_mac, msg=communication.Message("check_version", data={"version": cc.my_version}))
     elif cc.my_version < version:
         cc.update_in_progress = True
         print("Updating...")
-        await communication.Secretary.communicate_message(cerebrate_mac=msg.sender_mac, msg=communication.Message("send_update", data={"version": cc.my_version}))
+        _, data = await send_manifest(msg=msg)
+        data["version"] = cc.my_version
+        await communication.Secretary.communicate_message(cerebrate_mac=msg.sender_mac, msg=communication.Message("send_update", data=data))
     return cc.CLOSE_CONNECTION, cc.FINISHED
 
+@print_func_name
+async def send_manifest(msg):
+    '''Returns the local source manifest, along with signatures of the files large enough to be updated by delta.
+    '''
+    local_manifest = await manifest.get_manifest()
+    signatures = await asyncio.get_event_loop().run_in_executor(None, manifest.get_signatures, local_manifest)
+    return cc.CLOSE_CONNECTION, {"manifest": local_manifest, "signatures": signatures}
+
+@print_func_name
+async def send_files(msg):
+    '''Message data must contain "files" (a list of relative file paths) and "manifest" (a manifest digest).
+    Transfers the files back to the sender, if the local files match the manifest digest and all of them are in the local manifest.
+    Returns True if the transfer succeeded.
+    '''
+    local_manifest = await manifest.get_manifest()
+    if manifest.get_manifest_digest(manifest=local_manifest) != msg.data.get("manifest", None):
+        return cc.CLOSE_CONNECTION, False
+    relative_paths = msg.data.get("files", [])
+    if any(relative_path not in local_manifest for relative_path in relative_paths):
+        dprint("Refusing to send files outside the manifest to ", msg.sender_mac)
+        return cc.CLOSE_CONNECTION, False
+    file_names = [manifest.to_file_path(relative_path) for relative_path in relative_paths]
+    return cc.CLOSE_CONNECTION, await communication.Secretary.transfer_files(cerebrate_mac=msg.sender_mac, file_names=file_names)
+
+@print_func_name
+async def fetch_files(msg):
+    '''Message data must contain "source" (a cerebrate mac), "files" (a list of relative file paths) and "manifest" (a manifest digest).
+    Asks the source cerebrate to send the files here.
+    Returns True if it did.
+    '''
+    send_msg = communication.Message("send_files", data={"manifest": msg.data.get("manifest", None), "files": msg.data.get("files", [])})
+    try:
+        return cc.CLOSE_CONNECTION, await communication.Secretary.call(cerebrate_mac=msg.data.get("source", None), msg=send_msg, timeout=update_orchestrator.SOURCE_TRANSFER_TIMEOUT) is True
+    except (asyncio.TimeoutError, ConnectionError):
+        return cc.CLOSE_CONNECTION, False
+
+@print_func_name
+async def apply_deltas(msg):
+    '''Message data must contain a dict of relative file path: {"delta": delta, cc.HASH: digest}.
+    Rebuilds each file from its local copy and delta, keeping it only if the result matches the digest.
+    Returns a list of the files that could not be rebuilt.
+    '''
+    failed = []
+    backed_up = set()
+    for relative_path, change in msg.data.items():
+        file_path = manifest.to_file_path(relative_path)
+        try:
+            with open(file_path, 'rb') as open_file:
+                data = manifest.apply_delta(base=open_file.read(), delta=change["delta"])
+            if hashlib.sha256(data).hexdigest() != change[cc.HASH]:
+                failed.append(relative_path)
+                continue
+            if backup_file(file_path=file_path):
+                backed_up.add(file_path)
+            with open(file_path, 'wb') as open_file:
+                open_file.write(data)
+        except Exception as ex:
+            dprint(ex)
+            #a backup left by an earlier update would overwrite a file this call never touched
+            if file_path in backed_up:
+                restore_file(file_path=file_path)
+            failed.append(relative_path)
+    return cc.CLOSE_CONNECTION, failed
+
 @print_func_name
 async def _designate_overmind(mac):
     if cerebratesinfo.get_overmind_mac() == mac:
         return
     dprint("designating ", mac)
-    cerebratesinfo.designate_overmind(mac=mac)
     if mac != mysysteminfo.get_mac_address():
         '''shouldn't need to ask for acknowledgment, cerebrates are already up to date'''
         #dprint("asking for acknowledgment")
         #await communication.Secretary.communicate_message(cerebrate_mac=mac, msg=communication.Message("acknowledge", data={"version": cc.my_version}))
+        cerebratesinfo.designate_overmind(mac=mac)
+        communication.Secretary.update_multicast_groups()
     else:
-        communication.Secretary.broadcast_message(msg=communication.Message("update_records", cc.OVERRULE, data=[cerebratesinfo.get_overmind_record()]))
+        election.claim_leadership()
 
 @print_func_name
 async def _send_all_resources(cerebrate_mac):
@@ -92,12 +188,14 @@ async def acknowledge(msg):
     if cerebratesinfo.get_overmind_mac() != mysysteminfo.get_mac_address():
         return cc.CLOSE_CONNECTION, cc.FINISHED
     dprint("acknowledging")
-    #Send a current list of records
-    await communication.Secretary.communicate_message(cerebrate_mac=msg.sender_mac, msg=communication.Message("update_records", cc.RECIPROCATE, cc.OVERRULE, data=cerebratesinfo.get_cerebrate_records_list()))
-    #Send a current list of resources
-    await _send_all_resources(cerebrate_mac=msg.sender_mac)
-    #Get a current list of their resources
-    await communication.Secretary.communicate_message(cerebrate_mac=msg.sender_mac, msg=communication.Message("send_resources"))
+    update_orchestrator.acknowledged(cerebrate_mac=msg.sender_mac, version=msg.data.get("version", None), manifest_digest=msg.data.get("manifest", None))
+    #Make sure they know who the Overmind is
+    await communication.Secretary.communicate_message(cerebrate_mac=msg.sender_mac, msg=communication.Message("update_records", cc.OVERRULE, election.make_term_header(), data=[cerebratesinfo.get_overmind_record()]))
+    #Exchange only the records and resources that differ
+    try:
+        await merkle.sync_with(cerebrate_mac=msg.sender_mac)
+    except Exception as ex:
+        dprint("merkle sync with ", msg.sender_mac, " failed: ", ex)
     #Ensure up-to-date files
     if msg.data.get("version", None):
         return await check_version(msg=msg)
@@ -109,19 +207,37 @@ async def update_records(msg):
     Updates the local cerebrate records with the given ones, if the given ones contain more recent information.
     If CC.RECIPROCATE is in the header a Message containing the local copy of updated cerebrate records will be returned.
     '''
-    if cc.OVERRULE in msg.header:
+    if cc.OVERRULE in msg.header and election.accept_leader(cerebrate_mac=msg.sender_mac, term=election.get_term(msg.header)):
         dprint("Being overruled")
         await _designate_overmind(mac=msg.sender_mac)
     dprint("updating records from ", msg.sender_mac)
-    propagate = (cerebratesinfo.get_overmind_mac() == mysysteminfo.get_mac_address())
+    #when set to gossip, peers spread changes to each other
+    propagate = (cerebratesinfo.get_overmind_mac() == mysysteminfo.get_mac_address()) and not gossip.is_enabled()
     for record in msg.data:
         #if Overmind receives new information then propagate it to other cerebrates
         if cerebratesinfo.update_cerebrate_record(cerebrate_record=record) and propagate:
-            communication.Secretary.broadcast_message(msg=communication.Message("update_records", data=[record]))
+            communication.Secretary.queue_message(msg=communication.Message("update_records", data=[record]))
     if cc.RECIPROCATE in msg.header:
         return cc.REMOTE_COMMAND, communication.Message("update_records", data=cerebratesinfo.get_cerebrate_records_list())
     return cc.CLOSE_CONNECTION, "records updated"
 
+async def merkle_sync(msg):
+    '''Message data must contain "store", and any of "root", "children", "buckets", "get" and "put" (see merkle.answer).
+    Returns the answer to the sender's comparison of the named store's Merkle tree.
+    '''
+    return cc.CLOSE_CONNECTION, merkle.answer(request=msg.data)
+
+async def gossip_records(msg):
+    '''Message data must contain "versions" (a dict of mac: record version) and/or "records" (a list of cerebrate records).
+    Stores any of the given records that are newer than the local ones.
+    Returns the local records newer than the given versions, and the macs whose records the sender has newer.
+    '''
+    received = gossip.apply_records(records=msg.data.get("records", []))
+    if "versions" not in msg.data:
+        return cc.CLOSE_CONNECTION, received
+    newer, wanted = gossip.compare_versions(theirs=msg.data["versions"])
+    return cc.CLOSE_CONNECTION, {"records": newer, "wanted": wanted}
+
 @print_func_name
 async def update_resources(msg):
     '''Message header must contain str(Resource.SECTION):section.
@@ -144,15 +260,25 @@ async def update_resources(msg):
     for resources in msg.data:
         #if Overmind receives new information then propagate it to other cerebrates
         if resource_handler.update_resources(section=section, resources=resources) and propagate:
-            communication.Secretary.broadcast_message(msg=communication.Message("update_resources", ':'.join((str(Resource.SECTION), section)), data=[resources]))
+            communication.Secretary.queue_message(msg=communication.Message("update_resources", ':'.join((str(Resource.SECTION), section)), data=[resources]))
     return cc.CLOSE_CONNECTION, "resources updated"
 
 @print_func_name
 async def assume_overmind(msg):
     '''Sets self as Overmind, broadcasts the change to others.
+    The header may carry the election term to take the role in.
     '''
     dprint("Assuming Overmind")
-    await _designate_overmind(mac=mysysteminfo.get_mac_address())
+    election.claim_leadership(term=election.get_term(msg.header))
+    return cc.CLOSE_CONNECTION, cc.SUCCESS
+
+@print_func_name
+async def elect(msg):
+    '''Message header must contain the election term, as "term:N".
+    A lower ranked cerebrate is holding an election: answers it, and holds one in its place.
+    '''
+    election.note_term(term=election.get_term(msg.header))
+    election.start_election()
     return cc.CLOSE_CONNECTION, cc.SUCCESS
 
 async def restart(msg):
@@ -161,20 +287,32 @@ async def restart(msg):
         requirements.install_requirements()
     await cerebrate.terminate()
 
+def is_idempotent(msg):
+    '''Returns True if msg is a remote command marked idempotent, and so is safe to deliver more than once.
+    '''
+    key = _find_command_key(msg=msg)
+    return commands[key].get(command.Command.IDEMPOTENT, False) if key else False
+
+def _find_command_key(msg):
+    '''Returns the key of the command named in msg's header, or None if it names none.
+    Each header item is looked up directly, rather than each command key searched for.
+    '''
+    keys = [item for item in command.format_header(header=msg.header) if item in commands]
+    return min(keys, key=_command_order.get) if keys else None
+
 async def run_command(msg):
     '''Given a Message, runs the contained command if possible 
     Returns an action, data pair.
     '''
     if cc.my_state_event[cc.State.TERMINATING].is_set():
         return cc.CLOSE_CONNECTION, "cerebrate terminating"
-    formatted_header = command.format_header(header=msg.header)
     cerebratesinfo.update_cerebrate_contact_time(mac=mysysteminfo.get_mac_address())
-    for key, _ in commands.items():
-        if key in formatted_header:
-            dprint("before: ", cerebratesinfo.get_overmind_mac())
-            result = await commands[key][command.Command.FUNCTION](msg)
-            dprint("after: ", cerebratesinfo.get_overmind_mac())
-            return result
+    key = _find_command_key(msg=msg)
+    if key:
+        dprint("before: ", cerebratesinfo.get_overmind_mac())
+        result = await commands[key][command.Command.FUNCTION](msg)
+        dprint("after: ", cerebratesinfo.get_overmind_mac())
+        return result
     return cc.CLOSE_CONNECTION, "command not recognized"
 
 
@@ -182,11 +320,21 @@ commands = {
     'acknowledge': {command.Command.FUNCTION: acknowledge},
     'update_records': {command.Command.FUNCTION: update_records},
     'update_resources': {command.Command.FUNCTION: update_resources},
-    'ping': {command.Command.FUNCTION: ping},
+    'ping': {command.Command.FUNCTION: ping, command.Command.IDEMPOTENT: True},
     'display_message': {command.Command.FUNCTION: display_message},
-    'assume_overmind': {command.Command.FUNCTION: assume_overmind},
+    'assume_overmind': {command.Command.FUNCTION: assume_overmind, command.Command.IDEMPOTENT: True},
+    'election': {command.Command.FUNCTION: elect},
     'check_version': {command.Command.FUNCTION: check_version},
     'send_resources': {command.Command.FUNCTION: send_resources},
     'send_update': {command.Command.FUNCTION: send_update},
+    'update_refused': {command.Command.FUNCTION: update_refused},
+    'rollout': {command.Command.FUNCTION: rollout},
+    'send_manifest': {command.Command.FUNCTION: send_manifest},
+    'apply_deltas': {command.Command.FUNCTION: apply_deltas},
+    'send_files': {command.Command.FUNCTION: send_files},
+    'fetch_files': {command.Command.FUNCTION: fetch_files},
+    'gossip': {command.Command.FUNCTION: gossip_records},
+    'merkle': {command.Command.FUNCTION: merkle_sync},
     'restart': {command.Command.FUNCTION: restart}
-}
\ No newline at end of file
+}
+_command_order = {key: index for index, key in enumerate(commands)}
\ No newline at end of file
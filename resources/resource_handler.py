@@ -5,7 +5,6 @@ import cerebratesinfo
 import communication
 import asyncio
 import traceback
-from utilities import run_coroutine
 from definitions import Resource
 from mysysteminfo import get_hive_directory, get_mac_address
 from abc import ABC, abstractmethod
@@ -20,6 +19,8 @@ RESOURCE_VALUE = "res_value"
 
 initialized = False
 
+_update_hooks = {}  # section: functions to call with the resources updated in it
+
 
 class Resource_BC(ABC):
 	'''Base class for resource classes.
@@ -33,6 +34,19 @@ class Resource_BC(ABC):
 			raise EnvironmentError
 
 
+def add_update_hook(section:str, hook):
+	'''Has hook(section, updated_resources) called whenever update_resources changes resources in the given section,
+	updated_resources being the changed resources with their timestamps.
+	'''
+	_update_hooks.setdefault(section, []).append(hook)
+
+def _run_update_hooks(section:str, updated_resources:dict):
+	for hook in _update_hooks.get(section, ()):
+		try:
+			hook(section, updated_resources)
+		except Exception:
+			traceback.print_exc()
+
 def _get_file_location(section:str):
 	path = section.split(FOLDER_SEPARATOR)
 	filename = '.'.join((path[len(path)-1], RESOURCE_FILE_EXTENSION))
@@ -57,9 +71,9 @@ def propagate_resources(section:str, timestamped_resources:dict):
 	overmind_mac = cerebratesinfo.get_overmind_mac()
 	msg = communication.Message("update_resources", ':'.join((str(Resource.SECTION), section)), data=[timestamped_resources])
 	if get_mac_address() == overmind_mac:
-		run_coroutine(communication.Secretary.broadcast_message(msg=msg))
+		communication.Secretary.queue_message(msg=msg)
 	else:
-		run_coroutine(communication.Secretary.communicate_message(cerebrate_mac=overmind_mac, msg=msg))
+		communication.Secretary.queue_message(msg=msg, cerebrate_mac=overmind_mac)
 
 def store_resources(section:str, resources:dict):
 	'''Saves  resources for later reference, overwriting existing records with the same keys.
@@ -100,6 +114,8 @@ def update_resources(section:str, resources:dict):
 					updated_resources[key] = s[key]
 	except:
 		raise
+	if len(updated_resources) > 0:
+		_run_update_hooks(section=section, updated_resources=updated_resources)
 	if len(updated_resources) > 0 and get_mac_address() == cerebratesinfo.get_overmind_mac():
 		propagate_resources(section=section, timestamped_resources=updated_resources)
 	return updated_resources
@@ -143,6 +159,17 @@ def get_resource_keys(section:str):
 		'''section doesn't exist'''
 	return keys
 
+def get_sections():
+	'''Returns a list of the names of all stored sections.
+	'''
+	sections = []
+	for dirname, _, filenames in os.walk(RESOURCES_BASE_LOCATION):
+		section = os.path.basename(dirname)
+		prefix = '.'.join((section, RESOURCE_FILE_EXTENSION))
+		if any(filename.startswith(prefix) for filename in filenames):
+			sections.append(section)
+	return sections
+
 def get_all_resources_by_section(with_timestamp=False):
 	'''Generator for all sections.
 	Yields section and a dict of resources.
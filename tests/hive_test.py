@@ -0,0 +1,17 @@
+'''Imports the cerebrate's modules for tests.
+The hive directory is relative to the working directory, so tests run from a temporary one.
+'''
+import atexit
+import os
+import sys
+import tempfile
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIRECTORY = tempfile.mkdtemp(prefix="hive_test_")
+
+os.chdir(TEST_DIRECTORY)
+sys.path.insert(0, REPOSITORY)
+import cerebrate  # imported first, as when running a cerebrate, to settle the import cycle between command and communication
+
+# records are written back to the hive directory at exit, by which time the test runner may have changed directory
+atexit.register(os.chdir, TEST_DIRECTORY)
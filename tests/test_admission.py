@@ -0,0 +1,101 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import admission
+
+
+class HandlerQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _fill(self, queue, handled, acks):
+        '''Starts a handler that holds the only slot until released, and queues an acked handler behind it.
+        Returns the event releasing the slot.
+        '''
+        release = asyncio.Event()
+
+        async def hold():
+            await release.wait()
+            handled.append("held")
+
+        async def acked():
+            handled.append("acked")
+
+        self.assertTrue(queue.submit(hold))
+        self.assertTrue(queue.submit(acked, on_start=lambda: acks.append("acked")))
+        return release
+
+    def test_acked_handler_evicted_while_waiting_is_not_acked(self):
+        queue = admission.HandlerQueue(limit=1, policy=admission.DROP_OLDEST, max_waiting=1)
+        handled, acks = [], []
+
+        async def run():
+            release = self._fill(queue=queue, handled=handled, acks=acks)
+
+            async def newer():
+                handled.append("newer")
+
+            self.assertTrue(queue.submit(newer))
+            release.set()
+            await asyncio.sleep(0.01)
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(handled, ["held", "newer"])
+        self.assertEqual(acks, [])
+        self.assertEqual(queue.shed, 1)
+
+    def test_acked_handler_is_acked_when_it_starts(self):
+        queue = admission.HandlerQueue(limit=1, policy=admission.DROP_OLDEST, max_waiting=1)
+        handled, acks = [], []
+
+        async def run():
+            release = self._fill(queue=queue, handled=handled, acks=acks)
+            await asyncio.sleep(0.01)
+            self.assertEqual(acks, [])
+            release.set()
+            await asyncio.sleep(0.01)
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(handled, ["held", "acked"])
+        self.assertEqual(acks, ["acked"])
+
+
+class SessionLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_full_limiter_evicts_an_idle_session(self):
+        limiter = admission.SessionLimiter(limit=1, policy=admission.REJECT, wait_timeout=1)
+        idle = ["idle session"]
+
+        def make_room():
+            if not idle:
+                return False
+            idle.pop()
+            asyncio.get_event_loop().call_soon(asyncio.ensure_future, limiter.release())
+            return True
+
+        async def run():
+            self.assertTrue(await limiter.acquire())
+            self.assertTrue(await limiter.acquire(make_room=make_room))
+            self.assertFalse(await limiter.acquire(make_room=make_room))
+
+        self.loop.run_until_complete(run())
+        self.assertEqual((limiter.active, limiter.evicted, limiter.shed), (1, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import datetime
+import unittest
+import hive_test
+import cerebratesinfo, hlc, mysysteminfo
+from cerebratesinfo import Record, Role, Status
+
+
+PEER_MAC = "0A:0B:0C:0D:0E:0F"
+OBSERVED_MAC = "0A:0B:0C:0D:0E:1F"
+STAMPED_MAC = "0A:0B:0C:0D:0E:2F"
+
+
+class UpdateCerebrateRecordTest(unittest.TestCase):
+    def _make_record(self, version, role=Role.DRONE):
+        record = cerebratesinfo.default_dictionary()
+        record[Record.MAC] = PEER_MAC
+        record[Record.ROLE] = role
+        record[Record.VERSION] = version
+        return record
+
+    def test_record_too_far_ahead_is_rejected(self):
+        cerebratesinfo.update_cerebrate_record(cerebrate_record=self._make_record(version=hlc.now()))
+        physical, logical, _ = hlc.now()
+        ahead = (physical + hlc.MAX_DRIFT + 60 * 1000, 0, PEER_MAC)
+        self.assertFalse(cerebratesinfo.update_cerebrate_record(cerebrate_record=self._make_record(version=ahead, role=Role.OVERMIND)))
+        self.assertNotEqual(cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=PEER_MAC, record_attribute=Record.ROLE), Role.OVERMIND)
+        #a later change made on a correct clock still replaces the record
+        cerebratesinfo.designate_overmind(mac=PEER_MAC)
+        cerebratesinfo.designate_overmind(mac=mysysteminfo.get_mac_address())
+        self.assertEqual(cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=PEER_MAC, record_attribute=Record.ROLE), Role.QUEEN)
+
+    def test_newer_record_within_drift_is_accepted(self):
+        cerebratesinfo.update_cerebrate_record(cerebrate_record=self._make_record(version=hlc.now()))
+        physical, logical, _ = hlc.now()
+        ahead = (physical + hlc.MAX_DRIFT // 2, 0, PEER_MAC)
+        self.assertTrue(cerebratesinfo.update_cerebrate_record(cerebrate_record=self._make_record(version=ahead, role=Role.QUEEN)))
+        self.assertEqual(cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=PEER_MAC, record_attribute=Record.ROLE), Role.QUEEN)
+
+
+class RecordVersionsTest(unittest.TestCase):
+    def test_observations_leave_versions_alone(self):
+        #a record first made by observing a cerebrate has the same version everywhere
+        cerebratesinfo.update_cerebrate_attribute(mac=OBSERVED_MAC, record_attribute=Record.STATUS, attribute_value=Status.UNKNOWN, stamp=False)
+        versions = cerebratesinfo.get_record_versions()
+        self.assertEqual(versions[OBSERVED_MAC], cerebratesinfo.UNVERSIONED)
+        #contact times, status and IP seen locally don't change what is compared with peers
+        cerebratesinfo.update_cerebrate_contact_time(mac=OBSERVED_MAC)
+        cerebratesinfo.update_cerebrate_attribute(mac=OBSERVED_MAC, record_attribute=Record.IP, attribute_value="10.0.0.9", stamp=False)
+        self.assertEqual(cerebratesinfo.get_record_versions(), versions)
+
+    def test_observed_record_gives_way_to_the_real_one(self):
+        cerebratesinfo.update_cerebrate_contact_time(mac=STAMPED_MAC)
+        record = cerebratesinfo.default_dictionary()
+        record[Record.MAC], record[Record.ROLE], record[Record.VERSION] = STAMPED_MAC, Role.QUEEN, hlc.from_datetime(datetime.datetime(2000, 1, 1))
+        self.assertTrue(cerebratesinfo.update_cerebrate_record(cerebrate_record=record))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from unittest import mock
+import hive_test
+import cerebratesinfo, communication, hlc
+from cerebratesinfo import Record
+from communication import Secretary
+
+
+class RebindTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.patches = [
+            mock.patch.object(communication, "event_loop", self.loop),
+            mock.patch.object(Secretary, "terminating", False),
+            mock.patch.object(Secretary, "tcp_server", mock.Mock()),
+            mock.patch.object(Secretary, "udp_server", mock.Mock()),
+            mock.patch.object(Secretary, "multicast_server", None),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        Secretary._rebind_retry = None
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_failed_bind_keeps_the_old_servers_and_retries(self):
+        old_tcp_server, old_udp_server = Secretary.tcp_server, Secretary.udp_server
+
+        async def refuse(*args, **kwargs):
+            raise OSError(99, "Cannot assign requested address")
+
+        with mock.patch.object(communication.asyncio, "start_server", refuse):
+            self.assertFalse(self.loop.run_until_complete(Secretary.rebind()))
+        self.assertIs(Secretary.tcp_server, old_tcp_server)
+        self.assertIs(Secretary.udp_server, old_udp_server)
+        old_tcp_server.close.assert_not_called()
+        old_udp_server.transport.close.assert_not_called()
+        self.assertIsNotNone(Secretary._rebind_retry)
+        Secretary._rebind_retry.cancel()
+
+
+class EncodeTest(unittest.TestCase):
+    PEERS = {"0A:0B:0C:0D:0E:03": "10.0.0.3", "0A:0B:0C:0D:0E:04": "10.0.0.4"}
+
+    def setUp(self):
+        for mac, ip in self.PEERS.items():
+            record = cerebratesinfo.default_dictionary()
+            record[Record.MAC], record[Record.IP], record[Record.VERSION] = mac, ip, hlc.now()
+            cerebratesinfo.update_cerebrate_record(cerebrate_record=record)
+
+    def test_encoding_leaves_the_message_unchanged(self):
+        msg = communication.Message("heartbeat")
+        timestamp = hlc.now()
+        first = Secretary._encode(msg=msg, cerebrate_mac=communication.BROADCAST, timestamp=timestamp)
+        self.assertIsNone(msg.timestamp)
+        self.assertEqual(Secretary._encode(msg=msg, cerebrate_mac=communication.BROADCAST, timestamp=timestamp), first)
+        self.assertEqual(Secretary._decode(data=first).timestamp, timestamp)
+
+    def test_peers_sent_the_same_bytes_share_one_encoding(self):
+        sent = []
+        with mock.patch.object(Secretary, "_send_datagrams", lambda payload, addresses: sent.append(addresses) or True), \
+                mock.patch.object(Secretary, "_announced_compressions", set(self.PEERS)):
+            self.assertTrue(Secretary.send_messages(cerebrate_macs=list(self.PEERS), msg=communication.Message("heartbeat")))
+        self.assertEqual(sent, [[(ip, communication.UDP_PORT) for ip in self.PEERS.values()]])
+
+
+class MulticastAckTest(unittest.TestCase):
+    MEMBERS = {"0A:0B:0C:0D:0E:01": "10.0.0.1", "0A:0B:0C:0D:0E:02": "10.0.0.2"}
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        for mac, ip in self.MEMBERS.items():
+            record = cerebratesinfo.default_dictionary()
+            record[Record.MAC], record[Record.IP], record[Record.LOCATION], record[Record.VERSION] = mac, ip, "kitchen", hlc.now()
+            cerebratesinfo.update_cerebrate_record(cerebrate_record=record)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_members_that_do_not_acknowledge_are_returned(self):
+        protocol = Secretary.UDPServerProtocol()
+
+        def send_datagrams(payload, addresses):
+            msg = Secretary._decode(data=payload)
+            ack = bytes((communication.DATAGRAM_ACK_MARKER,)) + msg.correlation_id.to_bytes(length=4, byteorder='big')
+            self.loop.call_soon(protocol.datagram_received, ack, ("10.0.0.1", communication.UDP_PORT))
+            return True
+
+        msg = communication.Message("display_message", data="dinner")
+        with mock.patch.object(Secretary, "terminating", False), mock.patch.object(Secretary, "_send_datagrams", send_datagrams), \
+                mock.patch.object(communication, "MULTICAST_ACK_TIMEOUT", 0.05):
+            unacknowledged = self.loop.run_until_complete(Secretary.multicast_acked_message(msg=msg, record_attribute=Record.LOCATION, attribute_value="kitchen", cerebrate_macs=list(self.MEMBERS)))
+        self.assertEqual(unacknowledged, ["0A:0B:0C:0D:0E:02"])
+        self.assertEqual(Secretary._multicast_acks, {})
+
+    def test_all_members_are_returned_if_the_multicast_cannot_be_sent(self):
+        msg = communication.Message("display_message", data="dinner")
+        with mock.patch.object(Secretary, "_send_datagrams", return_value=False):
+            unacknowledged = self.loop.run_until_complete(Secretary.multicast_acked_message(msg=msg, record_attribute=Record.LOCATION, attribute_value="kitchen", cerebrate_macs=list(self.MEMBERS)))
+        self.assertEqual(unacknowledged, list(self.MEMBERS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+from unittest import mock
+import hive_test
+import cerebrate_config as cc
+import communication, framing, wire_codec
+from connection_pool import PooledConnection
+
+
+PEER_MAC = "0A:0B:0C:0D:0E:0F"
+
+
+class IsHealthyTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _make_connection(self):
+        writer = mock.Mock()
+        writer.transport.is_closing.return_value = False
+        return PooledConnection(mac=PEER_MAC, ip="127.0.0.1", reader=asyncio.StreamReader(), writer=writer)
+
+    def test_open_connection_is_healthy(self):
+        connection = self._make_connection()
+        self.assertTrue(connection.is_healthy())
+        self.assertTrue(self.loop.run_until_complete(connection.is_reusable()))
+        #the check leaves nothing behind to read
+        connection.reader.feed_data(b"reply")
+        self.assertEqual(self.loop.run_until_complete(connection.reader.read(5)), b"reply")
+
+    def test_unread_close_is_not_healthy(self):
+        connection = self._make_connection()
+        payload = wire_codec.encode(communication.Message(cc.CLOSE_CONNECTION, data=cc.FINISHED))
+        connection.reader.feed_data(framing.make_header(payload_size=len(payload)) + payload)
+        connection.reader.feed_eof()
+        self.assertFalse(connection.reader.at_eof())
+        self.assertFalse(self.loop.run_until_complete(connection.is_reusable()))
+
+    def test_closed_connection_is_not_healthy(self):
+        connection = self._make_connection()
+        connection.reader.feed_eof()
+        self.assertFalse(connection.is_healthy())
+        self.assertFalse(self.loop.run_until_complete(connection.is_reusable()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import datetime
+import unittest
+from unittest import mock
+import hive_test
+import cerebratesinfo, election, heartbeat, hlc, mysysteminfo
+from cerebratesinfo import Record
+
+
+RECENT_MAC = "FF:0B:0C:0D:0E:20"
+STALE_MAC = "FF:0B:0C:0D:0E:21"
+UNHEARD_MAC = "FF:0B:0C:0D:0E:22"
+
+
+class ElectionTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.now = datetime.datetime.now()
+        for mac, last_contact in ((RECENT_MAC, self.now), (STALE_MAC, self.now - datetime.timedelta(seconds=heartbeat.PEER_HORIZON + 1)), (UNHEARD_MAC, None)):
+            record = cerebratesinfo.default_dictionary()
+            record[Record.MAC], record[Record.VERSION] = mac, hlc.now()
+            if last_contact:
+                record[Record.LASTCONTACT] = last_contact
+            cerebratesinfo.update_cerebrate_record(cerebrate_record=record)
+        self.config = {}
+        self.patches = [
+            mock.patch.object(heartbeat, "_arrivals", {}),
+            mock.patch.object(election, "current_term", 0),
+            mock.patch.object(election, "_leader_event", None),
+            mock.patch.object(election.cc, "get_config", lambda config_key: self.config.get(config_key, False)),
+            mock.patch.object(election.cc, "set_config", self.config.__setitem__),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _candidates(self):
+        return set(election._get_candidates(now=self.now)) & {RECENT_MAC, STALE_MAC, UNHEARD_MAC}
+
+    def test_only_recently_contacted_cerebrates_are_candidates(self):
+        self.assertEqual(self._candidates(), {RECENT_MAC})
+
+    def test_suspected_cerebrates_are_not_candidates(self):
+        with mock.patch.object(heartbeat, "is_suspected", lambda cerebrate_mac: cerebrate_mac == RECENT_MAC):
+            self.assertEqual(self._candidates(), set())
+
+    def test_unanswered_election_is_won(self):
+        probed = []
+        async def probe(cerebrate_mac, msg):
+            probed.append(cerebrate_mac)
+            return False
+        with mock.patch.object(election, "_probe", probe), mock.patch.object(election, "claim_leadership") as claim_leadership:
+            self.assertEqual(self.loop.run_until_complete(election.hold_election()), mysysteminfo.get_mac_address())
+        self.assertNotIn(STALE_MAC, probed)
+        self.assertNotIn(UNHEARD_MAC, probed)
+        claim_leadership.assert_called_once_with()
+        self.assertEqual(election.current_term, 1)
+
+    def test_term_survives_a_restart(self):
+        election.note_term(term=5)
+        self.assertEqual(self.config[election.TERM_CONFIG_KEY], 5)
+        election.current_term = 0
+        election.load_term()
+        self.assertEqual(election.current_term, 5)
+        #claims from before the restart are still refused
+        self.assertFalse(election.accept_leader(cerebrate_mac=RECENT_MAC, term=4))
+        self.assertTrue(election.accept_leader(cerebrate_mac=RECENT_MAC, term=5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+import hive_test
+import communication, framing
+from communication import Secretary
+
+
+PEER_MAC = "0A:0B:0C:0D:0E:0F"
+
+
+class FrameTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _make_reader(self, data, eof:bool=True):
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        if eof:
+            reader.feed_eof()
+        return reader
+
+    def test_frames_round_trip(self):
+        writer = mock.Mock()
+        written = []
+        writer.writelines.side_effect = lambda items: written.extend(items)
+
+        async def drain():
+            pass
+
+        writer.drain = drain
+        for payload in (b"", b"frame", bytes(100000)):
+            self.loop.run_until_complete(framing.write_frame(writer=writer, payload=payload))
+        reader = self._make_reader(b''.join(written))
+        for payload in (b"", b"frame", bytes(100000)):
+            self.assertEqual(self.loop.run_until_complete(framing.read_frame(reader=reader)), payload)
+
+    def test_frame_over_the_limit_is_refused(self):
+        reader = self._make_reader(framing.make_header(payload_size=1001) + bytes(1001))
+        with self.assertRaises(framing.FrameTooLarge):
+            self.loop.run_until_complete(framing.read_frame(reader=reader, max_frame_size=1000))
+
+    def test_truncated_frame_raises(self):
+        reader = self._make_reader(framing.make_header(payload_size=10) + bytes(5))
+        with self.assertRaises(asyncio.IncompleteReadError):
+            self.loop.run_until_complete(framing.read_frame(reader=reader))
+
+    def test_large_frames_are_decoded_off_the_loop(self):
+        threads = []
+
+        def decode(payload):
+            threads.append(threading.current_thread())
+            return len(payload)
+
+        self.assertEqual(self.loop.run_until_complete(framing.decode_frame(payload=bytes(10), decode=decode, off_loop_size=100)), 10)
+        self.assertEqual(self.loop.run_until_complete(framing.decode_frame(payload=bytes(100), decode=decode, off_loop_size=100)), 100)
+        self.assertIs(threads[0], threading.main_thread())
+        self.assertIsNot(threads[1], threading.main_thread())
+
+
+class ReadMessageTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_sender_is_noted_on_the_loop_for_frames_decoded_off_it(self):
+        msg = communication.Message("display_message", data="x" * (framing.OFF_LOOP_DECODE_SIZE + 1))
+        msg.sender_mac = PEER_MAC
+        payload = Secretary._encode(msg=msg, cerebrate_mac=PEER_MAC)
+        reader = asyncio.StreamReader()
+        reader.feed_data(framing.make_header(payload_size=len(payload)) + payload)
+        threads = {}
+        decode_payload, note_sender = Secretary._decode_payload, Secretary._note_sender
+
+        def record(name, function):
+            def recorded(*args, **kwargs):
+                threads[name] = threading.current_thread()
+                return function(*args, **kwargs)
+            return recorded
+
+        with mock.patch.object(communication, "event_loop", self.loop), \
+                mock.patch.object(Secretary, "_decode_payload", record("decode", decode_payload)), \
+                mock.patch.object(Secretary, "_note_sender", record("note", note_sender)), \
+                mock.patch.object(Secretary, "_wire_versions", {}):
+            decoded = self.loop.run_until_complete(Secretary._read_message(reader=reader))
+            self.assertEqual(Secretary._wire_versions, {PEER_MAC: communication.wire_codec.WIRE_VERSION})
+        self.assertEqual(decoded.data, msg.data)
+        self.assertIsNot(threads["decode"], threading.main_thread())
+        self.assertIs(threads["note"], threading.main_thread())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import asyncio
+import unittest
+from unittest import mock
+import hive_test
+import cerebratesinfo, communication, gossip, hlc, mysysteminfo, remote_command
+from cerebratesinfo import Record
+
+
+PEER_MAC = "0A:0B:0C:0D:0E:0F"
+
+
+class GossipSettingTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _update_records(self):
+        record = cerebratesinfo.default_dictionary()
+        record[Record.MAC], record[Record.NAME], record[Record.VERSION] = PEER_MAC, "peer", hlc.now()
+        queued = []
+        with mock.patch.object(cerebratesinfo, "get_overmind_mac", mysysteminfo.get_mac_address), \
+                mock.patch.object(communication.Secretary, "queue_message", lambda msg, cerebrate_mac=communication.BROADCAST: queued.append(msg)):
+            self.loop.run_until_complete(remote_command.update_records(communication.Message("update_records", data=[record])))
+        return queued
+
+    def test_overmind_propagates_by_default(self):
+        with mock.patch.object(gossip, "_enabled", None), mock.patch.object(gossip.cc, "get_config", return_value=False):
+            self.assertFalse(gossip.is_enabled())
+            self.assertEqual(len(self._update_records()), 1)
+
+    def test_overmind_leaves_propagation_to_gossip_when_set_to(self):
+        with mock.patch.object(gossip, "_enabled", None), mock.patch.object(gossip.cc, "get_config", return_value=True):
+            self.assertTrue(gossip.is_enabled())
+            self.assertEqual(self._update_records(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
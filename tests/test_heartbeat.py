@@ -0,0 +1,52 @@
+import unittest
+from unittest import mock
+import hive_test
+import cerebratesinfo, heartbeat, hlc
+from cerebratesinfo import Record, Status
+
+
+OVERMIND_MAC = "0A:0B:0C:0D:0E:10"
+HEARD_MAC = "0A:0B:0C:0D:0E:11"
+AWAKE_MAC = "0A:0B:0C:0D:0E:12"
+ASLEEP_MAC = "0A:0B:0C:0D:0E:13"
+
+
+class GetPeersTest(unittest.TestCase):
+    def setUp(self):
+        for mac, status in ((OVERMIND_MAC, Status.UNKNOWN), (HEARD_MAC, Status.UNKNOWN), (AWAKE_MAC, Status.AWAKE), (ASLEEP_MAC, Status.ASLEEP)):
+            record = cerebratesinfo.default_dictionary()
+            record[Record.MAC], record[Record.VERSION] = mac, hlc.now()
+            cerebratesinfo.update_cerebrate_record(cerebrate_record=record)
+            cerebratesinfo.update_cerebrate_attribute(mac=mac, record_attribute=Record.STATUS, attribute_value=status, stamp=False)
+        self.patches = [
+            mock.patch.object(heartbeat, "_arrivals", {}),
+            mock.patch.object(heartbeat, "_suspected", set()),
+            mock.patch.object(heartbeat, "_unanswered", {}),
+            mock.patch.object(cerebratesinfo, "get_overmind_mac", return_value=OVERMIND_MAC),
+        ]
+        for patch in self.patches:
+            patch.start()
+        heartbeat.heard_from(cerebrate_mac=HEARD_MAC, now=1000)
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+
+    def _peers(self, now):
+        return set(heartbeat.get_peers(now=now)) & {OVERMIND_MAC, HEARD_MAC, AWAKE_MAC, ASLEEP_MAC}
+
+    def test_only_live_peers_are_beaten(self):
+        self.assertEqual(self._peers(now=1001), {OVERMIND_MAC, HEARD_MAC, AWAKE_MAC})
+
+    def test_peers_silent_past_the_horizon_are_dropped(self):
+        self.assertEqual(self._peers(now=1001), {OVERMIND_MAC, HEARD_MAC, AWAKE_MAC})
+        self.assertEqual(heartbeat.check_peers(now=1001 + heartbeat.PEER_HORIZON), [HEARD_MAC])
+        self.assertEqual(self._peers(now=1001 + heartbeat.PEER_HORIZON), {OVERMIND_MAC})
+        self.assertEqual(cerebratesinfo.get_cerebrate_attribute(cerebrate_mac=AWAKE_MAC, record_attribute=Record.STATUS), Status.UNKNOWN)
+        #once heard from again they are beaten again
+        heartbeat.heard_from(cerebrate_mac=AWAKE_MAC, now=2000)
+        self.assertEqual(self._peers(now=2001), {OVERMIND_MAC, AWAKE_MAC})
+
+
+if __name__ == '__main__':
+    unittest.main()
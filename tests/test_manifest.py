@@ -0,0 +1,56 @@
+import random
+import unittest
+import hive_test
+import manifest
+
+
+BLOCK_SIZE = 64
+
+
+class DeltaTest(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(7)
+        self.base = bytes(generator.getrandbits(8) for _ in range(BLOCK_SIZE * 20))
+
+    def _round_trip(self, data):
+        delta = manifest.make_delta(data, manifest.make_signature(self.base, block_size=BLOCK_SIZE), block_size=BLOCK_SIZE)
+        self.assertEqual(manifest.apply_delta(base=self.base, delta=delta, block_size=BLOCK_SIZE), data)
+        return delta
+
+    def test_unchanged_data_is_all_block_references(self):
+        delta = self._round_trip(self.base)
+        self.assertEqual(delta, list(range(20)))
+
+    def test_shifted_data_reuses_blocks(self):
+        data = self.base[:BLOCK_SIZE * 5] + b"inserted" + self.base[BLOCK_SIZE * 5:] + b"appended"
+        delta = self._round_trip(data)
+        self.assertEqual(sum(len(item) for item in delta if isinstance(item, bytes)), len(b"inserted") + len(b"appended"))
+
+    def test_changed_block_is_sent_as_literal(self):
+        data = bytearray(self.base)
+        data[BLOCK_SIZE * 3] ^= 0xFF
+        delta = self._round_trip(bytes(data))
+        self.assertNotIn(3, delta)
+        self.assertEqual(sum(len(item) for item in delta if isinstance(item, bytes)), BLOCK_SIZE)
+
+    def test_unrelated_and_short_data(self):
+        self._round_trip(b"")
+        self._round_trip(b"short")
+        self._round_trip(bytes(reversed(self.base)))
+
+
+class ManifestTest(unittest.TestCase):
+    def test_diff_lists_missing_and_changed_files(self):
+        mine = {"a.py": "01", "b.py": "02", "c.py": "03"}
+        theirs = {"a.py": "01", "b.py": "ff", "d.py": "04"}
+        self.assertEqual(manifest.diff_manifests(mine=mine, theirs=theirs), ["b.py", "c.py"])
+
+    def test_digest_is_independent_of_order(self):
+        forward = {"a.py": "01", "b.py": "02"}
+        backward = {"b.py": "02", "a.py": "01"}
+        self.assertEqual(manifest.get_manifest_digest(forward), manifest.get_manifest_digest(backward))
+        self.assertNotEqual(manifest.get_manifest_digest(forward), manifest.get_manifest_digest({"a.py": "01", "b.py": "03"}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import unittest
+from unittest import mock
+import hive_test
+import merkle
+
+
+PEER_MAC = "0A:0B:0C:0D:0E:0F"
+STORE = merkle.SECTION + "test"
+
+
+class MerkleTreeTest(unittest.TestCase):
+    def test_equal_versions_give_equal_roots(self):
+        versions = {str(key): key for key in range(50)}
+        self.assertEqual(merkle.MerkleTree(versions=versions).get_hash(), merkle.MerkleTree(versions=dict(reversed(list(versions.items())))).get_hash())
+        changed = dict(versions, **{"7": 100})
+        self.assertNotEqual(merkle.MerkleTree(versions=versions).get_hash(), merkle.MerkleTree(versions=changed).get_hash())
+
+    def test_only_differing_bucket_differs(self):
+        versions = {str(key): key for key in range(50)}
+        tree = merkle.MerkleTree(versions=versions)
+        changed = merkle.MerkleTree(versions=dict(versions, **{"7": 100}))
+        differing = [prefix for prefix in tree.hashes if len(prefix) == tree.depth and tree.get_hash(prefix) != changed.get_hash(prefix)]
+        self.assertEqual(len(differing), 1)
+        self.assertIn("7", tree.get_bucket(prefix=differing[0]))
+
+
+class SyncStoreTest(unittest.TestCase):
+    '''Syncs two in-memory stores of key: (version, value), with the peer's answers made against the remote one.
+    '''
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.local = {str(key): (1, key) for key in range(100)}
+        self.remote = dict(self.local)
+        self.current = self.local
+        self.requests = []
+
+        async def ask(cerebrate_mac, request):
+            self.requests.append(request)
+            self.current = self.remote
+            try:
+                return merkle.answer(request=request)
+            finally:
+                self.current = self.local
+
+        def apply_items(store, items):
+            for key, (version, value) in items.items():
+                if key not in self.current or self.current[key][0] < version:
+                    self.current[key] = (version, value)
+
+        self.patches = [
+            mock.patch.object(merkle, "_ask", ask),
+            mock.patch.object(merkle, "get_versions", lambda store: {key: item[0] for key, item in self.current.items()}),
+            mock.patch.object(merkle, "get_items", lambda store, keys: {key: self.current[key] for key in keys}),
+            mock.patch.object(merkle, "apply_items", apply_items),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _sync(self):
+        self.requests.clear()
+        return self.loop.run_until_complete(merkle.sync_store(cerebrate_mac=PEER_MAC, store=STORE))
+
+    def test_stores_in_sync_exchange_only_roots(self):
+        self.assertEqual(self._sync(), (0, 0))
+        self.assertEqual(len(self.requests), 1)
+
+    def test_differences_are_exchanged_both_ways(self):
+        self.remote["3"] = (2, "newer remotely")
+        self.local["42"] = (2, "newer locally")
+        self.local["new"] = (1, "only local")
+        self.assertEqual(self._sync(), (1, 2))
+        self.assertEqual(self.local, self.remote)
+        self.assertEqual(self.local["3"], (2, "newer remotely"))
+        #and once synced a single exchange confirms it
+        self.assertEqual(self._sync(), (0, 0))
+        self.assertEqual(len(self.requests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import asyncio
+import unittest
+from unittest import mock
+import hive_test
+import mysysteminfo
+
+
+class WatchIpAddressTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_unsettled_change_is_retried_on_the_next_poll(self):
+        changes = []
+        done = asyncio.Event()
+        async def on_change(previous, ip):
+            changes.append((previous, ip))
+            if len(changes) == 2:
+                done.set()
+            return len(changes) > 1
+        refreshes = iter(["10.0.0.1"] + [None] * 10)
+        with mock.patch.object(mysysteminfo, "refresh_ip_address", lambda: next(refreshes)), \
+                mock.patch.object(mysysteminfo, "get_ip_address", return_value="10.0.0.2"):
+            watch = asyncio.ensure_future(mysysteminfo.watch_ip_address(on_change=on_change, interval=0))
+            self.loop.run_until_complete(asyncio.wait_for(done.wait(), timeout=1))
+            self.loop.run_until_complete(asyncio.sleep(0.01))
+            watch.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                self.loop.run_until_complete(watch)
+        #tried again once, and not after it was settled
+        self.assertEqual(changes, [("10.0.0.1", "10.0.0.2")] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
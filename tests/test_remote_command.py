@@ -0,0 +1,89 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+import hive_test
+import cerebrate_config as cc
+import communication, manifest, remote_command
+
+
+PEER_MAC = "0A:0B:0C:0D:0E:0F"
+OTHER_MAC = "0F:0E:0D:0C:0B:0A"
+LOCAL_MANIFEST = {"cerebrate.py": "00", "resources/resource_handler.py": "01"}
+
+
+class SendFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.transfer_files = mock.Mock(return_value=True)
+
+        async def get_manifest(loop=None):
+            return dict(LOCAL_MANIFEST)
+
+        async def transfer_files(cerebrate_mac, file_names):
+            return self.transfer_files(cerebrate_mac=cerebrate_mac, file_names=file_names)
+
+        self.patches = [
+            mock.patch.object(manifest, "get_manifest", get_manifest),
+            mock.patch.object(communication.Secretary, "transfer_files", transfer_files),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _send_files(self, files, **data):
+        msg = communication.Message("send_files", data=dict(data, manifest=manifest.get_manifest_digest(manifest=LOCAL_MANIFEST), files=files))
+        msg.sender_mac = PEER_MAC
+        return self.loop.run_until_complete(remote_command.send_files(msg))[1]
+
+    def test_files_are_sent_to_the_sender_only(self):
+        self.assertTrue(self._send_files(files=["cerebrate.py"], cerebrate=OTHER_MAC))
+        self.transfer_files.assert_called_once_with(cerebrate_mac=PEER_MAC, file_names=[manifest.to_file_path("cerebrate.py")])
+
+    def test_files_outside_the_manifest_are_refused(self):
+        self.assertFalse(self._send_files(files=["cerebrate.py", "../../etc/passwd"]))
+        self.transfer_files.assert_not_called()
+
+
+class ApplyDeltasTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.directory = tempfile.mkdtemp(dir=hive_test.TEST_DIRECTORY)
+        os.mkdir(os.path.join(self.directory, "backup"))
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _write(self, relative_path, data):
+        with open(os.path.join(self.directory, relative_path), 'wb') as open_file:
+            open_file.write(data)
+
+    def _read(self, relative_path):
+        with open(os.path.join(self.directory, relative_path), 'rb') as open_file:
+            return open_file.read()
+
+    def test_failed_file_is_not_restored_from_an_older_backup(self):
+        self._write("cerebrate.py", b"current")
+        self._write(os.path.join("backup", "cerebrate.py"), b"left by an earlier update")
+
+        def apply_delta(base, delta):
+            raise ValueError("delta does not fit the base")
+
+        msg = communication.Message("apply_deltas", data={"cerebrate.py": {"delta": b"", cc.HASH: "00"}})
+        with mock.patch.object(manifest, "to_file_path", lambda relative_path: os.path.join(self.directory, relative_path)), \
+                mock.patch.object(manifest, "apply_delta", apply_delta):
+            self.assertEqual(self.loop.run_until_complete(remote_command.apply_deltas(msg))[1], ["cerebrate.py"])
+        self.assertEqual(self._read("cerebrate.py"), b"current")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from unittest import mock
+import hive_test
+import cerebrate_config as cc
+import communication, remote_command, update_orchestrator
+
+
+PEER_MAC = "0A:0B:0C:0D:0E:0F"
+
+
+class HaltedRolloutTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.sent = []
+
+        async def communicate_message(cerebrate_mac, msg):
+            self.sent.append((cerebrate_mac, msg.header[0], msg.data))
+            return cc.SUCCESS
+
+        self.patches = [
+            mock.patch.object(communication.Secretary, "communicate_message", communicate_message),
+            mock.patch.object(update_orchestrator, "_halted", True),
+            mock.patch.object(update_orchestrator, "_failed", [PEER_MAC]),
+            mock.patch.object(update_orchestrator, "_refused", []),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _run(self, function):
+        async def run():
+            result = function()
+            await asyncio.sleep(0)
+            return result
+        return self.loop.run_until_complete(run())
+
+    def test_halted_rollout_tells_the_requester(self):
+        self.assertFalse(self._run(lambda: update_orchestrator.schedule_update(cerebrate_mac=PEER_MAC)))
+        self.assertEqual(self.sent, [(PEER_MAC, "update_refused", "rollout halted")])
+        self.assertEqual(update_orchestrator.get_rollout_status()["refused"], [PEER_MAC])
+
+    def test_resumed_rollout_asks_the_refused_to_check_their_version(self):
+        self._run(lambda: update_orchestrator.schedule_update(cerebrate_mac=PEER_MAC))
+        del self.sent[:]
+        msg = communication.Message("rollout", data={"resume": True})
+        _, status = self.loop.run_until_complete(remote_command.rollout(msg))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual((status["halted"], status["failed"], status["refused"]), (False, [], []))
+        self.assertEqual(self.sent, [(PEER_MAC, "check_version", {"version": cc.my_version})])
+
+    def test_refused_requester_stops_waiting(self):
+        with mock.patch.object(cc, "update_in_progress", True):
+            self.loop.run_until_complete(remote_command.update_refused(communication.Message("update_refused", data="rollout halted")))
+            self.assertFalse(cc.update_in_progress)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import datetime
+import unittest
+from unittest import mock
+import hive_test
+import cerebrate_config as cc
+import cerebratesinfo, communication, wire_codec
+from cerebratesinfo import Record, Role, Status
+
+
+class RoundTripTest(unittest.TestCase):
+    def _make_message(self):
+        record = cerebratesinfo.default_dictionary()
+        record[Record.MAC] = "0A:0B:0C:0D:0E:0F"
+        record[Record.ROLE] = Role.DRONE
+        record[Record.STATUS] = Status.AWAKE
+        record[Record.LASTCONTACT] = datetime.datetime(2026, 10, 18, 12, 30, 15, 250)
+        record[Record.TAGS] = ["speaker"]
+        msg = communication.Message(cc.REMOTE_COMMAND, "update_records", "wire:3", data={
+            "records": [record], "chunk": b"\x00\xff" * 100, "numbers": (0, -1, 1 << 70, -(1 << 70), 0.5),
+            "text": "caf\u00e9", "flags": [None, True, False], cc.FileLocation.HIVE: {"nested": ["console"]}})
+        msg.sender_mac, msg.sender_ip = "0A:0B:0C:0D:0E:0F", "192.168.0.2"
+        msg.correlation_id, msg.timestamp = 7, (1792310400000, 3, "0A:0B:0C:0D:0E:0F")
+        return msg
+
+    def _assert_round_trips(self, schema, version):
+        msg = self._make_message()
+        decoded, decoded_version = wire_codec.decode(wire_codec.encode(msg, version=version, schema=schema))
+        self.assertEqual(decoded_version, version)
+        for field in ("header", "data", "sender_mac", "sender_ip", "correlation_id", "timestamp"):
+            self.assertEqual(getattr(decoded, field), getattr(msg, field), field)
+        record = decoded.data["records"][0]
+        self.assertIs(type(record), type(msg.data["records"][0]))
+        self.assertIs(record[Record.ROLE], Role.DRONE)
+        self.assertEqual(record[Record.NAME], {})  # still a default dictionary
+
+    def test_schema_encoding_round_trips(self):
+        for version in range(1, wire_codec.WIRE_VERSION + 1):
+            self._assert_round_trips(schema=True, version=version)
+
+    def test_pickled_encoding_round_trips(self):
+        for version in range(1, wire_codec.WIRE_VERSION + 1):
+            self._assert_round_trips(schema=False, version=version)
+
+    def test_compressed_frame_round_trips(self):
+        for schema in (True, False):
+            frame = wire_codec.encode(self._make_message(), schema=schema)
+            compressed = wire_codec.compress(frame, compression=wire_codec.ZLIB_DICTIONARY)
+            self.assertLess(len(compressed), len(frame))
+            self.assertEqual(wire_codec.decode(compressed)[0].data, self._make_message().data)
+
+    def test_pickle_is_the_default(self):
+        msg = self._make_message()
+        self.assertEqual(wire_codec.encode(msg), wire_codec.encode(msg, schema=False))
+        with mock.patch.object(wire_codec, "SCHEMA_ENCODING", True):
+            self.assertEqual(wire_codec.encode(msg), wire_codec.encode(msg, schema=True))
+
+
+class RecordTest(unittest.TestCase):
+    def _make_record(self):
+        record = cerebratesinfo.default_dictionary()
+        record[Record.MAC] = "0A:0B:0C:0D:0E:0F"
+        record[Record.ROLE] = Role.DRONE
+        record[Record.VERSION] = (1000, 0, "0A:0B:0C:0D:0E:0F")
+        return record
+
+    def test_record_member_unknown_to_the_receiver_is_carried_through(self):
+        frame = wire_codec.encode([self._make_record()], schema=True)
+        #a receiver from before Record.VERSION was added
+        older_members = {value: member for value, member in wire_codec._RECORD_MEMBERS.items() if member is not Record.VERSION}
+        with mock.patch.object(wire_codec, "_RECORD_MEMBERS", older_members):
+            (record,), _ = wire_codec.decode(frame)
+            self.assertEqual(record[Record.MAC], "0A:0B:0C:0D:0E:0F")
+            self.assertEqual(record[Record.ROLE], Role.DRONE)
+            self.assertNotIn(Record.VERSION, record)
+            self.assertIn(wire_codec.UnknownRecordKey(Record.VERSION.value), record)
+            forwarded = wire_codec.encode([record], schema=True)
+        #passed on to a receiver that knows the member, it arrives as it was sent
+        (record,), _ = wire_codec.decode(forwarded)
+        self.assertEqual(record[Record.VERSION], (1000, 0, "0A:0B:0C:0D:0E:0F"))
+
+
+class EnumMemberTest(unittest.TestCase):
+    def _make_record(self):
+        record = cerebratesinfo.default_dictionary()
+        record[Record.MAC] = "0A:0B:0C:0D:0E:0F"
+        record[Record.ROLE] = Role.QUEEN
+        record[Record.STATUS] = Status.ASLEEP
+        return record
+
+    def _decode_without(self, frame, member):
+        #decodes as a receiver from before the member was added
+        enum_id = wire_codec._ENUM_IDS[type(member)]
+        older_members = list(wire_codec._ENUM_MEMBERS)
+        older_members[enum_id] = {value: known for value, known in older_members[enum_id].items() if known is not member}
+        with mock.patch.object(wire_codec, "_ENUM_MEMBERS", older_members):
+            return wire_codec.decode(frame)[0]
+
+    def test_enum_member_unknown_to_the_receiver_is_carried_through(self):
+        for schema in (True, False):
+            frame = wire_codec.encode([self._make_record()], schema=schema)
+            (record,) = self._decode_without(frame, member=Role.QUEEN)
+            self.assertEqual(record[Record.ROLE], wire_codec.UnknownEnumMember(wire_codec._ENUM_IDS[Role], Role.QUEEN.value))
+            self.assertIs(record[Record.STATUS], Status.ASLEEP)
+            #passed on to a receiver that knows the member, it arrives as it was sent
+            (record,), _ = wire_codec.decode(wire_codec.encode([record], schema=schema))
+            self.assertIs(record[Record.ROLE], Role.QUEEN)
+
+    def test_record_member_unknown_to_the_receiver_is_carried_through_pickled(self):
+        record = self._make_record()
+        record[Record.VERSION] = (1000, 0, "0A:0B:0C:0D:0E:0F")
+        (record,) = self._decode_without(wire_codec.encode([record], schema=False), member=Record.VERSION)
+        self.assertIn(wire_codec.UnknownRecordKey(Record.VERSION.value), record)
+        (record,), _ = wire_codec.decode(wire_codec.encode([record], schema=False))
+        self.assertEqual(record[Record.VERSION], (1000, 0, "0A:0B:0C:0D:0E:0F"))
+
+    def test_member_of_an_enum_unknown_to_the_receiver_is_carried_through(self):
+        frame = wire_codec.encode([wire_codec.UnknownEnumMember(len(wire_codec._ENUMS), 4)], schema=True)
+        (member,), _ = wire_codec.decode(frame)
+        self.assertEqual(member, wire_codec.UnknownEnumMember(len(wire_codec._ENUMS), 4))
+        self.assertEqual(wire_codec.encode([member], schema=True), frame)
+
+
+class DecompressionTest(unittest.TestCase):
+    def test_frame_expanding_past_the_limit_is_refused(self):
+        compressions = [wire_codec.ZLIB, wire_codec.ZLIB_DICTIONARY] + ([wire_codec.LZMA] if wire_codec.lzma else [])
+        for compression in compressions:
+            frame = wire_codec.compress(wire_codec.encode(bytes(100000)), compression=compression)
+            self.assertEqual(wire_codec.decode(frame)[0], bytes(100000))
+            with mock.patch.object(wire_codec, "MAX_DECOMPRESSED_SIZE", 10000):
+                with self.assertRaises(wire_codec.WireError):
+                    wire_codec.decode(frame)
+
+    def test_truncated_frame_is_refused(self):
+        frame = wire_codec.compress(wire_codec.encode(bytes(100000)), compression=wire_codec.ZLIB)
+        with self.assertRaises(wire_codec.WireError):
+            wire_codec.decode(frame[:len(frame) // 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
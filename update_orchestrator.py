@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import os
+import cerebrate_config as cc
+from utilities import dprint
+import cerebratesinfo, communication, manifest, requirements
+
+
+# The Overmind updates out of date cerebrates a wave at a time, so it isn't sending to (and restarting) all of them at once.
+UPDATE_WAVE_SIZE = 3
+UPDATE_GATHER_DELAY = 2  # seconds to collect out of date cerebrates before the first wave goes out
+UPDATE_ACKNOWLEDGE_TIMEOUT = 120  # seconds an updated cerebrate has to restart and acknowledge with the new version
+DELTA_TIMEOUT = 60
+SOURCE_TRANSFER_TIMEOUT = 300  # seconds a source cerebrate has to transfer its share of the changed files
+
+_pending = []
+_updated = []
+_failed = []
+_refused = []
+_awaiting_acknowledgement = {}
+_rollout = None
+_halted = False
+
+
+def schedule_update(cerebrate_mac, wave_size:int=UPDATE_WAVE_SIZE):
+    '''Queues the given cerebrate to be updated in the next wave, starting a rollout if none is running.
+    Returns False if the rollout has been halted by a failed wave.
+    '''
+    global _rollout
+    if _halted:
+        dprint("rollout halted, not updating ", cerebrate_mac)
+        _refuse(cerebrate_mac=cerebrate_mac)
+        return False
+    if cerebrate_mac not in _pending and cerebrate_mac not in _awaiting_acknowledgement:
+        _pending.append(cerebrate_mac)
+    if not _rollout or _rollout.done():
+        _rollout = asyncio.ensure_future(roll_out(wave_size=wave_size))
+    return True
+
+def acknowledged(cerebrate_mac, version, manifest_digest=None):
+    '''Notes that the given cerebrate has acknowledged with the given version and manifest digest.
+    Completes its update if it was restarted by the current wave.
+    '''
+    if manifest_digest:
+        cerebratesinfo.update_cerebrate_attribute(mac=cerebrate_mac, record_attribute=cerebratesinfo.Record.MANIFEST, attribute_value=manifest_digest)
+    future = _awaiting_acknowledgement.get(cerebrate_mac, None)
+    if future and not future.done():
+        future.set_result(version is not None and version >= cc.my_version)
+
+def _refuse(cerebrate_mac):
+    '''Tells the cerebrate it won't be updated while the rollout is halted, so it stops waiting for the update.
+    It is asked to check its version again when the rollout is resumed.
+    '''
+    if cerebrate_mac not in _refused:
+        _refused.append(cerebrate_mac)
+    asyncio.ensure_future(communication.Secretary.communicate_message(cerebrate_mac=cerebrate_mac, msg=communication.Message("update_refused", data="rollout halted")))
+
+def resume_rollout():
+    '''Clears a halted rollout so cerebrates can be scheduled for updates again.
+    The cerebrates refused while it was halted are asked to check their version, so they request the update again.
+    Returns the macs of those cerebrates.
+    '''
+    global _halted
+    _halted = False
+    _failed.clear()
+    refused = list(_refused)
+    _refused.clear()
+    for cerebrate_mac in refused:
+        asyncio.ensure_future(communication.Secretary.communicate_message(cerebrate_mac=cerebrate_mac, msg=communication.Message("check_version", data={"version": cc.my_version})))
+    return refused
+
+def get_rollout_status():
+    '''Returns a dict with the pending, updated, failed and refused cerebrate macs, and whether the rollout is halted.
+    '''
+    return {"pending": list(_pending), "updated": list(_updated), "failed": list(_failed), "refused": list(_refused), "halted": _halted}
+
+async def send_changes(cerebrate_mac, local_manifest:dict=None, remote:dict=None):
+    '''Sends the cerebrate the source files that differ from its manifest.
+    remote is the cerebrate's reply to "send_manifest", which is requested if not given.
+    Files the cerebrate sent a signature for are sent as block deltas, the rest are transferred whole.
+    Returns True if every changed file was sent successfully.
+    '''
+    loop = asyncio.get_event_loop()
+    if local_manifest is None:
+        local_manifest = await manifest.get_manifest(loop=loop)
+    if remote is None:
+        remote = await communication.Secretary.call(cerebrate_mac=cerebrate_mac, msg=communication.Message("send_manifest"))
+    if not isinstance(remote, dict):
+        #cerebrates too old to send a manifest get every file
+        remote = {}
+    changed = manifest.diff_manifests(mine=local_manifest, theirs=remote.get("manifest", None) or {})
+    dprint(len(changed), " files changed for ", cerebrate_mac)
+    signatures = remote.get("signatures", None) or {}
+    deltas = {}
+    for relative_path in changed:
+        if relative_path in signatures:
+            delta = await loop.run_in_executor(None, manifest.make_file_delta, relative_path, signatures[relative_path])
+            deltas[relative_path] = {"delta": delta, cc.HASH: local_manifest[relative_path]}
+    file_names = [manifest.to_file_path(relative_path) for relative_path in changed if relative_path not in deltas]
+    if deltas:
+        failed = await communication.Secretary.call(cerebrate_mac=cerebrate_mac, msg=communication.Message("apply_deltas", data=deltas), timeout=DELTA_TIMEOUT)
+        if not isinstance(failed, list):
+            failed = list(deltas.keys())
+        file_names.extend(manifest.to_file_path(relative_path) for relative_path in failed)
+    if file_names:
+        return await distribute_files(cerebrate_mac=cerebrate_mac, file_names=file_names, manifest_digest=manifest.get_manifest_digest(manifest=local_manifest))
+    return True
+
+def split_files(file_names, count:int):
+    '''Splits the given files into count lists of roughly equal total size.
+    Returns the list of lists.
+    '''
+    shares = [[] for _ in range(count)]
+    share_sizes = [0] * count
+    for file_name in sorted(file_names, key=os.path.getsize, reverse=True):
+        smallest = share_sizes.index(min(share_sizes))
+        shares[smallest].append(file_name)
+        share_sizes[smallest] += os.path.getsize(file_name)
+    return shares
+
+async def _send_share(source_mac, cerebrate_mac, file_names, manifest_digest):
+    '''Asks the cerebrate to fetch the given files from the source cerebrate.
+    Returns True if it did.
+    '''
+    msg = communication.Message("fetch_files", data={"source": source_mac, "manifest": manifest_digest, "files": [manifest.to_relative_path(file_name) for file_name in file_names]})
+    try:
+        return await communication.Secretary.call(cerebrate_mac=cerebrate_mac, msg=msg, timeout=SOURCE_TRANSFER_TIMEOUT) is True
+    except (asyncio.TimeoutError, ConnectionError):
+        return False
+
+async def distribute_files(cerebrate_mac, file_names, manifest_digest):
+    '''Transfers the given files to the cerebrate, sharing the work with other cerebrates advertising the same manifest digest.
+    Each source sends a different share of the files at the same time, shares that fail are sent from here.
+    Returns True if every file was transferred.
+    '''
+    sources = manifest.find_sources(manifest_digest=manifest_digest, exclude=(cerebrate_mac,))[:len(file_names) - 1]
+    if not sources:
+        return await communication.Secretary.transfer_files(cerebrate_mac=cerebrate_mac, file_names=file_names)
+    shares = split_files(file_names=file_names, count=len(sources) + 1)
+    dprint("Sharing transfer to ", cerebrate_mac, " with ", sources)
+    own_share = shares.pop()
+    results = await asyncio.gather(communication.Secretary.transfer_files(cerebrate_mac=cerebrate_mac, file_names=own_share),
+        *[_send_share(source_mac=source, cerebrate_mac=cerebrate_mac, file_names=share, manifest_digest=manifest_digest) for source, share in zip(sources, shares)])
+    success = results[0] is True
+    for share, result in zip(shares, results[1:]):
+        if result is not True:
+            success = await communication.Secretary.transfer_files(cerebrate_mac=cerebrate_mac, file_names=share) and success
+    return success
+
+async def _update_cerebrate(cerebrate_mac, local_manifest):
+    '''Sends the changed files to the cerebrate, restarts it and waits for it to acknowledge with the new version.
+    Returns True if it did.
+    '''
+    future = asyncio.get_event_loop().create_future()
+    _awaiting_acknowledgement[cerebrate_mac] = future
+    try:
+        dprint("Sending updates to ", cerebrate_mac)
+        if not await send_changes(cerebrate_mac=cerebrate_mac, local_manifest=local_manifest):
+            return False
+        await communication.Secretary.communicate_message(cerebrate_mac=cerebrate_mac, msg=communication.Message("restart", data="cerebrate updated"))
+        return await asyncio.wait_for(future, timeout=UPDATE_ACKNOWLEDGE_TIMEOUT)
+    except asyncio.TimeoutError:
+        dprint(cerebrate_mac, " did not acknowledge after updating")
+        return False
+    finally:
+        _awaiting_acknowledgement.pop(cerebrate_mac, None)
+
+async def roll_out(wave_size:int=UPDATE_WAVE_SIZE):
+    '''Updates the pending cerebrates in waves of wave_size, transferring to every cerebrate in a wave at once.
+    Each wave has to be acknowledged with the new version before the next one starts, if any of it fails the rollout halts.
+    Updated cerebrates help send to later waves, so waves grow to one cerebrate per source and the fleet is covered in a logarithmic number of waves.
+    Returns True if every pending cerebrate was updated.
+    '''
+    global _halted
+    await asyncio.sleep(UPDATE_GATHER_DELAY)
+    requirements.update_requirements()
+    local_manifest = await manifest.get_manifest()
+    manifest_digest = manifest.get_manifest_digest(manifest=local_manifest)
+    while _pending:
+        size = max(wave_size, len(manifest.find_sources(manifest_digest=manifest_digest)) + 1)
+        wave = _pending[:size]
+        del _pending[:size]
+        dprint("Updating wave: ", wave)
+        results = await asyncio.gather(*[_update_cerebrate(cerebrate_mac=mac, local_manifest=local_manifest) for mac in wave], return_exceptions=True)
+        for mac, result in zip(wave, results):
+            if result is True:
+                _updated.append(mac)
+            else:
+                _failed.append(mac)
+        if len(_failed) > 0:
+            logging.error(''.join(("Update rollout halted, failed to update: ", ", ".join(_failed))))
+            _halted = True
+            for mac in _failed + _pending:
+                _refuse(cerebrate_mac=mac)
+            _pending.clear()
+            return False
+    return True
@@ -4,9 +4,8 @@ import os
 from shutil import copyfile
 import traceback
 import functools
-from collections import defaultdict
 from aioconsole import ainput
-import cerebrate_config as cc, mysysteminfo
+import cerebrate_config as cc, fuzzy_index, mysysteminfo
 from definitions import CEREBRATE_FILE_EXTENSIONS
 from async_queue import queue_coroutine
 
@@ -91,11 +90,11 @@ async def get_cerebrate_file_names():
     file_names = []
     source_directory = mysysteminfo.get_my_directory()
     for dirname, subdirnames, filenames in os.walk(source_directory):
-        subdirnames = [subdir for subdir in subdirnames if 'backup' not in subdir]
+        subdirnames[:] = [subdir for subdir in subdirnames if 'backup' not in subdir]
         for filename in filenames:
             if 'backup' in filename:
                 continue
-            extension = os.path.splitext(filename)[1]
+            extension = os.path.splitext(filename)[1][1:]
             if extension in CEREBRATE_FILE_EXTENSIONS:
                 file_names.append(os.path.join(dirname, filename))
     return file_names
@@ -104,37 +103,21 @@ def intersect_strings(item_one:str, item_two:str, minimum_word_size:int=2):
     '''Intersects two strings to find matching sequences of characters (hopefully words).
     Returns a result dictionary containing an integer 'char_count' and list of matches 'result_strings'.
     '''
-    item_one = item_one.lower()
-    item_two = item_two.lower()
-    intersect_result = {'char_count': 0, 'result_strings': []}
-    item_one_start_index = 0
-    while item_one_start_index < len(item_one):
-        item_one_end_index = len(item_one)
-        while item_one_end_index > item_one_start_index:
-            possible_match = item_one[item_one_start_index:item_one_end_index]
-            if len(possible_match) > minimum_word_size and possible_match in item_two:
-                intersect_result['char_count'] += (item_one_end_index - item_one_start_index)
-                intersect_result['result_strings'].append(possible_match)
-                item_two = item_two.replace(possible_match, '', 1)
-                item_one_start_index = item_one_end_index - 1
-                break
-            item_one_end_index -= 1
-        item_one_start_index += 1
-    return intersect_result
+    char_count, result_strings = fuzzy_index.intersect(item_one=item_one, item_two=item_two, minimum_word_size=minimum_word_size)
+    return {'char_count': char_count, 'result_strings': result_strings}
 
 def get_greedy_match(match_string:str, possible_matches:list, minimum_word_size:int=2):
     '''Picks from possible_matches the string with the greediest matching with match_string and returns it.
     minimum_word_size is the floor for matching character sequences.
+    To match against the same strings repeatedly, keep a fuzzy_index.FuzzyIndex of them instead.
     Returns a dict containing "match" and "char_count". These are each None if no matches were found.
     '''
-    matches = defaultdict()
+    best_match = {"match": None, "char_count": None}
     for possible_match in possible_matches:
-        result = intersect_strings(item_one=match_string, item_two=possible_match, minimum_word_size=minimum_word_size)
-        matches[possible_match] = result.get("char_count", 0)
-    if len(matches) <= 0:
-        return {"match": None, "char_count": None}
-    match = sorted(matches.items(), key=lambda x: x[1], reverse=True)[0]
-    return {"match": match[0], "char_count": match[1]}
+        char_count = fuzzy_index.intersect(item_one=match_string, item_two=possible_match, minimum_word_size=minimum_word_size)[0]
+        if best_match["char_count"] is None or char_count > best_match["char_count"]:
+            best_match = {"match": possible_match, "char_count": char_count}
+    return best_match
 
 def run_coroutine(coroutine):
     '''Attempts to run the given coroutine in the future.
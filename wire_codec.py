@@ -0,0 +1,531 @@
+import collections
+import datetime
+import enum
+import functools
+import io
+import pickle
+import struct
+import zlib
+import cerebrate_config as cc, cerebratesinfo, framing
+from definitions import Command, Resource
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+
+# Compact binary encoding for everything the Secretary sends.
+# An encoded frame is MAGIC, the wire version it was encoded with, then a single tagged value.
+# From version 3 a compression byte follows the version, and the tagged value may be compressed.
+# Pickled frames start with pickle's PROTO opcode (0x80) instead, so both can arrive on the same connection.
+# The schema'd encoding is smaller than pickle, but decoding it in pure Python costs several times what C pickle does
+# (benchmarks/wire_benchmark.py), so by default the tagged value is the pickled value, which keeps versioning and compression.
+
+WIRE_VERSION = 3
+MAGIC = 0xC5
+
+WIRE_OFFER = "wire"  # header prefix a cerebrate uses to offer its wire version, as "wire:<version>"
+COMPRESSION_OFFER = "compress"  # header prefix a cerebrate uses to list the compressions it accepts, as "compress:zlib,lzma"
+
+COMPRESSION_THRESHOLD = 1024  # frames smaller than this are never compressed
+LZMA_THRESHOLD = 1024 * 1024  # frames at least this large prefer lzma, when accepted
+MAX_DECOMPRESSED_SIZE = framing.MAX_FRAME_SIZE  # compressed frames expanding past this are refused
+
+NO_COMPRESSION = "none"
+ZLIB = "zlib"
+ZLIB_DICTIONARY = "zlib-dict"
+LZMA = "lzma"
+
+SCHEMA_ENCODING = False  # encode values with the schema rather than embedding them pickled
+
+_NONE = 0
+_TRUE = 1
+_FALSE = 2
+_INT = 3
+_FLOAT = 4
+_STR = 5
+_INTERNED_STR = 6
+_BYTES = 7
+_LIST = 8
+_TUPLE = 9
+_DICT = 10
+_RECORD = 11
+_DATETIME = 12
+_ENUM = 13
+_MESSAGE = 14
+_PICKLED = 15
+
+_FLOAT_STRUCT = struct.Struct('>d')
+_EPOCH = datetime.datetime(1, 1, 1)
+
+# Strings sent often enough to be worth a two byte reference.
+# Only ever append to this list, and record the new length in _INTERNED_COUNT for the new wire version.
+_INTERNED_STRINGS = [
+    cc.COMMAND, cc.REMOTE_COMMAND, cc.FILE_TRANSFER, cc.CLOSE_CONNECTION, cc.KEEP_ALIVE,
+    cc.RECIPROCATE, cc.OVERRULE, cc.SUCCESS, cc.READY, cc.FINISHED, cc.LOCATION, cc.NAME,
+    "acknowledge", "update_records", "update_resources", "ping", "display_message", "assume_overmind",
+    "check_version", "send_resources", "send_update", "restart",
+    "version", "file header", "console", "voice", "by request", "timed out", "ERROR",
+    "records updated", "resources updated", "command not recognized", "cerebrate updated",
+    str(Resource.SECTION), "res_modified_time", "res_value", "websites", "unknown", "myinfo",
+    # version 2
+    cc.CALL, cc.RESPONSE,
+]
+_INTERNED_COUNT = {1: 39, 2: 41, 3: len(_INTERNED_STRINGS)}
+_INTERNED_IDS = {value: index for index, value in enumerate(_INTERNED_STRINGS)}
+
+# Enums that may be sent, by id. Only ever append.
+_ENUMS = [cerebratesinfo.Record, cerebratesinfo.Status, cerebratesinfo.Role, cc.FileLocation, Resource, Command]
+_ENUM_IDS = {enum_class: index for index, enum_class in enumerate(_ENUMS)}
+_ENUM_MEMBERS = [{member.value: member for member in enum_class} for enum_class in _ENUMS]
+_RECORD_MEMBERS = _ENUM_MEMBERS[_ENUM_IDS[cerebratesinfo.Record]]
+
+# Preset zlib dictionary: the strings and byte patterns that make up most of what cerebrates send each other.
+# Changing it breaks zlib-dict frames between cerebrates, so a changed dictionary needs a new compression name.
+_ZLIB_PRESET = b''.join([value.encode('utf-8') for value in _INTERNED_STRINGS[:_INTERNED_COUNT[3]]] + [
+    b'192.168.0.', b'192.168.1.', b'10.0.0.', b':00:', b'https://www.', b'http://', b'.com/', b'.ca/',
+    b'search?q=', b'query=', b'selenium', b'websites', b'website_cookies', b'.py', b'.edy', b'import ',
+    b'def ', b'async def ', b'await ', b'return ', b'self.', b'    ', b'cerebrate', b'msg.data',
+])
+
+_COMPRESSION_IDS = {NO_COMPRESSION: 0, ZLIB: 1, ZLIB_DICTIONARY: 2, LZMA: 3}
+_COMPRESSION_NAMES = {compression_id: name for name, compression_id in _COMPRESSION_IDS.items()}
+
+_DECOMPRESSION_ERRORS = (zlib.error, lzma.LZMAError) if lzma else (zlib.error,)
+
+_message_class = None
+
+
+class WireError(ValueError):
+    '''Raised when a frame cannot be decoded.
+    '''
+
+class UnknownRecordKey(int):
+    '''A Record member added by a newer cerebrate, kept by its value so the record can be stored and passed on intact.
+    '''
+    def __repr__(self):
+        return ''.join(("UnknownRecordKey(", str(int(self)), ")"))
+
+    def __reduce__(self):
+        # pickled as the member it stands for, which a cerebrate that knows it gets back
+        return cerebratesinfo.Record, (int(self),)
+
+class UnknownEnumMember(collections.namedtuple("UnknownEnumMember", ("enum_id", "value"))):
+    '''A member of one of the sent enums (or of an enum) added by a newer cerebrate, kept by its ids so it can be passed on intact.
+    '''
+    __slots__ = ()
+
+    def __reduce__(self):
+        if self.enum_id < len(_ENUMS):
+            return _ENUMS[self.enum_id], (self.value,)
+        return UnknownEnumMember, tuple(self)
+
+def _get_enum_member(enum_id:int, value):
+    members = _ENUM_MEMBERS[enum_id] if enum_id < len(_ENUM_MEMBERS) else {}
+    member = members.get(value, None)
+    if member is not None:
+        return member
+    if enum_id == _ENUM_IDS[cerebratesinfo.Record]:
+        return UnknownRecordKey(value)
+    return UnknownEnumMember(enum_id, value)
+
+# Unpickling looks enum members up through these, so members this cerebrate doesn't know don't fail the whole frame
+_ENUM_LOOKUPS = {enum_class: functools.partial(_get_enum_member, enum_id) for enum_class, enum_id in _ENUM_IDS.items()}
+
+class _Unpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        found = super().find_class(module, name)
+        return _ENUM_LOOKUPS.get(found, found)
+
+
+def register_message_class(message_class):
+    '''Sets the class Message frames are encoded from and decoded to.
+    '''
+    global _message_class
+    _message_class = message_class
+
+def make_offer(version:int=WIRE_VERSION):
+    '''Returns the header used to offer the given wire version.
+    '''
+    return ':'.join((WIRE_OFFER, str(version)))
+
+def get_offer(header):
+    '''Returns the wire version offered in the given message header, or 0 if none is offered.
+    '''
+    for item in header:
+        if type(item) is str and item.startswith(WIRE_OFFER + ':'):
+            try:
+                return int(item.split(':', 1)[1])
+            except ValueError:
+                return 0
+    return 0
+
+def get_compressions():
+    '''Returns the compressions this cerebrate accepts, in order of preference.
+    '''
+    compressions = [ZLIB_DICTIONARY, ZLIB]
+    if lzma:
+        compressions.append(LZMA)
+    return compressions
+
+def make_compression_offer():
+    '''Returns the header used to list the compressions this cerebrate accepts.
+    '''
+    return ':'.join((COMPRESSION_OFFER, ','.join(get_compressions())))
+
+def get_compression_offer(header):
+    '''Returns the set of compressions listed in the given message header, or None if none are listed.
+    '''
+    for item in header:
+        if type(item) is str and item.startswith(COMPRESSION_OFFER + ':'):
+            return set(item.split(':', 1)[1].split(','))
+    return None
+
+def choose_compression(accepted:set, frame_size:int):
+    '''Picks the compression to use for a frame of the given size sent to a cerebrate accepting the given compressions.
+    Returns the compression name, NO_COMPRESSION if the frame shouldn't be compressed.
+    '''
+    if not accepted or frame_size < COMPRESSION_THRESHOLD:
+        return NO_COMPRESSION
+    if frame_size >= LZMA_THRESHOLD and lzma and LZMA in accepted:
+        return LZMA
+    for compression in get_compressions():
+        if compression in accepted:
+            return compression
+    return NO_COMPRESSION
+
+def _compress(body, compression:str):
+    if compression == ZLIB:
+        return zlib.compress(body)
+    if compression == ZLIB_DICTIONARY:
+        compressor = zlib.compressobj(zdict=_ZLIB_PRESET)
+        return compressor.compress(body) + compressor.flush()
+    if compression == LZMA:
+        return lzma.compress(body)
+    raise WireError(''.join(("unknown compression ", compression)))
+
+def _decompress(body, compression:str):
+    # output is capped, so a small frame can't expand into more memory than a frame is allowed
+    if compression in (ZLIB, ZLIB_DICTIONARY):
+        decompressor = zlib.decompressobj(zdict=_ZLIB_PRESET) if compression == ZLIB_DICTIONARY else zlib.decompressobj()
+        data = decompressor.decompress(body, MAX_DECOMPRESSED_SIZE)
+        if decompressor.unconsumed_tail:
+            raise WireError("decompressed frame too large")
+        if not decompressor.eof or decompressor.unused_data:
+            raise WireError("malformed compressed frame")
+        return data
+    if compression == LZMA and lzma:
+        decompressor = lzma.LZMADecompressor()
+        data = decompressor.decompress(body, max_length=MAX_DECOMPRESSED_SIZE)
+        if not decompressor.eof and not decompressor.needs_input:
+            raise WireError("decompressed frame too large")
+        if not decompressor.eof or decompressor.unused_data:
+            raise WireError("malformed compressed frame")
+        return data
+    raise WireError(''.join(("cannot decompress ", compression)))
+
+def compress(frame, compression:str):
+    '''Compresses an encoded frame with the given compression.
+    Frames older than version 3, and frames that don't get any smaller, are returned as they are.
+    Returns the frame to send.
+    '''
+    if compression == NO_COMPRESSION or frame[1] < 3 or frame[2] != _COMPRESSION_IDS[NO_COMPRESSION]:
+        return frame
+    compressed = _compress(bytes(frame[3:]), compression)
+    if len(compressed) + 3 >= len(frame):
+        return frame
+    return bytes((MAGIC, frame[1], _COMPRESSION_IDS[compression])) + compressed
+
+def negotiate(offered_version:int):
+    '''Returns the wire version to use with a cerebrate offering the given version.
+    '''
+    return min(offered_version, WIRE_VERSION)
+
+def is_encoded(data):
+    '''Returns True if data was encoded by this module (rather than pickled).
+    '''
+    return len(data) >= 2 and data[0] == MAGIC
+
+def _write_varint(out:bytearray, value:int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data, index:int):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[index]
+        index += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, index
+        shift += 7
+
+def _write_str(out:bytearray, value:str, interned_count:int):
+    interned_id = _INTERNED_IDS.get(value)
+    if interned_id is not None and interned_id < interned_count:
+        out.append(_INTERNED_STR)
+        _write_varint(out, interned_id)
+        return
+    encoded = value.encode('utf-8')
+    out.append(_STR)
+    _write_varint(out, len(encoded))
+    out += encoded
+
+def _write_int(out:bytearray, value:int, interned_count:int):
+    out.append(_INT)
+    _write_varint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))
+
+def _write_float(out:bytearray, value:float, interned_count:int):
+    out.append(_FLOAT)
+    out += _FLOAT_STRUCT.pack(value)
+
+def _write_bytes(out:bytearray, value, interned_count:int):
+    out.append(_BYTES)
+    _write_varint(out, len(value))
+    out += value
+
+def _write_list(out:bytearray, value, interned_count:int):
+    out.append(_LIST if type(value) is list else _TUPLE)
+    _write_varint(out, len(value))
+    for item in value:
+        _encode_value(out, item, interned_count)
+
+def _write_dict(out:bytearray, value, interned_count:int):
+    out.append(_DICT)
+    _write_varint(out, len(value))
+    for key, item in value.items():
+        _encode_value(out, key, interned_count)
+        _encode_value(out, item, interned_count)
+
+def _write_record(out:bytearray, value, interned_count:int):
+    # Record keys are written as their single byte value, anything else is escaped with a 0
+    out.append(_RECORD)
+    _write_varint(out, len(value))
+    for key, item in value.items():
+        if type(key) is cerebratesinfo.Record:
+            out.append(key.value)
+        elif type(key) is UnknownRecordKey:
+            out.append(int(key))
+        else:
+            out.append(0)
+            _encode_value(out, key, interned_count)
+        _encode_value(out, item, interned_count)
+
+def _write_datetime(out:bytearray, value, interned_count:int):
+    delta = value - _EPOCH
+    out.append(_DATETIME)
+    _write_varint(out, (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+def _write_enum(out:bytearray, value, interned_count:int):
+    out.append(_ENUM)
+    out.append(_ENUM_IDS[type(value)])
+    _write_varint(out, value.value)
+
+def _write_unknown_enum(out:bytearray, value, interned_count:int):
+    out.append(_ENUM)
+    out.append(value.enum_id)
+    _write_varint(out, value.value)
+
+def _write_pickled(out:bytearray, value, interned_count:int):
+    # Anything without a schema (Resource_BC subclasses and the like) is carried pickled
+    pickled = pickle.dumps(value)
+    out.append(_PICKLED)
+    _write_varint(out, len(pickled))
+    out += pickled
+
+def _write_message(out:bytearray, msg, interned_count:int):
+    fields = (list(msg.header), msg.data, msg.sender_mac, msg.sender_ip)
+    timestamp = getattr(msg, "timestamp", None)
+    if msg.correlation_id is not None or timestamp is not None:
+        fields += (msg.correlation_id,)
+    if timestamp is not None:
+        fields += (timestamp,)
+    out.append(_MESSAGE)
+    _write_varint(out, len(fields))
+    for field in fields:
+        _encode_value(out, field, interned_count)
+
+_WRITERS = {
+    str: _write_str,
+    int: _write_int,
+    float: _write_float,
+    bytes: _write_bytes,
+    bytearray: _write_bytes,
+    memoryview: _write_bytes,
+    list: _write_list,
+    tuple: _write_list,
+    dict: _write_dict,
+    UnknownEnumMember: _write_unknown_enum,
+}
+
+def _encode_value(out:bytearray, value, interned_count:int):
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    else:
+        value_type = type(value)
+        writer = _WRITERS.get(value_type)
+        if writer is None:
+            if value_type is collections.defaultdict and value.default_factory is cerebratesinfo.default_dictionary:
+                writer = _write_record
+            elif value_type is datetime.datetime and value.tzinfo is None:
+                writer = _write_datetime
+            elif value_type in _ENUM_IDS and type(value.value) is int:
+                writer = _write_enum
+            elif value_type is _message_class:
+                writer = _write_message
+            else:
+                writer = _write_pickled
+        writer(out, value, interned_count)
+
+def _read_interned(data, index:int):
+    interned_id, index = _read_varint(data, index)
+    return _INTERNED_STRINGS[interned_id], index
+
+def _read_str(data, index:int):
+    length, index = _read_varint(data, index)
+    end = index + length
+    return str(data[index:end], 'utf-8'), end
+
+def _read_int(data, index:int):
+    zigzag, index = _read_varint(data, index)
+    return ((zigzag >> 1) if not zigzag & 1 else -((zigzag + 1) >> 1)), index
+
+def _read_float(data, index:int):
+    return _FLOAT_STRUCT.unpack_from(data, index)[0], index + _FLOAT_STRUCT.size
+
+def _read_bytes(data, index:int):
+    length, index = _read_varint(data, index)
+    end = index + length
+    return bytes(data[index:end]), end
+
+def _read_list(data, index:int):
+    length, index = _read_varint(data, index)
+    items = []
+    for _ in range(length):
+        item, index = _decode_value(data, index)
+        items.append(item)
+    return items, index
+
+def _read_tuple(data, index:int):
+    items, index = _read_list(data, index)
+    return tuple(items), index
+
+def _read_dict(data, index:int):
+    length, index = _read_varint(data, index)
+    result = {}
+    for _ in range(length):
+        key, index = _decode_value(data, index)
+        result[key], index = _decode_value(data, index)
+    return result, index
+
+def _read_record(data, index:int):
+    length, index = _read_varint(data, index)
+    result = cerebratesinfo.default_dictionary()
+    for _ in range(length):
+        key = data[index]
+        index += 1
+        if key:
+            key = _RECORD_MEMBERS.get(key, None) or UnknownRecordKey(key)
+        else:
+            key, index = _decode_value(data, index)
+        result[key], index = _decode_value(data, index)
+    return result, index
+
+def _read_datetime(data, index:int):
+    microseconds, index = _read_varint(data, index)
+    return _EPOCH + datetime.timedelta(microseconds=microseconds), index
+
+def _read_enum(data, index:int):
+    enum_id = data[index]
+    value, index = _read_varint(data, index + 1)
+    return _get_enum_member(enum_id, value), index
+
+def _read_pickled(data, index:int):
+    length, index = _read_varint(data, index)
+    end = index + length
+    return _Unpickler(io.BytesIO(data[index:end])).load(), end
+
+def _read_message(data, index:int):
+    if _message_class is None:
+        raise WireError("no Message class registered")
+    field_count, index = _read_varint(data, index)
+    fields = []
+    for _ in range(field_count):
+        field, index = _decode_value(data, index)
+        fields.append(field)
+    # Fields past the ones this version knows about come from newer cerebrates, and are ignored
+    fields.extend([None] * (6 - len(fields)))
+    msg = _message_class.__new__(_message_class)
+    msg.header, msg.data, msg.sender_mac, msg.sender_ip, msg.correlation_id, msg.timestamp = fields[:6]
+    return msg, index
+
+_READERS = {
+    _INTERNED_STR: _read_interned,
+    _STR: _read_str,
+    _INT: _read_int,
+    _FLOAT: _read_float,
+    _BYTES: _read_bytes,
+    _LIST: _read_list,
+    _TUPLE: _read_tuple,
+    _DICT: _read_dict,
+    _RECORD: _read_record,
+    _DATETIME: _read_datetime,
+    _ENUM: _read_enum,
+    _MESSAGE: _read_message,
+    _PICKLED: _read_pickled,
+}
+_CONSTANTS = {_NONE: None, _TRUE: True, _FALSE: False}
+
+def _decode_value(data, index:int):
+    tag = data[index]
+    reader = _READERS.get(tag)
+    if reader is None:
+        if tag in _CONSTANTS:
+            return _CONSTANTS[tag], index + 1
+        raise WireError(''.join(("unknown tag ", str(tag))))
+    return reader(data, index + 1)
+
+def encode(value, version:int=WIRE_VERSION, schema:bool=None):
+    '''Encodes the given value with the given wire version, with the schema or pickled (SCHEMA_ENCODING if schema isn't given).
+    Returns the encoded bytes.
+    '''
+    version = negotiate(offered_version=version)
+    out = bytearray((MAGIC, version))
+    if version >= 3:
+        out.append(_COMPRESSION_IDS[NO_COMPRESSION])
+    if SCHEMA_ENCODING if schema is None else schema:
+        _encode_value(out, value, _INTERNED_COUNT[version])
+    else:
+        _write_pickled(out, value, _INTERNED_COUNT[version])
+    return bytes(out)
+
+def decode(data):
+    '''Decodes a frame produced by encode().
+    Raises WireError if the frame is malformed.
+    Returns a value, wire version tuple.
+    '''
+    if not is_encoded(data):
+        raise WireError("not an encoded frame")
+    data = bytes(data)
+    version = data[1]
+    index = 2
+    try:
+        if version >= 3:
+            compression = _COMPRESSION_NAMES[data[2]]
+            index = 3
+            if compression != NO_COMPRESSION:
+                data = _decompress(data[3:], compression)
+                index = 0
+        value, index = _decode_value(data, index)
+    except (IndexError, KeyError, struct.error, UnicodeDecodeError, ValueError) + _DECOMPRESSION_ERRORS as ex:
+        raise WireError(str(ex))
+    if index != len(data):
+        raise WireError("trailing bytes in frame")
+    return value, version